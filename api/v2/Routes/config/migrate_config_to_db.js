@@ -116,7 +116,7 @@ async function migrateGradeSyncConfig() {
                 courseId,
                 courseData.gradescope?.enabled || false,
                 courseData.gradescope?.course_id,
-                courseData.gradescope?.sync_interval_hours || 24,
+                courseData.gradescope?.sync_interval_hours ?? null,
                 courseData.prairielearn?.enabled || false,
                 courseData.prairielearn?.course_id,
                 courseData.iclicker?.enabled || false,
@@ -178,7 +178,7 @@ class ConfigService {
                     courseId,
                     cfg.gradescope_enabled || false,
                     cfg.gradescope_course_id,
-                    cfg.gradescope_sync_interval_hours || 24,
+                    cfg.gradescope_sync_interval_hours ?? null,
                     cfg.prairielearn_enabled || false,
                     cfg.prairielearn_course_id,
                     cfg.iclicker_enabled || false,
@@ -15,12 +15,15 @@ Version: 2.0.0
 # ============================================================================
 
 # FastAPI and web framework imports
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 import requests
 from typing import Optional, List, Dict, Any
+import hashlib
+import json
 import logging
 import threading
+from datetime import datetime, timezone
 from queue import Queue, Empty
 
 # Environment variables
@@ -88,8 +91,32 @@ async def startup_event():
         logger.info("Initializing database tables...")
         init_db()
         logger.info("Database tables initialized successfully")
+        
+        from api.queries.summary import get_summary_backend
+        if get_summary_backend() == "matview":
+            from api.core.summary_matview import ensure_summary_matview
+            ensure_summary_matview()
+            logger.info("Summary materialized view ready")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
+        return
+    
+    try:
+        # Drop cached summaries when any process (another worker, the
+        # scheduler) commits new grades, so conditional requests are answered
+        # from memory instead of re-reading the data version
+        from api.queries.grade_matrix import grade_matrix_cache
+        grade_matrix_cache.listen()
+    except Exception as e:
+        logger.warning(f"Failed to start data version listener: {e}")
+    
+    try:
+        # Build the summary grade matrices off the event loop so the first
+        # request for each active course is served from memory
+        from api.queries.summary import warm_summary_cache
+        warm_summary_cache()
+    except Exception as e:
+        logger.warning(f"Failed to start summary cache warm-up: {e}")
 
 # ============================================================================
 # ROOT ENDPOINT
@@ -146,7 +173,7 @@ def read_root():
     summary="List All Courses",
     description="Retrieve a list of all configured courses with their enabled integration sources"
 )
-def list_courses():
+def list_courses(request: Request):
     """
     List all configured courses in the system.
     
@@ -168,6 +195,9 @@ def list_courses():
         ```bash
         curl http://localhost:8000/api/courses
         ```
+    
+    Supports conditional requests (ETag / If-None-Match, Last-Modified /
+    If-Modified-Since).
     """
     try:
         config_manager = get_config_manager()
@@ -190,10 +220,23 @@ def list_courses():
                 }
             })
         
-        return JSONResponse(content={
-            "courses": courses,
-            "total": len(courses)
-        })
+        # The list only depends on config.json, so the ETag is a digest of
+        # the body and Last-Modified the config file's mtime
+        body = json.dumps(
+            {"courses": courses, "total": len(courses)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        etag = make_etag(hashlib.sha256(body).hexdigest()[:32])
+        last_modified = None
+        try:
+            last_modified = datetime.fromtimestamp(config_manager.config_path.stat().st_mtime, tz=timezone.utc)
+        except OSError:
+            pass
+        headers = conditional_headers(etag, last_modified)
+        if is_not_modified(request.headers, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
         
     except Exception as e:
         logger.exception("Failed to list courses")
@@ -207,22 +250,34 @@ def list_courses():
     summary="Sync All Grades",
     description="Synchronize grades from all enabled sources for a specific course"
 )
-async def sync_all_grades(course_id: str, background_tasks: BackgroundTasks):
+async def sync_all_grades(
+    course_id: str,
+    background_tasks: BackgroundTasks,
+    force_sync: bool = Query(False, description="Sync every assignment, even recently synced or unchanged ones"),
+):
     """
     Sync all grades for a specific course from all enabled sources.
     
     This is the main synchronization endpoint that orchestrates grade syncing
-    from multiple platforms. The sync process runs sequentially:
+    from multiple platforms. The source steps run concurrently:
     
     1. **Gradescope** - Fetches assignments and student scores (if enabled)
     2. **PrairieLearn** - Syncs assessments and grades (if enabled)
     3. **iClicker** - Imports attendance and participation data (if enabled)
+    
+    followed, once all of them have finished, by:
+    
     4. **Database Update** - Stores all grades in PostgreSQL
     5. **Summary Generation** - Creates aggregate summary sheets
     
+    With gradescope.incremental enabled, assignments synced within the
+    course's freshness window are skipped unless they are open, recently due
+    or recently regraded; force_sync turns that off for one run.
+    
     Args:
         course_id (str): Course identifier from config.json (e.g., 'cs10_fa25')
         background_tasks (BackgroundTasks): FastAPI background task manager (unused currently)
+        force_sync (bool): Sync every assignment and re-ingest unchanged CSVs
     
     Returns:
         JSONResponse: Sync results containing:
@@ -256,7 +311,7 @@ async def sync_all_grades(course_id: str, background_tasks: BackgroundTasks):
         logger.info(f"Starting grade sync for course: {course_id}")
         
         # For now, run synchronously. Can be moved to background_tasks if needed
-        result = sync_course_grades(course_id)
+        result = sync_course_grades(course_id, force_sync=force_sync)
         
         return JSONResponse(content=result)
         
@@ -276,7 +331,10 @@ async def sync_all_grades(course_id: str, background_tasks: BackgroundTasks):
     summary="Sync All Grades (Streaming Progress)",
     description="Synchronize grades and stream structured progress events as NDJSON"
 )
-async def sync_all_grades_stream(course_id: str):
+async def sync_all_grades_stream(
+    course_id: str,
+    force_sync: bool = Query(False, description="Sync every assignment, even recently synced or unchanged ones"),
+):
     """
     Sync all grades for a specific course and stream progress updates.
 
@@ -313,7 +371,7 @@ async def sync_all_grades_stream(course_id: str):
                 "stage": "start",
             })
 
-            result = sync_course_grades(course_id, progress_callback=enqueue)
+            result = sync_course_grades(course_id, progress_callback=enqueue, force_sync=force_sync)
             enqueue({
                 "event": "final",
                 "status": "completed",
@@ -358,7 +416,10 @@ async def sync_all_grades_stream(course_id: str):
     summary="Sync Gradescope Only",
     description="Synchronize only Gradescope grades for a specific course"
 )
-async def sync_gradescope_only(course_id: str):
+async def sync_gradescope_only(
+    course_id: str,
+    force_sync: bool = Query(False, description="Sync every assignment, even recently synced or unchanged ones"),
+):
     """
     Sync only Gradescope grades for a course.
     
@@ -370,6 +431,7 @@ async def sync_gradescope_only(course_id: str):
     
     Args:
         course_id (str): Course identifier
+        force_sync (bool): Sync every assignment and re-ingest unchanged CSVs
     
     Returns:
         JSONResponse: Gradescope sync result with details of synced assignments
@@ -381,7 +443,7 @@ async def sync_gradescope_only(course_id: str):
     try:
         from sync.service import GradeSyncService
         
-        service = GradeSyncService(course_id)
+        service = GradeSyncService(course_id, force_sync=force_sync)
         
         if not service.config.gradescope_enabled:
             raise HTTPException(
@@ -505,7 +567,18 @@ async def sync_iclicker_only(course_id: str):
     summary="Get Course Summary",
     description="Retrieve pre-computed summary sheet with all student grades"
 )
-async def get_course_summary(course_id: str):
+def get_course_summary(
+    course_id: str,
+    request: Request,
+    format: Optional[str] = Query(
+        None,
+        description="Response format: json (default), columnar, msgpack or arrow; overrides the Accept header",
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size over students"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    category: Optional[List[str]] = Query(None, description="Only assignments in these categories (repeatable)"),
+    assignment_id: Optional[List[str]] = Query(None, description="Only these Gradescope assignment ids (repeatable)"),
+):
     """
     Get summary sheet data for a course from the database.
     
@@ -517,21 +590,40 @@ async def get_course_summary(course_id: str):
     - Assignment categories and max points
     
     The data is pulled from PostgreSQL for fast access without hitting
-    external APIs.
+    external APIs, and kept in an in-process cache until the course's next
+    sync in any process (or, while that cannot be observed,
+    global_settings.summary_cache_ttl_seconds).
     
     Args:
         course_id (str): Course identifier
+        format (str, optional): json, columnar, msgpack or arrow. Without it
+            the format is negotiated from the Accept header
+            (application/vnd.gradesync.summary.columnar+json,
+            application/msgpack, application/vnd.apache.arrow.stream).
+        limit (int, optional): Return at most this many students (by name);
+            the response then carries next_cursor (null on the last page)
+        cursor (str, optional): next_cursor of the previous page
+        category (list, optional): Only include assignments in these categories
+        assignment_id (list, optional): Only include these Gradescope assignment ids
     
     Returns:
-        JSONResponse: Summary sheet data structure:
+        Response: Summary sheet data structure:
             - assignments (list): All assignment names
             - students (list): Student records with scores
             - categories (dict): Assignment category mappings
             - max_points (dict): Maximum points per assignment
+            The columnar shape (also used for msgpack) sends categories and
+            max_points as lists aligned with assignments, and each student's
+            scores as a positional list with null for missing cells.
+    
+    Responses carry a strong ETag (course data version + format + filters)
+    and Last-Modified; a matching If-None-Match (or a current
+    If-Modified-Since) gets 304 Not Modified.
     
     Raises:
         HTTPException: 404 if course not found
-        HTTPException: 400 if Gradescope course ID not configured
+        HTTPException: 400 if Gradescope course ID not configured or the cursor is invalid
+        HTTPException: 406 if the format is unknown or its encoder is not installed
         HTTPException: 500 if database query fails
         
     Example:
@@ -540,8 +632,13 @@ async def get_course_summary(course_id: str):
         ```
     """
     try:
-        from queries.summary import get_summary_sheet_from_db
-        from config_manager import get_course_config
+        from api.queries.summary import get_summary_page, get_summary_version, summary_query_key
+        from api.queries.summary_formats import (
+            SummaryFormatError,
+            encode_summary,
+            negotiate_summary_format,
+        )
+        from api.config_manager import get_course_config
         
         course_config = get_course_config(course_id)
         if not course_config:
@@ -556,9 +653,47 @@ async def get_course_summary(course_id: str):
                 detail=f"Gradescope course ID not configured for: {course_id}"
             )
         
-        summary_data = get_summary_sheet_from_db(course_config.gradescope_course_id)
+        try:
+            response_format = negotiate_summary_format(format, request.headers.get("accept"))
+        except SummaryFormatError as e:
+            raise HTTPException(status_code=406, detail=str(e))
         
-        return JSONResponse(content=summary_data)
+        gradescope_course_id = course_config.gradescope_course_id
+        query_key = summary_query_key(limit, cursor, category, assignment_id)
+        
+        # Conditional GET: the course's data version is known in memory, so
+        # an unchanged summary is answered without querying the database
+        version = get_summary_version(gradescope_course_id)
+        if version is not None:
+            etag = make_etag(gradescope_course_id, version[0], response_format, query_key)
+            if is_not_modified(request.headers, etag, version[1]):
+                headers = conditional_headers(etag, version[1])
+                headers["Vary"] = "Accept"
+                return Response(status_code=304, headers=headers)
+        
+        # Unfiltered requests are served from the per-course grade matrix
+        # cache (the encoded body is reused until the next sync invalidates
+        # it); pages and filters are queried directly
+        try:
+            matrix = get_summary_page(
+                course_config.gradescope_course_id,
+                limit=limit,
+                cursor=cursor,
+                categories=category,
+                assignment_ids=assignment_id,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            body, media_type = encode_summary(matrix, response_format)
+        except SummaryFormatError as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        
+        headers = {"Vary": "Accept"}
+        if version is not None:
+            etag = make_etag(gradescope_course_id, matrix.data_version, response_format, query_key)
+            headers.update(conditional_headers(etag, matrix.last_modified))
+        return Response(content=body, media_type=media_type, headers=headers)
         
     except HTTPException:
         raise
@@ -570,6 +705,67 @@ async def get_course_summary(course_id: str):
         )
 
 
+
+@app.get(
+    "/api/summary/{course_id}/export",
+    tags=["Grades"],
+    summary="Stream Course Summary (NDJSON)",
+    description="Stream the summary sheet as newline-delimited JSON, one line per student"
+)
+def export_course_summary(course_id: str):
+    """
+    Stream a course summary as NDJSON for very large gradebooks.
+    
+    Rows are read from a server-side cursor and each student's line is sent
+    as soon as it is built, so memory stays flat on the server and the
+    client regardless of course size.
+    
+    The first line is a header with assignments, assignment_ids, categories,
+    max_points and the student count; every following line is
+    {"legal_name", "email", "scores": {assignment: score or ""}}.
+    
+    Args:
+        course_id (str): Course identifier
+    
+    Returns:
+        StreamingResponse: application/x-ndjson body
+    
+    Raises:
+        HTTPException: 404 if course not found (in config or database)
+        HTTPException: 400 if Gradescope course ID not configured
+        
+    Example:
+        ```bash
+        curl -N http://localhost:8000/api/summary/cs10_fa25/export
+        ```
+    """
+    from api.config_manager import get_course_config
+    from api.queries.summary import get_summary_backend
+    from api.queries.summary_export import iter_summary_ndjson
+    
+    course_config = get_course_config(course_id)
+    if not course_config:
+        raise HTTPException(status_code=404, detail=f"Course not found: {course_id}")
+    if not course_config.gradescope_course_id:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Gradescope course ID not configured for: {course_id}"
+        )
+    
+    try:
+        lines = iter_summary_ndjson(course_config.gradescope_course_id, backend=get_summary_backend())
+    except Exception as e:
+        logger.exception(f"Failed to export summary for {course_id}")
+        raise HTTPException(status_code=500, detail=f"Failed to export summary: {str(e)}")
+    if lines is None:
+        raise HTTPException(status_code=404, detail=f"Course not found in database: {course_id}")
+    
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{course_id}_summary.ndjson"'},
+    )
+
 # ============================================================================
 # LEGACY ENDPOINTS
 # ============================================================================
@@ -853,7 +1049,7 @@ def get_summary_sheet(course_id: str = None):
     Fetches pre-computed summary sheet data from database.
     Uses the first configured course when course_id is not supplied.
     """
-    from api.queries.summary import get_summary_sheet_from_db
+    from api.queries.summary import get_summary_matrix
 
     # Resolve default course id via config_manager
     if not course_id:
@@ -864,7 +1060,7 @@ def get_summary_sheet(course_id: str = None):
         cfg = get_course_config(available[0])
         course_id = cfg.gradescope_course_id
 
-    summary_data = get_summary_sheet_from_db(course_id)
+    matrix = get_summary_matrix(course_id)
 
-    return JSONResponse(content=summary_data, status_code=200)
+    return Response(content=matrix.to_json(), media_type="application/json", status_code=200)
 
@@ -52,6 +52,61 @@ class CourseConfig:
     def gradescope_course_id(self) -> Optional[str]:
         return self.gradescope.get("course_id")
     
+    @property
+    def gradescope_streaming(self) -> bool:
+        """Stream scores.csv exports into the database in bounded-size chunks."""
+        return self.gradescope.get("streaming", False)
+    
+    @property
+    def gradescope_commit_every(self) -> int:
+        """Number of assignments written per database transaction."""
+        return self.gradescope.get("commit_every", 10)
+    
+    @property
+    def gradescope_parse_engine(self) -> str:
+        """CSV parse engine for downloaded scores: "rows" or "columnar" (pandas)."""
+        return self.gradescope.get("parse_engine", "rows")
+    
+    @property
+    def gradescope_download_workers(self) -> int:
+        """Number of scores.csv downloads in flight at once (1: sequential, as before)."""
+        return self.gradescope.get("download_workers", 1)
+    
+    @property
+    def gradescope_max_connections_per_host(self) -> Optional[int]:
+        """Cap on concurrent requests to the Gradescope host (client default if unset)."""
+        return self.gradescope.get("max_connections_per_host")
+    
+    @property
+    def gradescope_db_writers(self) -> int:
+        """Threads writing downloaded scores to the database."""
+        return self.gradescope.get("db_writers", 1)
+    
+    @property
+    def gradescope_queue_size(self) -> int:
+        """Downloaded scores that may wait for a database writer."""
+        return self.gradescope.get("queue_size", 8)
+    
+    @property
+    def gradescope_sync_interval_hours(self) -> Optional[float]:
+        """Hours between scheduled syncs of this course (see api.sync.scheduler)."""
+        return self.gradescope.get("sync_interval_hours")
+    
+    @property
+    def gradescope_incremental(self) -> bool:
+        """Skip assignments synced within the freshness window unless still active."""
+        return self.gradescope.get("incremental", False)
+    
+    @property
+    def gradescope_freshness_hours(self) -> Optional[float]:
+        """Incremental sync freshness window (ingest default if unset)."""
+        return self.gradescope.get("freshness_hours")
+    
+    @property
+    def gradescope_active_window_hours(self) -> Optional[float]:
+        """Hours after a due date or score change during which assignments are always synced."""
+        return self.gradescope.get("active_window_hours")
+    
     @property
     def prairielearn_enabled(self) -> bool:
         return self.prairielearn.get("enabled", False)
@@ -76,6 +131,16 @@ class CourseConfig:
     def use_db_as_primary(self) -> bool:
         return self.database.get("use_as_primary", False)
     
+    @property
+    def summary_refresh_mode(self) -> str:
+        """
+        How summary sheets are refreshed after a sync: "incremental" or "full".
+
+        "incremental" still rebuilds the full grid when the course is marked
+        summary_dirty from a refresh that did not finish.
+        """
+        return self.database.get("summary_refresh", "incremental")
+    
     @property
     def categories(self) -> List[Dict[str, Any]]:
         """Get assignment categories configuration."""
@@ -103,18 +168,23 @@ class ConfigManager:
         
         try:
             with open(self.config_path, 'r') as f:
-                self.config_data = json.load(f)
+                config_data = json.load(f)
             
             # Load courses
-            for course_data in self.config_data.get("courses", []):
+            courses: Dict[str, CourseConfig] = {}
+            for course_data in config_data.get("courses", []):
                 course_config = CourseConfig(course_data)
                 if not course_config.id:
                     logger.warning("Skipping course entry without id: %s", course_data)
                     continue
-                self.courses[course_config.id] = course_config
+                courses[course_config.id] = course_config
             
+            # Swap in whole objects so concurrent readers (e.g. scheduled syncs
+            # reloading the file) never see a half-loaded configuration
+            self.config_data = config_data
+            self.courses = courses
             # Load global settings
-            self.global_settings = self.config_data.get("global_settings", {})
+            self.global_settings = config_data.get("global_settings", {})
             
             logger.info(f"Loaded configuration for {len(self.courses)} courses")
             
@@ -139,8 +209,6 @@ class ConfigManager:
     
     def reload(self):
         """Reload configuration from file."""
-        self.courses.clear()
-        self.global_settings.clear()
         self._load_config()
 
 
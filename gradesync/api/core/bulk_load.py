@@ -0,0 +1,432 @@
+"""
+COPY-based bulk loader for Gradescope score ingestion.
+
+Parsed CSV rows are streamed into a session-local staging table with
+``COPY ... FROM STDIN`` in fixed-size chunks and then merged into ``students``
+and ``submissions`` with set-based SQL, instead of one large multi-row
+``INSERT`` per assignment.
+Rows whose values did not change are left untouched, so regrading a handful
+of students does not rewrite the whole assignment.
+Student ids are resolved in Python from a per-course identity map, so the
+roster is not re-inserted and re-joined for every assignment.
+"""
+import io
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from .models import Student
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "gradesync_score_staging"
+
+# Rows buffered in Python before each COPY round-trip
+DEFAULT_CHUNK_ROWS = 1000
+
+# First key of the transaction-level advisory lock (second key: course id)
+# that serializes inserting new students into one course
+STUDENT_INSERT_LOCK_NAMESPACE = 0x67730001
+
+_LOCK_STUDENT_INSERTS_SQL = text("SELECT pg_advisory_xact_lock(:namespace, :course_id)")
+
+# Column order of parsed rows handed to StagingWriter.write
+ROW_COLUMNS = (
+    "row_no",
+    "email",
+    "sid",
+    "legal_name",
+    "total_score",
+    "max_points",
+    "status",
+    "submission_id",
+    "submission_time",
+    "lateness",
+    "view_count",
+    "submission_count",
+    "question_scores",
+)
+
+# Column order of the staging table; rows handed to copy_rows_to_staging
+# must follow this order (parsed row plus the resolved student id).
+STAGING_COLUMNS = ROW_COLUMNS + ("student_id",)
+
+_EMAIL, _SID, _LEGAL_NAME = (ROW_COLUMNS.index(c) for c in ("email", "sid", "legal_name"))
+
+_CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    row_no INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    sid TEXT,
+    legal_name TEXT,
+    total_score NUMERIC,
+    max_points NUMERIC,
+    status TEXT,
+    submission_id TEXT,
+    submission_time TIMESTAMPTZ,
+    lateness TEXT,
+    view_count INTEGER,
+    submission_count INTEGER,
+    question_scores NUMERIC[],
+    student_id INTEGER NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+
+# Duplicate emails in one CSV are resolved set-based: the first row wins.
+_DEDUPED_STAGING = f"""(
+    SELECT DISTINCT ON (email) *
+    FROM {STAGING_TABLE}
+    ORDER BY email, row_no
+)"""
+
+_MERGE_SUBMISSIONS_SQL = text(f"""
+INSERT INTO submissions (
+    assignment_id, student_id, total_score, max_points, status, submission_id,
+    submission_time, lateness, view_count, submission_count, scores_by_question,
+    question_scores
+)
+SELECT
+    :assignment_id, s.student_id, s.total_score, s.max_points, s.status, s.submission_id,
+    s.submission_time, s.lateness, s.view_count, s.submission_count, '{{}}'::json,
+    s.question_scores
+FROM {_DEDUPED_STAGING} s
+ON CONFLICT ON CONSTRAINT uq_assignment_student DO UPDATE SET
+    total_score = EXCLUDED.total_score,
+    max_points = EXCLUDED.max_points,
+    status = EXCLUDED.status,
+    submission_id = EXCLUDED.submission_id,
+    submission_time = EXCLUDED.submission_time,
+    lateness = EXCLUDED.lateness,
+    view_count = EXCLUDED.view_count,
+    submission_count = EXCLUDED.submission_count,
+    scores_by_question = EXCLUDED.scores_by_question,
+    question_scores = EXCLUDED.question_scores
+WHERE (
+    submissions.total_score, submissions.max_points, submissions.status,
+    submissions.submission_id, submissions.submission_time, submissions.lateness,
+    submissions.view_count, submissions.submission_count,
+    submissions.scores_by_question::jsonb, submissions.question_scores
+) IS DISTINCT FROM (
+    EXCLUDED.total_score, EXCLUDED.max_points, EXCLUDED.status,
+    EXCLUDED.submission_id, EXCLUDED.submission_time, EXCLUDED.lateness,
+    EXCLUDED.view_count, EXCLUDED.submission_count,
+    EXCLUDED.scores_by_question::jsonb, EXCLUDED.question_scores
+)
+RETURNING submissions.student_id, (xmax = 0) AS inserted
+""")
+
+# COPY text format escapes; NULL is written as \N.
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+
+def _copy_array_element(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    return str(value)
+
+
+def _copy_field(value: Any) -> str:
+    """Render a single value for COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (list, tuple)):
+        # Numeric array literal, e.g. {1.0,NULL,2.5}
+        return "{" + ",".join(_copy_array_element(v) for v in value) + "}"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class StudentIdentityMap:
+    """
+    Email/SID -> student id map for one course, shared by every assignment of a sync.
+
+    Filled once from the students table; students seen for the first time are
+    inserted and added from ``INSERT ... RETURNING``. Ids added since the last
+    ``checkpoint()`` can be dropped with ``discard_pending()`` when the
+    transaction (or savepoint) that inserted them is rolled back.
+    """
+
+    def __init__(self, course_db_id: int):
+        self.course_db_id = course_db_id
+        self.by_email: Dict[str, int] = {}
+        self.by_sid: Dict[str, int] = {}
+        self._pending: List[Tuple[str, Optional[str]]] = []
+
+    def load(self, session) -> "StudentIdentityMap":
+        """Fill the map with the course's current roster."""
+        rows = session.execute(
+            text("SELECT id, email, sid FROM students WHERE course_id = :course_id"),
+            {"course_id": self.course_db_id},
+        )
+        for student_id, email, sid in rows:
+            self._remember(student_id, email, sid)
+        self._pending = []
+        logger.info(f"Loaded {len(self.by_email)} students for course {self.course_db_id}")
+        return self
+
+    def get(self, email: Optional[str] = None, sid: Optional[str] = None) -> Optional[int]:
+        """Look up a student id by email, falling back to SID."""
+        if email and email in self.by_email:
+            return self.by_email[email]
+        if sid:
+            return self.by_sid.get(sid)
+        return None
+
+    def ensure(self, session, students: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> int:
+        """
+        Make sure every (email, sid, legal_name) has a student id.
+
+        Unknown emails are inserted in one statement; the first occurrence of
+        an email wins. Rows another writer inserted concurrently are not
+        returned by ``ON CONFLICT DO NOTHING`` and are selected afterwards.
+
+        Inserting takes a per-course advisory lock held until the
+        transaction ends. Writers call this once per chunk, so each one's
+        inserts are only sorted within a chunk; without the lock, two writers
+        of one course could each hold uncommitted students the other's next
+        chunk needs and deadlock.
+
+        Returns:
+            Number of students inserted
+        """
+        missing: Dict[str, Dict[str, Any]] = {}
+        for email, sid, legal_name in students:
+            if email in self.by_email or email in missing:
+                continue
+            missing[email] = {
+                "course_id": self.course_db_id,
+                "email": email,
+                "sid": sid,
+                "legal_name": legal_name,
+            }
+        if not missing:
+            return 0
+
+        session.execute(
+            _LOCK_STUDENT_INSERTS_SQL,
+            {"namespace": STUDENT_INSERT_LOCK_NAMESPACE, "course_id": self.course_db_id},
+        )
+        stmt = (
+            insert(Student)
+            # Email order, so concurrent writers take the unique-index locks
+            # in the same order
+            .values([missing[email] for email in sorted(missing)])
+            .on_conflict_do_nothing(constraint="uq_student_email_course")
+            .returning(Student.id, Student.email, Student.sid)
+        )
+        inserted = 0
+        for student_id, email, sid in session.execute(stmt):
+            self._remember(student_id, email, sid, pending=True)
+            inserted += 1
+
+        if inserted < len(missing):
+            rows = session.execute(
+                text(
+                    "SELECT id, email, sid FROM students "
+                    "WHERE course_id = :course_id AND email = ANY(:emails)"
+                ),
+                {
+                    "course_id": self.course_db_id,
+                    "emails": [e for e in missing if e not in self.by_email],
+                },
+            )
+            for student_id, email, sid in rows:
+                self._remember(student_id, email, sid)
+        return inserted
+
+    def checkpoint(self) -> None:
+        """Keep all ids added so far (the transaction or savepoint that inserted them succeeded)."""
+        self._pending = []
+
+    def discard_pending(self) -> None:
+        """Forget ids inserted since the last checkpoint (their insert was rolled back)."""
+        for email, sid in self._pending:
+            self.by_email.pop(email, None)
+            if sid:
+                self.by_sid.pop(sid, None)
+        self._pending = []
+
+    def _remember(self, student_id: int, email: str, sid: Optional[str], pending: bool = False) -> None:
+        self.by_email[email] = student_id
+        if sid:
+            self.by_sid.setdefault(sid, student_id)
+        if pending:
+            self._pending.append((email, sid))
+
+
+def prepare_staging_table(session) -> None:
+    """Create (once per connection) and empty the staging table."""
+    session.execute(text(_CREATE_STAGING_SQL))
+    session.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+
+
+def copy_rows_to_staging(session, rows: Iterable[Sequence[Any]]) -> int:
+    """
+    Stream rows into the staging table with COPY FROM STDIN.
+
+    Args:
+        session: Database session (must be bound to a psycopg2 connection)
+        rows: Iterable of tuples in STAGING_COLUMNS order
+
+    Returns:
+        Number of rows copied
+    """
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write("\t".join(_copy_field(v) for v in row))
+        buf.write("\n")
+        count += 1
+
+    if not count:
+        return 0
+
+    buf.seek(0)
+    raw_conn = session.connection().connection
+    with raw_conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+            buf,
+        )
+    return count
+
+
+# Text columns that must stay '' (not NULL) when a frame is copied as CSV
+_NOT_NULL_TEXT_COLUMNS = ("email", "sid", "legal_name", "status", "submission_id", "lateness")
+
+
+def copy_frame_to_staging(session, frame) -> int:
+    """
+    COPY a pandas DataFrame with STAGING_COLUMNS into the staging table.
+
+    The frame is serialized column-wise by ``DataFrame.to_csv`` and loaded
+    with COPY's CSV format; missing values become NULL.
+
+    Returns:
+        Number of rows copied
+    """
+    if not len(frame):
+        return 0
+
+    buf = io.StringIO()
+    frame.to_csv(buf, columns=list(STAGING_COLUMNS), header=False, index=False)
+    buf.seek(0)
+    raw_conn = session.connection().connection
+    with raw_conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(_NOT_NULL_TEXT_COLUMNS)}))",
+            buf,
+        )
+    return len(frame)
+
+
+class StagingWriter:
+    """
+    Buffer parsed rows and COPY them into the staging table in fixed-size chunks.
+
+    Student ids are resolved per chunk through ``identity_map``; only students
+    missing from the map are inserted. Memory use is bounded by ``chunk_size``
+    rows regardless of CSV size.
+    """
+
+    def __init__(self, session, identity_map: StudentIdentityMap, chunk_size: int = DEFAULT_CHUNK_ROWS):
+        self.session = session
+        self.identity_map = identity_map
+        self.chunk_size = max(1, chunk_size)
+        self.rows_staged = 0
+        self.chunks_flushed = 0
+        self.students_inserted = 0
+        self._pending = []
+        prepare_staging_table(session)
+
+    def write(self, row: Sequence[Any]) -> None:
+        """Queue one row (ROW_COLUMNS order), flushing when the chunk is full."""
+        self._pending.append(row)
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def write_all(self, rows: Iterable[Sequence[Any]]) -> int:
+        """Write every row from an iterable and flush the remainder."""
+        for row in rows:
+            self.write(row)
+        self.flush()
+        return self.rows_staged
+
+    def write_frame(self, frame) -> int:
+        """
+        Stage a DataFrame with ROW_COLUMNS (see columnar_parser) in chunk_size slices.
+
+        Student ids are resolved per slice and added as a column.
+        """
+        self.flush()
+        for start in range(0, len(frame), self.chunk_size):
+            chunk = frame.iloc[start:start + self.chunk_size]
+            self.students_inserted += self.identity_map.ensure(
+                self.session,
+                zip(chunk["email"], chunk["sid"], chunk["legal_name"]),
+            )
+            chunk = chunk.assign(student_id=chunk["email"].map(self.identity_map.by_email))
+            self.rows_staged += copy_frame_to_staging(self.session, chunk)
+            self.chunks_flushed += 1
+        return self.rows_staged
+
+    def flush(self) -> None:
+        """COPY the pending chunk into the staging table."""
+        if not self._pending:
+            return
+        self.students_inserted += self.identity_map.ensure(
+            self.session,
+            ((row[_EMAIL], row[_SID], row[_LEGAL_NAME]) for row in self._pending),
+        )
+        by_email = self.identity_map.by_email
+        self.rows_staged += copy_rows_to_staging(
+            self.session,
+            (tuple(row) + (by_email[row[_EMAIL]],) for row in self._pending),
+        )
+        self.chunks_flushed += 1
+        self._pending = []
+
+
+def merge_staged_scores(session, assignment_db_id: int) -> Dict[str, int]:
+    """
+    Merge staged rows into submissions with set-based SQL.
+    
+    Students must already exist (StagingWriter resolves them while staging).
+    Existing submissions are only rewritten when at least one column differs
+    from the staged value.
+
+    Args:
+        session: Database session
+        assignment_db_id: Internal assignment ID
+
+    Returns:
+        Dict with 'students', 'inserted', 'updated' and 'unchanged' counts,
+        plus 'changed_student_ids' (students whose submission was written)
+    """
+    staged_students = session.execute(
+        text(f"SELECT count(DISTINCT email) FROM {STAGING_TABLE}")
+    ).scalar() or 0
+    changed = session.execute(
+        _MERGE_SUBMISSIONS_SQL,
+        {"assignment_id": assignment_db_id},
+    ).all()
+
+    inserted = sum(1 for _, is_insert in changed if is_insert)
+    updated = len(changed) - inserted
+    counts = {
+        "students": staged_students,
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": max(0, staged_students - inserted - updated),
+    }
+    logger.info(f"Merged staged scores for assignment {assignment_db_id}: {counts}")
+    counts["changed_student_ids"] = [student_id for student_id, _ in changed]
+    return counts
@@ -0,0 +1,183 @@
+"""
+Columnar (pandas) parser for Gradescope scores.csv exports.
+
+Alternative to ``score_parser.GradescopeScoreParser`` for large exports with
+many question columns: dtype coercion, timestamp parsing, email dedup and the
+per-question array literal are computed as whole-column operations, and the
+result is handed to ``StagingWriter.write_frame`` as a DataFrame instead of
+one tuple per row. Requires pandas; use ``columnar_parsing_available()`` to
+check before choosing this engine.
+"""
+import csv
+import io
+import logging
+
+from .score_parser import KNOWN_COLUMNS
+from .timestamps import SubmissionTimeParser, ISO_FORMAT
+
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover - pandas is optional for ingestion
+    pd = None
+
+logger = logging.getLogger(__name__)
+
+
+def columnar_parsing_available() -> bool:
+    """Return True if pandas is installed."""
+    return pd is not None
+
+
+class ColumnarScoreParser:
+    """
+    Parse a whole scores CSV into a DataFrame in bulk_load.ROW_COLUMNS order.
+
+    Exposes the same ``max_points``, ``rows_parsed``, ``fieldnames`` and
+    ``question_headers`` attributes as GradescopeScoreParser, and produces the
+    same values: blank scores and counts become 0, blank question cells NULL,
+    and duplicate emails keep their first row.
+    """
+
+    def __init__(self):
+        if pd is None:
+            raise ImportError("pandas is required for the columnar CSV parser")
+        self.max_points = 0.0
+        self.rows_parsed = 0
+        self.fieldnames = None
+        self.question_headers = []
+        self.unparsed_times = 0
+
+    def parse(self, csv_content: str):
+        """
+        Parse CSV text into a DataFrame with one row per unique student email.
+
+        The ``question_scores`` column holds ready-made array literals
+        (e.g. ``{1.0,NULL,2.5}``) for COPY.
+        """
+        # Read the header ourselves so duplicate names are not mangled
+        header = next(csv.reader(io.StringIO(csv_content)), None)
+        if not header:
+            return self._empty_frame()
+        self.fieldnames = header
+
+        # First column holds the name (header may carry a BOM, so use position)
+        name_idx = 0
+        question_idxs = [
+            position for position, name in enumerate(header)
+            if position != name_idx and name not in KNOWN_COLUMNS
+        ]
+        self.question_headers = [header[position] for position in question_idxs]
+        question_positions = set(question_idxs)
+
+        # Fixed columns stay text; question columns are parsed as floats by
+        # the C reader (blank cells -> NaN).
+        data = pd.read_csv(
+            io.StringIO(csv_content),
+            header=0,
+            names=range(len(header)),
+            dtype={position: str for position in range(len(header)) if position not in question_positions},
+            keep_default_na=False,
+            na_values=[''],
+            skip_blank_lines=True,
+        )
+        if data.empty:
+            return self._empty_frame()
+
+        positions = {}
+        for position, name in enumerate(header):
+            positions.setdefault(name, position)
+
+        def column(name: str):
+            position = positions.get(name)
+            if position is None:
+                return pd.Series('', index=data.index, dtype=object)
+            return data[position].fillna('')
+
+        frame = pd.DataFrame({
+            "row_no": data.index,
+            "email": column('Email').str.strip(),
+        })
+        frame = frame[frame["email"] != '']
+        # Duplicate emails: the first row wins, as in the staging merge
+        frame = frame.drop_duplicates("email", keep="first")
+        rows = frame.index
+
+        def numeric(name: str, dtype: str):
+            values = column(name).loc[rows].replace('', '0')
+            return pd.to_numeric(values).astype(dtype)
+
+        frame["sid"] = column('SID').loc[rows].str.strip()
+        frame["legal_name"] = data[name_idx].loc[rows].fillna('')
+        frame["total_score"] = numeric('Total Score', 'float64')
+        frame["max_points"] = numeric('Max Points', 'float64')
+        frame["status"] = column('Status').loc[rows]
+        frame["submission_id"] = column('Submission ID').loc[rows]
+        frame["submission_time"] = self._parse_times(column('Submission Time').loc[rows])
+        frame["lateness"] = column('Lateness (H:M:S)').loc[rows]
+        frame["view_count"] = numeric('View Count', 'int64')
+        frame["submission_count"] = numeric('Submission Count', 'int64')
+        frame["question_scores"] = self._question_arrays(data, question_idxs, rows)
+
+        self.rows_parsed = len(frame)
+        if self.rows_parsed:
+            self.max_points = max(0.0, float(frame["max_points"].max()))
+        return frame.reset_index(drop=True)
+
+    def _parse_times(self, values):
+        """
+        Parse a submission-time column; unparseable cells become NULL.
+
+        The format is detected from the first non-empty value and the whole
+        column is converted with it; only cells that do not match fall back
+        to SubmissionTimeParser one by one.
+        """
+        times = SubmissionTimeParser()
+        values = values.str.strip()
+        present = values != ''
+        if not present.any():
+            return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+
+        times.parse(values[present].iloc[0])
+        fmt = times.format
+        if fmt is None or (fmt != ISO_FORMAT and '%z' not in fmt):
+            # Naive or unknown formats: parse per cell like the row parser
+            parsed = values.map(times.parse)
+        else:
+            parsed = pd.to_datetime(
+                values,
+                format='ISO8601' if fmt == ISO_FORMAT else fmt,
+                errors='coerce',
+                utc=True,
+            )
+            mismatched = parsed.isna() & present
+            if mismatched.any():
+                times.format = fmt
+                fallback = values[mismatched].map(times.parse)
+                if fallback.notna().any():
+                    parsed = parsed.astype(object)
+                    parsed[mismatched] = fallback
+
+        self.unparsed_times = int((parsed.isna() & present).sum())
+        times.unparsed = self.unparsed_times
+        if self.unparsed_times and times.first_unparsed is None:
+            times.first_unparsed = values[parsed.isna() & present].iloc[0]
+        times.log_summary()
+        return parsed
+
+    @staticmethod
+    def _question_arrays(data, question_idxs, rows):
+        """Build one numeric array literal per row from the question columns."""
+        if not question_idxs:
+            return pd.Series('{}', index=rows, dtype=object)
+        block = data.loc[rows, question_idxs].copy()
+        # Columns holding non-numeric text were read as objects; those cells become NULL
+        for position in block.columns[block.dtypes == object]:
+            block[position] = pd.to_numeric(block[position], errors='coerce')
+        # Format the whole block in one pass, one comma-separated line per row
+        lines = block.to_csv(header=False, index=False, na_rep='NULL', lineterminator='\n')
+        return pd.Series(lines.split('\n')[:len(block)], index=rows, dtype=object).map('{{{}}}'.format)
+
+    @staticmethod
+    def _empty_frame():
+        from .bulk_load import ROW_COLUMNS
+        return pd.DataFrame(columns=list(ROW_COLUMNS))
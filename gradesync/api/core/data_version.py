@@ -0,0 +1,204 @@
+"""
+Per-course data version.
+
+``courses.data_version`` is incremented (and ``data_updated_at`` set) in the
+same transaction as every ingest or summary refresh that changed the
+course's data; a materialized-view refresh bumps the courses whose syncs
+requested it. Readers use it to validate in-process caches and to build
+ETag / Last-Modified headers without re-reading the grades themselves.
+
+``courses.summary_dirty`` is set alongside the bump of every ingest that
+changed submissions and cleared by the summary refresh that covers them, so
+a refresh that never finished is still visible to the next sync.
+
+Every bump also sends a NOTIFY on DATA_VERSION_CHANNEL (payload: the
+Gradescope course id), delivered when the bump commits. DataVersionListener
+lets a process react to bumps made by other processes instead of polling
+the version.
+"""
+import logging
+import select
+import threading
+from datetime import datetime
+from typing import Callable, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+
+from .db import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+DataVersion = Tuple[int, Optional[datetime]]
+
+# NOTIFY channel of data-version bumps
+DATA_VERSION_CHANNEL = "course_data_version"
+
+# Delay before a lost listener connection is re-opened
+DEFAULT_LISTEN_RETRY_SECONDS = 10
+
+_BUMP_SQL = text(f"""
+WITH bumped AS (
+    UPDATE courses
+    SET data_version = data_version + 1,
+        data_updated_at = now()
+    WHERE id = :course_id
+    RETURNING gradescope_course_id, data_version, data_updated_at
+)
+SELECT data_version, data_updated_at, pg_notify('{DATA_VERSION_CHANNEL}', gradescope_course_id)
+FROM bumped
+""")
+
+_BUMP_MANY_SQL = text(f"""
+WITH bumped AS (
+    UPDATE courses
+    SET data_version = data_version + 1,
+        data_updated_at = now()
+    WHERE id = ANY(:course_ids)
+    RETURNING gradescope_course_id
+)
+SELECT pg_notify('{DATA_VERSION_CHANNEL}', gradescope_course_id)
+FROM bumped
+""")
+
+_SET_SUMMARY_DIRTY_SQL = text("""
+UPDATE courses
+SET summary_dirty = :dirty
+WHERE id = :course_id AND summary_dirty IS DISTINCT FROM :dirty
+""")
+
+_SELECT_SUMMARY_DIRTY_SQL = text("""
+SELECT summary_dirty
+FROM courses
+WHERE gradescope_course_id = :course_id
+""")
+
+_SELECT_SQL = text("""
+SELECT data_version, coalesce(data_updated_at, updated_at, created_at)
+FROM courses
+WHERE gradescope_course_id = :course_id
+""")
+
+
+def bump_data_version(session, course_db_id: int) -> Optional[DataVersion]:
+    """Increment a course's data version; does not commit."""
+    row = session.execute(_BUMP_SQL, {"course_id": course_db_id}).first()
+    return (row[0], row[1]) if row else None
+
+
+def bump_data_versions(connection, course_db_ids: Iterable[int]) -> None:
+    """Increment the data version of several courses; does not commit."""
+    course_db_ids = sorted(set(course_db_ids))
+    if course_db_ids:
+        connection.execute(_BUMP_MANY_SQL, {"course_ids": course_db_ids})
+
+
+def set_summary_dirty(session, course_db_id: int, dirty: bool = True) -> None:
+    """Mark a course's summary sheet as stale (or fresh again); does not commit."""
+    session.execute(_SET_SUMMARY_DIRTY_SQL, {"course_id": course_db_id, "dirty": dirty})
+
+
+def load_summary_dirty(course_gradescope_id: str) -> bool:
+    """Whether a course has submission changes its summary sheet does not reflect yet."""
+    session = SessionLocal()
+    try:
+        return bool(session.execute(_SELECT_SUMMARY_DIRTY_SQL, {"course_id": course_gradescope_id}).scalar())
+    finally:
+        session.close()
+
+
+def read_data_version(session, course_gradescope_id: str) -> Optional[DataVersion]:
+    """(data_version, last modified) of a course, or None if it does not exist."""
+    row = session.execute(_SELECT_SQL, {"course_id": course_gradescope_id}).first()
+    return (row[0], row[1]) if row else None
+
+
+def load_data_version(course_gradescope_id: str) -> Optional[DataVersion]:
+    """read_data_version in a short-lived session."""
+    session = SessionLocal()
+    try:
+        return read_data_version(session, course_gradescope_id)
+    finally:
+        session.close()
+
+
+class DataVersionListener:
+    """
+    Deliver data-version bumps committed by any process.
+
+    Holds one dedicated connection that LISTENs on DATA_VERSION_CHANNEL and
+    calls on_change(course_gradescope_id) from a daemon thread for every
+    committed bump. on_state(listening) reports when notifications start and
+    stop flowing; bumps committed while not listening are never delivered,
+    so a consumer must fall back to reading versions until it is called with
+    True again. A lost connection is re-opened after retry_seconds.
+
+    A connection that dies silently (half-open TCP after a failover or NAT
+    timeout) delivers nothing, so after every poll_seconds without a
+    notification a ``SELECT 1`` round trip checks it is still alive; the
+    engine's TCP keepalives bound how long that check can hang.
+    """
+
+    def __init__(self, on_change: Callable[[str], None],
+                 on_state: Optional[Callable[[bool], None]] = None,
+                 retry_seconds: float = DEFAULT_LISTEN_RETRY_SECONDS,
+                 poll_seconds: float = 5.0):
+        self.on_change = on_change
+        self.on_state = on_state
+        self.retry_seconds = retry_seconds
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "DataVersionListener":
+        self._thread = threading.Thread(target=self._run, name="data-version-listener", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            connection = None
+            try:
+                # Detached: the connection is held for the process lifetime
+                # and must not count against the request pool
+                connection = engine.raw_connection()
+                driver_connection = connection.driver_connection
+                connection.detach()
+                driver_connection.autocommit = True
+                with driver_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {DATA_VERSION_CHANNEL}")
+                self._set_state(True)
+                while not self._stop.is_set():
+                    if select.select([driver_connection], [], [], self.poll_seconds) == ([], [], []):
+                        # Nothing arrived: raises if the connection is gone
+                        with driver_connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    else:
+                        driver_connection.poll()
+                    while driver_connection.notifies:
+                        notify = driver_connection.notifies.pop(0)
+                        try:
+                            self.on_change(notify.payload)
+                        except Exception:
+                            logger.exception(f"Data version handler failed for {notify.payload}")
+            except Exception as e:
+                logger.warning(f"Data version listener disconnected: {e}")
+            finally:
+                self._set_state(False)
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.retry_seconds)
+
+    def _set_state(self, listening: bool) -> None:
+        if self.on_state is not None:
+            try:
+                self.on_state(listening)
+            except Exception:
+                logger.exception("Data version state handler failed")
@@ -30,7 +30,13 @@ engine = create_engine(
     pool_recycle=1800,   # 连接回收时间（秒），避免连接过期
     connect_args={
         "connect_timeout": 10,  # 连接超时10秒
-        "options": "-c statement_timeout=60000"  # SQL语句超时60秒
+        "options": "-c statement_timeout=60000",  # SQL语句超时60秒
+        # TCP keepalive：空闲连接（如 LISTEN 连接）在网络中断、NAT 超时后约 60 秒内报错，
+        # 而不是永远挂起
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
     }
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -1,52 +1,15 @@
-import io
-import csv
 import os
 import json
-from datetime import datetime
-from sqlalchemy.exc import IntegrityError
-from .db import SessionLocal, init_db
-from .models import Course, Assignment, Student, Submission
+import re
+from sqlalchemy import text
+from .db import SessionLocal
+from .models import Course
+from .data_version import bump_data_version, set_summary_dirty
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def _parse_submission_time(val: str):
-    """Best-effort parser for Gradescope submission timestamps."""
-    if not val:
-        return None
-
-    cleaned = val.strip()
-
-    # Handle common ISO-ish shapes and a few Gradescope exports
-    candidates = [
-        cleaned,
-        cleaned.replace("Z", "+00:00"),
-    ]
-    for candidate in candidates:
-        try:
-            return datetime.fromisoformat(candidate)
-        except Exception:
-            pass
-
-    # Try with timezone offset (e.g., "2025-09-17 23:29:50 -0700")
-    for fmt in (
-        "%Y-%m-%d %H:%M:%S %z",  # Gradescope format with timezone
-        "%Y-%m-%dT%H:%M:%S %z",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%dT%H:%M:%S",
-        "%m/%d/%y %I:%M %p",
-        "%m/%d/%Y %I:%M %p",
-    ):
-        try:
-            dt = datetime.strptime(cleaned, fmt)
-            # If timezone-aware, return as-is; otherwise return naive
-            return dt
-        except Exception:
-            continue
-
-    return None
-
 # Legacy fallback: Load category configuration from assignment_categories.json
 CATEGORY_CONFIG = None
 def _load_category_config():
@@ -62,6 +25,25 @@ def _load_category_config():
             CATEGORY_CONFIG = {"categories": []}
     return CATEGORY_CONFIG
 
+def _category_configs(course_categories: list = None) -> list:
+    """Course-specific category configs, or the legacy assignment_categories.json ones."""
+    if course_categories:
+        return course_categories
+    config = _load_category_config()
+    return config.get('categories', [])
+
+
+def _match_category(normalized_name: str, categories: list):
+    """First category config with a pattern contained in the (normalized) name."""
+    lowered = normalized_name.lower()
+    for cat in categories:
+        for pattern in cat.get('patterns', []):
+            # Fuzzy match: both sides lowercase, ignore extra spaces
+            if pattern.lower() in lowered:
+                return cat
+    return None
+
+
 def _categorize_assignment(assignment_name: str, course_categories: list = None) -> str:
     """Determine category based on assignment name.
     
@@ -79,18 +61,55 @@ def _categorize_assignment(assignment_name: str, course_categories: list = None)
         return None
     
     # Use course-specific categories if provided, otherwise fallback to legacy
-    if course_categories:
-        categories = course_categories
-    else:
-        config = _load_category_config()
-        categories = config.get('categories', [])
+    cat = _match_category(normalized, _category_configs(course_categories))
+    return cat['name'] if cat else None
+
+
+# Default summary column order: first title keyword that matches, in this order
+DEFAULT_SORT_PRIORITIES = (
+    ('lecture', 1), ('quiz', 1),
+    ('midterm', 2),
+    ('postterm', 3), ('posterm', 3),
+    ('project', 4),
+    ('lab', 5),
+    ('discussion', 6),
+)
+UNSORTED_PRIORITY = 99
+MAX_SORT_ORDINAL = 2**31 - 1
+_ORDINAL_RE = re.compile(r"\d+")
+
+
+def assignment_sort_key(assignment_name: str, course_categories: list = None) -> tuple:
+    """Summary sort key (priority, ordinal) for an assignment, computed at ingest time.
     
-    for cat in categories:
-        for pattern in cat.get('patterns', []):
-            # Fuzzy match: both sides lowercase, ignore extra spaces
-            if pattern.lower() in normalized.lower():
-                return cat['name']
-    return None
+    The priority is the ``sort_order`` of the assignment's category in
+    assignment_categories when set; otherwise it comes from title keywords
+    (DEFAULT_SORT_PRIORITIES, 99 if none match). The ordinal is the first
+    number in the title (0 if none).
+    
+    Args:
+        assignment_name: Name of the assignment
+        course_categories: List of category configs from course config (preferred)
+                          If None, falls back to assignment_categories.json
+    """
+    title = assignment_name or ""
+    priority = None
+    cat = _match_category(title.replace('_', ' ').strip(), _category_configs(course_categories))
+    if cat and cat.get('sort_order') is not None:
+        try:
+            priority = int(cat['sort_order'])
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid sort_order {cat['sort_order']!r} for category {cat.get('name')}")
+    if priority is None:
+        lowered = title.lower()
+        priority = next(
+            (value for keyword, value in DEFAULT_SORT_PRIORITIES if keyword in lowered),
+            UNSORTED_PRIORITY
+        )
+    
+    match = _ORDINAL_RE.search(title)
+    ordinal = min(int(match.group()), MAX_SORT_ORDINAL) if match else 0
+    return priority, ordinal
 
 
 def write_assignment_scores_to_db(course_gradescope_id: str, assignment_id: str, assignment_name: str, csv_filepath: str, 
@@ -100,6 +119,10 @@ def write_assignment_scores_to_db(course_gradescope_id: str, assignment_id: str,
                                   course_categories: list = None):
     """Parse the given CSV file and upsert Course, Assignment, Student and Submission rows.
 
+    Compatibility wrapper around the batched ingestion pipeline
+    (ingest_optimized.write_assignment_scores_optimized); new code should call
+    that directly with the CSV content instead of a file path.
+
     Args:
         course_gradescope_id: Gradescope course id from config
         assignment_id: Gradescope assignment id
@@ -112,292 +135,141 @@ def write_assignment_scores_to_db(course_gradescope_id: str, assignment_id: str,
         year: Optional year
         instructor: Optional instructor name
     """
-    init_db()
-    session = SessionLocal()
-    try:
-        # Ensure course exists
-        course = session.query(Course).filter(Course.gradescope_course_id == course_gradescope_id).first()
-        if not course:
-            course = Course(
-                gradescope_course_id=course_gradescope_id,
-                name=course_name,
-                department=department,
-                course_number=course_number,
-                semester=semester,
-                year=year,
-                instructor=instructor
-            )
-            session.add(course)
-            session.flush()
-        else:
-            # Update course info if provided
-            updated = False
-            if course_name and course.name != course_name:
-                course.name = course_name
-                updated = True
-            if department and course.department != department:
-                course.department = department
-                updated = True
-            if course_number and course.course_number != course_number:
-                course.course_number = course_number
-                updated = True
-            if semester and course.semester != semester:
-                course.semester = semester
-                updated = True
-            if year and course.year != year:
-                course.year = year
-                updated = True
-            if instructor and course.instructor != instructor:
-                course.instructor = instructor
-                updated = True
-            if updated:
-                session.flush()
-
-        # Ensure assignment exists
-        assignment = session.query(Assignment).filter(Assignment.assignment_id == str(assignment_id), Assignment.course_id == course.id).first()
-        category = _categorize_assignment(assignment_name, course_categories)
-        
-        if not assignment:
-            assignment = Assignment(assignment_id=str(assignment_id), course_id=course.id, title=assignment_name, category=category)
-            session.add(assignment)
-            session.flush()
-        else:
-            # Always update category (in case config changed)
-            assignment.category = category
-
-        # Parse CSV and upsert records
-        with open(csv_filepath, "rb") as fh:
-            content = fh.read().decode('utf-8')
-        
-        # Use DictReader but access first column by position to avoid encoding issues with "Name" column
-        fh = io.StringIO(content)
-        reader = csv.DictReader(fh)
-        
-        # Extract max_points from first row if not set
-        first_row_processed = False
-        
-        # Known columns to exclude from scores_by_question
-        known_cols = {"SID", "Email", "Sections", "Total Score", "Max Points", "Status", 
-                      "Submission ID", "Submission Time", "Lateness (H:M:S)", 
-                      "View Count", "Submission Count"}
-        # Add first column name (Name or b'Name) to known columns
-        if reader.fieldnames and len(reader.fieldnames) > 0:
-            known_cols.add(reader.fieldnames[0])
-
-        for row in reader:
-            # Update assignment max_points from first row if not set
-            if not first_row_processed:
-                first_row_processed = True
-                if assignment.max_points is None or assignment.max_points == 0:
-                    max_pts_str = row.get('Max Points', '')
-                    try:
-                        if max_pts_str:
-                            max_val = float(max_pts_str)
-                            if max_val > 0:
-                                assignment.max_points = max_val
-                    except ValueError:
-                        pass
-            
-            # Use first column position for Name (to avoid encoding issue with column name)
-            name = list(row.values())[0] if row else None
-            
-            # Use normal field access for other columns
-            sid = row.get("SID")
-            status = row.get("Status", "Missing")
-            
-            # Skip rows without SID - these are not valid student records
-            if not sid or not sid.strip():
-                continue
-            
-            # Skip Missing submissions
-            if status == "Missing":
-                continue
-            
-            email = row.get("Email")
-            total_score_str = row.get("Total Score", "0")
-            max_points_str = row.get("Max Points", "0")
-            submission_id = row.get("Submission ID")
-            submission_time_str = row.get("Submission Time")
-            lateness = row.get("Lateness (H:M:S)")
-            view_count_str = row.get("View Count")
-            submission_count_str = row.get("Submission Count")
-            
-            # Debug: 记录前几条的 submission_time_str
-            if not first_row_processed:
-                logger.info(f"CSV has Submission Time column: {submission_time_str is not None}")
-                logger.info(f"Sample Submission Time value: '{submission_time_str}'")
-
-            # Upsert student - 同一课程内按 email 去重
-            student = None
-            if email and email.strip():
-                student = session.query(Student).filter(
-                    Student.course_id == course.id,
-                    Student.email == email
-                ).first()
-
-            if not student and sid and sid.strip():
-                student = session.query(Student).filter(
-                    Student.course_id == course.id,
-                    Student.sid == sid
-                ).first()
-            
-            if not student and (email or (sid and sid.strip())):
-                # 学生不存在，创建新记录
-                student = Student(course_id=course.id, sid=sid, email=email, legal_name=name)
-                session.add(student)
-                session.flush()
-            elif student:
-                # 学生已存在，更新 email 和 legal_name（以防有变化）
-                if student.course_id != course.id:
-                    student.course_id = course.id
-                if email and student.email != email:
-                    student.email = email
-                if sid and student.sid != sid:
-                    student.sid = sid
-                if name and student.legal_name != name:
-                    student.legal_name = name
-            else:
-                # email 和 SID 都为空，跳过此学生
-                continue
-
-            # Build submission object
-            def _num(v):
-                try:
-                    if v is None or v == "":
-                        return None
-                    return float(v)
-                except Exception:
-                    return None
-            
-            def _int(v):
-                try:
-                    if v is None or v == "":
-                        return None
-                    return int(v)
-                except Exception:
-                    return None
-
-            total_score = _num(total_score_str)
-            max_points = _num(max_points_str)
-            view_count = _int(view_count_str)
-            submission_count = _int(submission_count_str)
-            
-            submission_time = _parse_submission_time(submission_time_str)
-            
-            # Debug: 总是记录第一条有 submission_time_str 的记录
-            if submission_time_str and sid:
-                logger.info(f"[SUBMISSION_TIME] SID={sid}, Raw='{submission_time_str}', Parsed={submission_time}")
-
-            # per-question scores - exclude known columns
-            scores_by_question = {}
-            for k, v in row.items():
-                if k not in known_cols and v:
-                    scores_by_question[k] = v
-
-            # Upsert submission (unique per assignment_id + student_id)
-            existing = session.query(Submission).filter(Submission.assignment_id == assignment.id, Submission.student_id == student.id).first()
-            if existing:
-                existing.total_score = total_score
-                existing.max_points = max_points
-                existing.status = status
-                existing.submission_id = submission_id
-                existing.submission_time = submission_time
-                existing.lateness = lateness
-                existing.view_count = view_count
-                existing.submission_count = submission_count
-                existing.scores_by_question = scores_by_question
-            else:
-                new_sub = Submission(
-                    assignment_id=assignment.id, 
-                    student_id=student.id, 
-                    total_score=total_score, 
-                    max_points=max_points, 
-                    status=status, 
-                    submission_id=submission_id, 
-                    submission_time=submission_time,
-                    lateness=lateness,
-                    view_count=view_count,
-                    submission_count=submission_count,
-                    scores_by_question=scores_by_question
-                )
-                session.add(new_sub)
-
-        # Update course student count dynamically based on actual students in DB
-        student_count = session.query(Student).filter(Student.course_id == course.id).count()
-        if course.number_of_students != student_count:
-            course.number_of_students = student_count
+    from .ingest_optimized import write_assignment_scores_optimized
+
+    with open(csv_filepath, "rb") as fh:
+        content = fh.read().decode('utf-8')
+
+    course_config = {
+        'name': course_name,
+        'department': department,
+        'course_number': course_number,
+        'semester': semester,
+        'year': year,
+        'instructor': instructor,
+        'assignment_categories': course_categories,
+    }
+    result = write_assignment_scores_optimized(
+        course_gradescope_id=course_gradescope_id,
+        assignment_id=assignment_id,
+        assignment_name=assignment_name,
+        csv_content=content,
+        course_config=course_config,
+    )
+    if not result.get('success'):
+        raise RuntimeError(f"Failed ingesting CSV to DB: {result.get('error')}")
+    logger.info(f"Ingested CSV {csv_filepath} into DB for assignment {assignment_name} ({assignment_id})")
+    return result
+
+
+# One row per (student, assignment) of the course; cells without a submission
+# get a NULL score. Unchanged cells are not rewritten. {scope} optionally
+# limits the grid to touched assignments/students.
+_SUMMARY_GRID_SQL = """
+FROM students st
+CROSS JOIN assignments a
+LEFT JOIN submissions sub
+    ON sub.assignment_id = a.id AND sub.student_id = st.id
+WHERE st.course_id = :course_id AND a.course_id = :course_id{scope}
+"""
+
+_SUMMARY_UPSERT_SQL = """
+INSERT INTO summary_sheets (course_id, student_id, assignment_id, score)
+SELECT :course_id, st.id, a.id, sub.total_score
+{grid}
+ON CONFLICT ON CONSTRAINT uq_summary_course_student_assignment DO UPDATE SET
+    score = EXCLUDED.score,
+    updated_at = now()
+WHERE summary_sheets.score IS DISTINCT FROM EXCLUDED.score
+RETURNING (xmax = 0) AS inserted
+"""
+
+_SUMMARY_TOUCHED_SCOPE = """
+    AND (a.id = ANY(:assignment_ids) OR st.id = ANY(:student_ids))"""
+
+# Rows whose student or assignment no longer belongs to the course
+_SUMMARY_DELETE_STALE_SQL = text("""
+DELETE FROM summary_sheets ss
+WHERE ss.course_id = :course_id
+  AND (
+    NOT EXISTS (
+        SELECT 1 FROM students st WHERE st.id = ss.student_id AND st.course_id = :course_id
+    )
+    OR NOT EXISTS (
+        SELECT 1 FROM assignments a WHERE a.id = ss.assignment_id AND a.course_id = :course_id
+    )
+  )
+""")
+
+_SUMMARY_SIZE_SQL = text("""
+SELECT
+    (SELECT count(*) FROM students WHERE course_id = :course_id),
+    (SELECT count(*) FROM assignments WHERE course_id = :course_id)
+""")
 
-        session.commit()
-        logger.info(f"Ingested CSV {csv_filepath} into DB for assignment {assignment_name} ({assignment_id})")
-    except Exception as e:
-        session.rollback()
-        logger.exception("Failed ingesting CSV to DB: %s", e)
-        raise
-    finally:
-        session.close()
 
+SUMMARY_REFRESH_MODES = ("incremental", "full")
 
-def save_summary_sheet_to_db(course_gradescope_id: str, summary_data: dict, course_categories: list = None):
+
+def _write_summary_sheet(session, course_db_id: int, assignment_ids=None, student_ids=None) -> dict:
     """
-    Save summary sheet data to database.
-    
-    Args:
-        course_gradescope_id: Gradescope course ID
-        summary_data: Dictionary containing:
-            - assignments: list of Assignment objects
-            - students: list of Student objects
-            - submissions: dict mapping (assignment_id, student_id) to Submission
-        course_categories: Optional list of category configurations from course config
-    
-    This function stores the computed summary in the summary_sheets table,
-    making it efficient to retrieve summary data without recomputing.
+    Upsert summary cells set-based and delete stale rows; does not commit.
+
+    With assignment_ids/student_ids only cells in a touched column or row are
+    recomputed; without them the whole grid is.
     """
-    from core.models import SummarySheet
-    
+    params = {"course_id": course_db_id}
+    scope = ""
+    if assignment_ids is not None or student_ids is not None:
+        scope = _SUMMARY_TOUCHED_SCOPE
+        params["assignment_ids"] = list(assignment_ids or [])
+        params["student_ids"] = list(student_ids or [])
+    grid = _SUMMARY_GRID_SQL.format(scope=scope)
+
+    cells = session.execute(text(f"SELECT count(*) {grid}"), params).scalar() or 0
+    changed = session.execute(text(_SUMMARY_UPSERT_SQL.format(grid=grid)), params).scalars().all()
+    deleted = session.execute(_SUMMARY_DELETE_STALE_SQL, {"course_id": course_db_id}).rowcount
+
+    inserted = sum(1 for is_insert in changed if is_insert)
+    updated = len(changed) - inserted
+    return {
+        "cells": cells,
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": cells - inserted - updated,
+        "deleted": deleted,
+    }
+
+
+def _run_summary_update(course_gradescope_id: str, mode: str, **scope) -> dict:
     session = SessionLocal()
     try:
-        # Get course
         course = session.query(Course).filter(
             Course.gradescope_course_id == course_gradescope_id
         ).first()
         
         if not course:
             logger.error(f"Course {course_gradescope_id} not found in database")
-            return
-        
-        assignments = summary_data.get("assignments", [])
-        students = summary_data.get("students", [])
-        submissions = summary_data.get("submissions", {})
-        
-        logger.info(f"Saving summary sheet to database for course {course_gradescope_id}")
-        logger.info(f"Processing {len(students)} students and {len(assignments)} assignments")
+            return None
         
-        # Store each student-assignment score pair
-        for student in students:
-            for assignment in assignments:
-                sub = submissions.get((assignment.id, student.id))
-                score = float(sub.total_score) if sub and sub.total_score is not None else None
-                
-                # Check if record exists
-                existing = session.query(SummarySheet).filter(
-                    SummarySheet.course_id == course.id,
-                    SummarySheet.student_id == student.id,
-                    SummarySheet.assignment_id == assignment.id
-                ).first()
-                
-                if existing:
-                    existing.score = score
-                else:
-                    new_summary = SummarySheet(
-                        course_id=course.id,
-                        student_id=student.id,
-                        assignment_id=assignment.id,
-                        score=score
-                    )
-                    session.add(new_summary)
+        logger.info(f"Saving summary sheet to database for course {course_gradescope_id} ({mode})")
         
+        num_students, num_assignments = session.execute(
+            _SUMMARY_SIZE_SQL, {"course_id": course.id}
+        ).one()
+        counts = {
+            "mode": mode,
+            "students": num_students,
+            "assignments": num_assignments,
+        }
+        counts.update(_write_summary_sheet(session, course.id, **scope))
+        if counts["inserted"] or counts["updated"] or counts["deleted"]:
+            bump_data_version(session, course.id)
+        set_summary_dirty(session, course.id, False)
         session.commit()
-        logger.info(f"Successfully saved summary sheet to database for course {course_gradescope_id}")
+        
+        logger.info(f"Successfully saved summary sheet to database for course {course_gradescope_id}: {counts}")
+        return counts
         
     except Exception as e:
         session.rollback()
@@ -406,3 +278,48 @@ def save_summary_sheet_to_db(course_gradescope_id: str, summary_data: dict, cour
     finally:
         session.close()
 
+
+def save_summary_sheet_to_db(course_gradescope_id: str, summary_data: dict = None, course_categories: list = None):
+    """
+    Save summary sheet data to database (full rebuild).
+    
+    The student x assignment grid is computed from ``submissions`` inside
+    PostgreSQL with a single INSERT ... SELECT ... ON CONFLICT statement;
+    nothing is loaded into Python. Rows for students or assignments that no
+    longer belong to the course are deleted.
+    
+    Args:
+        course_gradescope_id: Gradescope course ID
+        summary_data: Unused, kept for compatibility with older callers that
+            passed pre-loaded assignments/students/submissions
+        course_categories: Optional list of category configurations from course config
+    
+    Returns:
+        Dict with 'students', 'assignments', 'cells', 'inserted', 'updated',
+        'unchanged' and 'deleted' counts, or None if the course does not exist
+    """
+    return _run_summary_update(course_gradescope_id, "full")
+
+
+def refresh_summary_sheet(course_gradescope_id: str, assignment_ids, student_ids):
+    """
+    Incrementally refresh the summary sheet after a sync.
+    
+    Only cells in the given assignment columns or student rows are
+    recomputed (plus stale-row deletes), so a sync that touched two
+    assignments does not rewrite the whole grid.
+    
+    Args:
+        course_gradescope_id: Gradescope course ID
+        assignment_ids: Database ids of assignments with new or modified submissions
+        student_ids: Database ids of students with new or modified submissions
+    
+    Returns:
+        Same counts as save_summary_sheet_to_db
+    """
+    return _run_summary_update(
+        course_gradescope_id,
+        "incremental",
+        assignment_ids=assignment_ids,
+        student_ids=student_ids,
+    )
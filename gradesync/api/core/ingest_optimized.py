@@ -2,29 +2,130 @@
 Optimized ingestion module with batch operations and incremental sync support.
 """
 import io
-import csv
+import hashlib
 import logging
-from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
-from sqlalchemy import and_
-from sqlalchemy.dialects.postgresql import insert
-from .db import SessionLocal
-from .models import Course, Assignment, Student, Submission
-from .ingest import _categorize_assignment
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Callable
+from sqlalchemy import text
+from .db import SessionLocal, engine
+from .models import Course, Assignment, Student
+from .ingest import _categorize_assignment, assignment_sort_key
+from .bulk_load import StagingWriter, StudentIdentityMap, merge_staged_scores, DEFAULT_CHUNK_ROWS
+from .score_parser import GradescopeScoreParser, iter_csv_lines
+from .columnar_parser import ColumnarScoreParser, columnar_parsing_available
+from .data_version import bump_data_version, set_summary_dirty
 
 logger = logging.getLogger(__name__)
 
+# Assignments ingested per transaction by CourseIngestSession
+DEFAULT_COMMIT_EVERY = 10
+
+# CSV parse engines: "rows" parses row by row (and supports streaming),
+# "columnar" parses whole columns with pandas (in-memory CSVs only).
+PARSE_ENGINES = ("rows", "columnar")
+DEFAULT_PARSE_ENGINE = "rows"
+
+# Salt for CSV fingerprints. Bump whenever ingestion starts storing new data
+# derived from the CSV, so previously fingerprinted assignments are re-ingested.
+INGEST_FINGERPRINT_VERSION = "2"
+
+# Incremental sync: assignments synced less than this many hours ago are
+# skipped, unless they are open, were due, or had scores change within the
+# last DEFAULT_ACTIVE_WINDOW_HOURS.
+DEFAULT_FRESHNESS_HOURS = 24
+DEFAULT_ACTIVE_WINDOW_HOURS = 72
+
+# Keys of assignment_metadata holding the dates scraped from Gradescope
+ASSIGNMENT_DATE_KEYS = ("release_date", "due_date", "late_due_date")
+
 def _ts():
     """Return current timestamp for debug logs."""
     return datetime.now().strftime('%H:%M:%S.%f')[:-3]
 
 
+class CsvFingerprint:
+    """Incrementally computed fingerprint (sha256 + byte length) of a scores CSV."""
+    
+    def __init__(self):
+        self._hash = hashlib.sha256(INGEST_FINGERPRINT_VERSION.encode('ascii') + b'\0')
+        self.size = 0
+    
+    def update(self, data: bytes):
+        self._hash.update(data)
+        self.size += len(data)
+    
+    def result(self) -> Tuple[str, int]:
+        return self._hash.hexdigest(), self.size
+
+
+def csv_fingerprint(csv_content: str) -> Tuple[str, int]:
+    """
+    Compute the content fingerprint of a scores CSV.
+    
+    Args:
+        csv_content: CSV content as string
+        
+    Returns:
+        Tuple of (sha256 hex digest, byte length)
+    """
+    fingerprint = CsvFingerprint()
+    fingerprint.update(csv_content.encode('utf-8'))
+    return fingerprint.result()
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def assignment_is_active(
+    assignment: Assignment,
+    now: Optional[datetime] = None,
+    active_window_hours: float = DEFAULT_ACTIVE_WINDOW_HOURS
+) -> bool:
+    """
+    Whether an assignment's scores are still likely to change.
+    
+    True if it is open (released and not past its late due date), was due
+    within the last active_window_hours, or had submissions inserted or
+    updated (new work, regrades) within that window. Due dates are only
+    known when the Gradescope assignment list exposed them.
+    
+    scores_changed_at is only updated when an assignment is downloaded, so
+    the first regrade of an assignment that is past its window goes unseen
+    until its freshness_hours run out (or a --force sync); later changes
+    keep it active.
+    """
+    now = now or datetime.now(timezone.utc)
+    window_start = now - timedelta(hours=active_window_hours)
+    
+    if assignment.scores_changed_at and assignment.scores_changed_at >= window_start:
+        return True
+    
+    metadata = assignment.assignment_metadata or {}
+    release_date = _parse_date(metadata.get("release_date"))
+    closes_at = _parse_date(metadata.get("late_due_date")) or _parse_date(metadata.get("due_date"))
+    if closes_at is not None:
+        if closes_at >= window_start and (release_date is None or release_date <= now):
+            # Open, or closed recently
+            return True
+    return False
+
+
 def should_sync_assignment(
     session, 
     course_id: int, 
     assignment_id: str, 
     force_sync: bool = False,
-    sync_if_older_than_hours: int = 24
+    sync_if_older_than_hours: float = DEFAULT_FRESHNESS_HOURS,
+    known_assignments: Optional[Dict[str, Assignment]] = None,
+    active_window_hours: float = DEFAULT_ACTIVE_WINDOW_HOURS,
+    now: Optional[datetime] = None
 ) -> bool:
     """
     Check if an assignment needs to be synced based on last sync time.
@@ -35,6 +136,12 @@ def should_sync_assignment(
         assignment_id: Gradescope assignment ID
         force_sync: If True, always sync regardless of last sync time
         sync_if_older_than_hours: Sync if last sync was more than N hours ago
+        known_assignments: Preloaded assignment_id -> Assignment map of the
+            course (avoids one query per assignment)
+        active_window_hours: Assignments that are open, were due or had
+            scores change within this many hours are always synced (see
+            assignment_is_active)
+        now: Reference time (default: current time)
         
     Returns:
         True if assignment should be synced, False otherwise
@@ -42,355 +149,644 @@ def should_sync_assignment(
     if force_sync:
         return True
     
-    assignment = session.query(Assignment).filter(
-        Assignment.assignment_id == str(assignment_id),
-        Assignment.course_id == course_id
-    ).first()
+    if known_assignments is not None:
+        assignment = known_assignments.get(str(assignment_id))
+    else:
+        assignment = session.query(Assignment).filter(
+            Assignment.assignment_id == str(assignment_id),
+            Assignment.course_id == course_id
+        ).first()
     
     if not assignment or not assignment.last_synced_at:
         # Never synced before, must sync
         return True
     
+    now = now or datetime.now(timezone.utc)
+    if assignment_is_active(assignment, now, active_window_hours):
+        return True
+    
     # Check if last sync was too long ago
-    now = datetime.now(timezone.utc)
     hours_since_sync = (now - assignment.last_synced_at).total_seconds() / 3600
     
     return hours_since_sync >= sync_if_older_than_hours
 
 
-def batch_upsert_submissions(
-    session,
-    assignment_db_id: int,
-    submissions_data: List[Dict[str, Any]]
-) -> int:
+def plan_incremental_sync(
+    course_gradescope_id: str,
+    assignment_ids: Iterable[str],
+    assignment_dates: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+    freshness_hours: float = DEFAULT_FRESHNESS_HOURS,
+    active_window_hours: float = DEFAULT_ACTIVE_WINDOW_HOURS,
+    force_sync: bool = False
+) -> Tuple[List[str], List[str]]:
     """
-    Batch upsert submissions using PostgreSQL's ON CONFLICT.
-    Much faster than individual inserts.
+    Split a course's Gradescope assignments into those to sync and those
+    still fresh (see should_sync_assignment).
+    
+    Dates scraped from the assignment list are stored in the existing
+    assignments' assignment_metadata first, so the decision uses them.
     
     Args:
-        session: Database session
-        assignment_db_id: Database ID of the assignment
-        submissions_data: List of submission dicts
-        
+        course_gradescope_id: Gradescope course ID
+        assignment_ids: Gradescope assignment ids, in course order
+        assignment_dates: assignment_id -> {release_date, due_date,
+            late_due_date} (ISO strings), where known
+        freshness_hours: Skip assignments synced less than this many hours ago
+        active_window_hours: See assignment_is_active
+        force_sync: Sync everything
+    
     Returns:
-        Number of submissions upserted
+        (assignment ids to sync, assignment ids skipped), both in input order
     """
-    if not submissions_data:
-        return 0
-    
-    # Prepare data for bulk upsert
-    for sub in submissions_data:
-        sub['assignment_id'] = assignment_db_id
+    assignment_ids = [str(a) for a in assignment_ids]
+    if force_sync:
+        return assignment_ids, []
     
-    # Use PostgreSQL INSERT ... ON CONFLICT DO UPDATE
+    session = SessionLocal()
     try:
-        stmt = insert(Submission).values(submissions_data)
-        stmt = stmt.on_conflict_do_update(
-            constraint='uq_assignment_student',
-            set_={
-                'total_score': stmt.excluded.total_score,
-                'max_points': stmt.excluded.max_points,
-                'status': stmt.excluded.status,
-                'submission_id': stmt.excluded.submission_id,
-                'submission_time': stmt.excluded.submission_time,
-                'lateness': stmt.excluded.lateness,
-                'view_count': stmt.excluded.view_count,
-                'submission_count': stmt.excluded.submission_count,
-                'scores_by_question': stmt.excluded.scores_by_question,
-            }
-        )
+        course = session.query(Course).filter(Course.gradescope_course_id == course_gradescope_id).first()
+        if not course:
+            return assignment_ids, []
+        known = {
+            a.assignment_id: a
+            for a in session.query(Assignment).filter(Assignment.course_id == course.id)
+        }
         
-        logger.info(f"[INFO] Executing batch upsert for {len(submissions_data)} submissions")
-        result = session.execute(stmt)
-        logger.info(f"[INFO] Batch execute completed, committing...")
+        for assignment_id, dates in (assignment_dates or {}).items():
+            assignment = known.get(str(assignment_id))
+            if assignment is None or not dates:
+                continue
+            metadata = dict(assignment.assignment_metadata or {})
+            updated = {key: dates.get(key) for key in ASSIGNMENT_DATE_KEYS if dates.get(key)}
+            if any(metadata.get(key) != value for key, value in updated.items()):
+                metadata.update(updated)
+                assignment.assignment_metadata = metadata
         session.commit()
-        logger.info(f"[INFO] Batch commit completed")
         
-        logger.info(f"Batch upserted {len(submissions_data)} submissions")
-        return len(submissions_data)
-    except Exception as e:
-        logger.error(f"[INFO] Error in batch_upsert_submissions: {e}")
-        session.rollback()
-        raise
+        now = datetime.now(timezone.utc)
+        to_sync, fresh = [], []
+        for assignment_id in assignment_ids:
+            if should_sync_assignment(
+                session, course.id, assignment_id,
+                sync_if_older_than_hours=freshness_hours,
+                known_assignments=known,
+                active_window_hours=active_window_hours,
+                now=now,
+            ):
+                to_sync.append(assignment_id)
+            else:
+                fresh.append(assignment_id)
+        return to_sync, fresh
+    finally:
+        session.close()
+
+
+def _get_or_create_course(
+    session,
+    course_gradescope_id: str,
+    course_config: Optional[Dict[str, Any]] = None
+) -> Course:
+    """Look up the course by Gradescope ID, creating or updating it from course_config."""
+    course = session.query(Course).filter(
+        Course.gradescope_course_id == course_gradescope_id
+    ).first()
+    
+    if not course:
+        logger.info(f"Course {course_gradescope_id} not found, creating...")
+
+        course_name = None
+        department = None
+        course_number = None
+        semester = None
+        year = None
+        instructor = None
+
+        if course_config:
+            course_name = course_config.get('name')
+            department = course_config.get('department')
+            course_number = course_config.get('course_number')
+            semester = course_config.get('semester')
+            year = course_config.get('year')
+            instructor = course_config.get('instructor')
 
+        course = Course(
+            gradescope_course_id=course_gradescope_id,
+            name=course_name,
+            department=department,
+            course_number=course_number,
+            semester=semester,
+            year=year,
+            instructor=instructor,
+        )
+        session.add(course)
+        session.flush()
+        logger.info(f"Created course {course_gradescope_id} with DB id {course.id}")
+    else:
+        if course_config:
+            updated = False
+            course_name = course_config.get('name')
+            department = course_config.get('department')
+            course_number = course_config.get('course_number')
+            semester = course_config.get('semester')
+            year = course_config.get('year')
+            instructor = course_config.get('instructor')
+
+            if course_name and course.name != course_name:
+                course.name = course_name
+                updated = True
+            if department and course.department != department:
+                course.department = department
+                updated = True
+            if course_number and course.course_number != course_number:
+                course.course_number = course_number
+                updated = True
+            if semester and course.semester != semester:
+                course.semester = semester
+                updated = True
+            if year and course.year != year:
+                course.year = year
+                updated = True
+            if instructor and course.instructor != instructor:
+                course.instructor = instructor
+                updated = True
 
-def batch_upsert_students(
+            if updated:
+                session.flush()
+    
+    return course
+
+
+def _get_or_create_assignment(
     session,
     course_db_id: int,
-    students_data: List[Dict[str, str]]
-) -> Dict[str, int]:
+    assignment_id: str,
+    assignment_name: str,
+    course_config: Optional[Dict[str, Any]] = None,
+    known_assignments: Optional[Dict[str, Assignment]] = None
+) -> Assignment:
     """
-    Batch upsert students and return mapping of email -> student_id.
+    Look up the assignment within the course, creating it or refreshing
+    title/category/sort key.
     
-    Args:
-        session: Database session
-        students_data: List of student dicts with 'sid' and 'email'
-        
-    Returns:
-        Dict mapping email to student_id
+    If known_assignments (Gradescope assignment ID -> Assignment) is given it is
+    used instead of querying, and newly created assignments are added to it.
     """
-    if not students_data:
-        return {}
+    if known_assignments is not None:
+        assignment = known_assignments.get(str(assignment_id))
+    else:
+        assignment = session.query(Assignment).filter(
+            Assignment.assignment_id == str(assignment_id),
+            Assignment.course_id == course_db_id
+        ).first()
     
-    # Use PostgreSQL INSERT ... ON CONFLICT DO NOTHING
-    stmt = insert(Student).values(students_data)
-    stmt = stmt.on_conflict_do_nothing(constraint='uq_student_email_course')
+    course_categories = None
+    if course_config and isinstance(course_config, dict):
+        course_categories = course_config.get('assignment_categories')
+    category = _categorize_assignment(assignment_name, course_categories)
+    sort_priority, sort_ordinal = assignment_sort_key(assignment_name, course_categories)
+
+    if not assignment:
+        assignment = Assignment(
+            assignment_id=str(assignment_id),
+            course_id=course_db_id,
+            title=assignment_name,
+            category=category,
+            sort_priority=sort_priority,
+            sort_ordinal=sort_ordinal,
+        )
+        session.add(assignment)
+        session.flush()
+        if known_assignments is not None:
+            known_assignments[str(assignment_id)] = assignment
+    else:
+        updated_assignment = False
+        if assignment.title != assignment_name:
+            assignment.title = assignment_name
+            updated_assignment = True
+        if category and assignment.category != category:
+            assignment.category = category
+            updated_assignment = True
+        if (assignment.sort_priority, assignment.sort_ordinal) != (sort_priority, sort_ordinal):
+            assignment.sort_priority = sort_priority
+            assignment.sort_ordinal = sort_ordinal
+            updated_assignment = True
+        if updated_assignment:
+            session.flush()
     
-    session.execute(stmt)
-    session.commit()
+    return assignment
+
+
+def _stage_rows(writer: StagingWriter, lines: Iterable[str]) -> GradescopeScoreParser:
+    """Parse rows as they arrive and COPY them to staging in fixed-size chunks."""
+    parser = GradescopeScoreParser()
+    writer.write_all(parser.parse(lines))
+    return parser
+
+
+def _stage_columns(writer: StagingWriter, csv_content: str) -> ColumnarScoreParser:
+    """Parse the whole CSV column-wise and COPY the resulting frame to staging."""
+    parser = ColumnarScoreParser()
+    writer.write_frame(parser.parse(csv_content))
+    return parser
+
+
+def _fingerprint_matches(assignment: Assignment, fingerprint: Tuple[str, int]) -> bool:
+    csv_sha256, csv_bytes = fingerprint
+    return assignment.csv_sha256 == csv_sha256 and assignment.csv_bytes == csv_bytes
+
+
+def _skipped_result(assignment_name: str) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "skipped": True,
+        "reason": "unchanged",
+        "assignment_name": assignment_name,
+        "students_processed": 0,
+        "submissions_processed": 0
+    }
+
+
+class CourseIngestSession:
+    """
+    Course-scoped unit of work for ingesting many assignments.
     
-    # Query to get all student IDs
-    emails = [s['email'] for s in students_data]
-    students = session.query(Student).filter(
-        Student.course_id == course_db_id,
-        Student.email.in_(emails)
-    ).all()
+    Resolves the course (and its existing assignments) once, holds a single
+    database connection for the whole run, wraps every assignment in a
+    savepoint so one bad CSV cannot abort the others, and commits after every
+    commit_every assignments instead of several times per assignment. Student
+    ids come from one StudentIdentityMap shared by all assignments.
     
-    email_to_id = {s.email: s.id for s in students}
-    logger.info(f"Batch processed {len(students_data)} students")
+    parse_engine selects how in-memory CSVs are parsed (see PARSE_ENGINES);
+    streamed CSVs are always parsed row by row.
     
-    return email_to_id
-
-
-def write_assignment_scores_optimized(
-    course_gradescope_id: str,
-    assignment_id: str,
-    assignment_name: str,
-    csv_content: str,
-    course_config: Optional[Dict[str, Any]] = None
-) -> Dict[str, Any]:
-    logger.info(f"[INFO] [{_ts()}] === Entered write_assignment_scores_optimized for {assignment_name} ===")
+    touched() reports the assignment and student ids whose submissions were
+    inserted or modified, for incremental summary maintenance.
+    
+    Usage:
+        with CourseIngestSession(course_gradescope_id, course_config) as ingest:
+            for assignment_id, name, csv_content in exports:
+                result = ingest.ingest_csv(assignment_id, name, csv_content)
     """
-    Optimized version of write_assignment_scores_to_db with batch operations.
     
-    Args:
-        course_gradescope_id: Gradescope course ID
-        assignment_id: Gradescope assignment ID
-        assignment_name: Assignment title
-        csv_content: CSV content as string
-        course_config: Optional course configuration
+    def __init__(
+        self,
+        course_gradescope_id: str,
+        course_config: Optional[Dict[str, Any]] = None,
+        commit_every: int = DEFAULT_COMMIT_EVERY,
+        chunk_size: int = DEFAULT_CHUNK_ROWS,
+        parse_engine: str = DEFAULT_PARSE_ENGINE
+    ):
+        if parse_engine not in PARSE_ENGINES:
+            raise ValueError(f"Unknown parse engine '{parse_engine}', expected one of {PARSE_ENGINES}")
+        if parse_engine == "columnar" and not columnar_parsing_available():
+            logger.warning("pandas is not installed, falling back to the row parser")
+            parse_engine = "rows"
         
-    Returns:
-        Dict with sync results
-    """
-    import time as _time
-    _fn_start = _time.time()
-    # print(f"[{_ts()}] DB: Starting write_assignment_scores_optimized for {assignment_name}")
+        self.course_gradescope_id = course_gradescope_id
+        self.course_config = course_config
+        self.commit_every = max(1, commit_every)
+        self.chunk_size = chunk_size
+        self.parse_engine = parse_engine
+        self.assignments_ingested = 0
+        self.touched_assignment_ids = set()
+        self.touched_student_ids = set()
+        self._uncommitted = 0
+        self._data_changed = False
+        
+        # One connection for the whole course; the session commits on it
+        # without returning it to the pool in between.
+        self.connection = engine.connect()
+        self.session = SessionLocal(bind=self.connection, expire_on_commit=False)
+        try:
+            course = _get_or_create_course(self.session, course_gradescope_id, course_config)
+            self.course = course
+            self.course_id = course.id
+            self.students = StudentIdentityMap(self.course_id).load(self.session)
+            self._assignments = {
+                a.assignment_id: a
+                for a in self.session.query(Assignment).filter(Assignment.course_id == self.course_id)
+            }
+            self.session.commit()
+        except Exception:
+            self.close(commit=False)
+            raise
     
-    logger.info(f"[INFO] [{_ts()}] Attempting to create DB session for {assignment_name}...")
-    session = SessionLocal()
-    logger.info(f"[INFO] [{_ts()}] DB session created successfully for {assignment_name} ({_time.time() - _fn_start:.2f}s)")
+    def __enter__(self):
+        return self
     
-    try:
-        # Get or create course
-        _step_start = _time.time()
-        course = session.query(Course).filter(
-            Course.gradescope_course_id == course_gradescope_id
-        ).first()
-        # print(f"[{_ts()}] DB: Course query ({_time.time() - _step_start:.2f}s)")
-        
-        if not course:
-                logger.info(f"Course {course_gradescope_id} not found, creating...")
-
-                course_name = None
-                department = None
-                course_number = None
-                semester = None
-                year = None
-                instructor = None
-
-                if course_config:
-                    course_name = course_config.get('name')
-                    department = course_config.get('department')
-                    course_number = course_config.get('course_number')
-                    semester = course_config.get('semester')
-                    year = course_config.get('year')
-                    instructor = course_config.get('instructor')
-
-                course = Course(
-                    gradescope_course_id=course_gradescope_id,
-                    name=course_name,
-                    department=department,
-                    course_number=course_number,
-                    semester=semester,
-                    year=year,
-                    instructor=instructor,
-                )
-                session.add(course)
-                session.flush()
-                logger.info(f"Created course {course_gradescope_id} with DB id {course.id}")
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+        return False
+    
+    def ingest_csv(
+        self,
+        assignment_id: str,
+        assignment_name: str,
+        csv_content: str,
+        force: bool = False
+    ) -> Dict[str, Any]:
+        """Ingest an in-memory scores CSV. See write_assignment_scores_optimized."""
+        if self.parse_engine == "columnar":
+            stage = lambda writer: _stage_columns(writer, csv_content)
         else:
-                if course_config:
-                    updated = False
-                    course_name = course_config.get('name')
-                    department = course_config.get('department')
-                    course_number = course_config.get('course_number')
-                    semester = course_config.get('semester')
-                    year = course_config.get('year')
-                    instructor = course_config.get('instructor')
-
-                    if course_name and course.name != course_name:
-                        course.name = course_name
-                        updated = True
-                    if department and course.department != department:
-                        course.department = department
-                        updated = True
-                    if course_number and course.course_number != course_number:
-                        course.course_number = course_number
-                        updated = True
-                    if semester and course.semester != semester:
-                        course.semester = semester
-                        updated = True
-                    if year and course.year != year:
-                        course.year = year
-                        updated = True
-                    if instructor and course.instructor != instructor:
-                        course.instructor = instructor
-                        updated = True
-
-                    if updated:
-                        session.flush()
-        
-        # Get or create assignment
-        _step_start = _time.time()
-        assignment = session.query(Assignment).filter(
-            Assignment.assignment_id == str(assignment_id),
-            Assignment.course_id == course.id
-        ).first()
-        # print(f"[{_ts()}] DB: Assignment query ({_time.time() - _step_start:.2f}s)")
-        
-        course_categories = None
-        if course_config and isinstance(course_config, dict):
-            course_categories = course_config.get('assignment_categories')
-        category = _categorize_assignment(assignment_name, course_categories)
-
-        if not assignment:
-            assignment = Assignment(
-                assignment_id=str(assignment_id),
-                course_id=course.id,
-                title=assignment_name,
-                category=category,
+            stage = lambda writer: _stage_rows(writer, io.StringIO(csv_content))
+        return self._ingest_in_savepoint(
+            assignment_id,
+            assignment_name,
+            stage,
+            force=force,
+            fingerprint=csv_fingerprint(csv_content),
+        )
+    
+    def ingest_stream(
+        self,
+        assignment_id: str,
+        assignment_name: str,
+        byte_chunks: Iterable[bytes],
+        force: bool = False
+    ) -> Dict[str, Any]:
+        """Ingest a scores CSV while it is being downloaded. See stream_assignment_scores."""
+        stream_fingerprint = CsvFingerprint()
+        lines = iter_csv_lines(byte_chunks, on_chunk=stream_fingerprint.update)
+        return self._ingest_in_savepoint(
+            assignment_id,
+            assignment_name,
+            lambda writer: _stage_rows(writer, lines),
+            force=force,
+            stream_fingerprint=stream_fingerprint,
+        )
+    
+    def touched(self) -> Dict[str, List[int]]:
+        """Database ids of assignments/students with new or modified submissions."""
+        return {
+            "assignment_ids": sorted(self.touched_assignment_ids),
+            "student_ids": sorted(self.touched_student_ids),
+        }
+    
+    def commit(self):
+        """Commit all assignments ingested since the last commit."""
+        # The identity map holds the whole roster, so the count is free here
+        student_count = len(self.students.by_email)
+        if self.course.number_of_students != student_count:
+            self.course.number_of_students = student_count
+        if self._data_changed:
+            # Same transaction as the data, so readers never see one without the
+            # other, and a summary refresh that never runs is not forgotten
+            bump_data_version(self.session, self.course_id)
+            set_summary_dirty(self.session, self.course_id)
+            self._data_changed = False
+        if self._uncommitted:
+            logger.info(f"[INFO] Committing {self._uncommitted} assignments for course {self.course_gradescope_id}")
+        self.session.commit()
+        self._uncommitted = 0
+    
+    def close(self, commit: bool = True):
+        """Commit (or roll back) outstanding work and release the connection."""
+        try:
+            if commit:
+                self.commit()
+            else:
+                self.session.rollback()
+        finally:
+            self.session.close()
+            self.connection.close()
+    
+    def _ingest_in_savepoint(self, assignment_id: str, assignment_name: str, stage, **kwargs) -> Dict[str, Any]:
+        savepoint = self.session.begin_nested()
+        try:
+            result, touched_assignment_id, touched_student_ids = self._ingest(
+                assignment_id, assignment_name, stage, **kwargs
             )
-            session.add(assignment)
-            session.flush()
-        else:
-            updated_assignment = False
-            if assignment.title != assignment_name:
-                assignment.title = assignment_name
-                updated_assignment = True
-            if category and assignment.category != category:
-                assignment.category = category
-                updated_assignment = True
-            if updated_assignment:
-                session.flush()
+            savepoint.commit()
+            self.students.checkpoint()
+        except Exception as e:
+            savepoint.rollback()
+            # Objects loaded or created inside the savepoint may now be stale
+            self._assignments.pop(str(assignment_id), None)
+            self.students.discard_pending()
+            logger.error(f"Error syncing {assignment_name}: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        
+        if touched_assignment_id is not None:
+            self.touched_assignment_ids.add(touched_assignment_id)
+            self._data_changed = True
+        self.touched_student_ids.update(touched_student_ids)
+        self.assignments_ingested += 1
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+        return result
+    
+    def _ingest(
+        self,
+        assignment_id: str,
+        assignment_name: str,
+        stage: Callable[[StagingWriter], Any],
+        force: bool = False,
+        fingerprint: Optional[Tuple[str, int]] = None,
+        stream_fingerprint: Optional[CsvFingerprint] = None
+    ) -> Tuple[Dict[str, Any], Optional[int], List[int]]:
+        """
+        Parse a CSV and load it through the COPY staging table.
         
-        # Parse CSV
-        reader = csv.DictReader(io.StringIO(csv_content))
+        stage(writer) parses the CSV into the writer and returns the parser
+        (see _stage_rows / _stage_columns). Exactly one of fingerprint (known
+        before parsing) or stream_fingerprint (filled while the CSV is
+        consumed) must be given. Never commits.
         
-        # Collect data for batch operations
-        students_data = []
-        submissions_data = []
-        seen_emails = set()
-        assignment_max_points = 0.0
+        Returns:
+            (result dict, touched assignment id or None, touched student ids)
+        """
+        session = self.session
+        is_new = str(assignment_id) not in self._assignments
+        assignment = _get_or_create_assignment(
+            session, self.course_id, assignment_id, assignment_name,
+            self.course_config, known_assignments=self._assignments
+        )
         
-        for row in reader:
-            email = row.get('Email', '').strip()
-            sid = row.get('SID', '').strip()
-            
-            if not email or email in seen_emails:
-                continue
-            
-            seen_emails.add(email)
-            
-            # Student data
-            students_data.append({
-                'course_id': course.id,
-                'email': email,
-                'sid': sid,
-                'legal_name': row.get(reader.fieldnames[0], '') if reader.fieldnames else ''
-            })
-            
-            parsed_max_points = float(row.get('Max Points', 0) or 0)
-            if parsed_max_points > assignment_max_points:
-                assignment_max_points = parsed_max_points
-
-            # Submission data (will add student_id later)
-            submission = {
-                'total_score': float(row.get('Total Score', 0) or 0),
-                'max_points': parsed_max_points,
-                'status': row.get('Status', ''),
-                'submission_id': row.get('Submission ID', ''),
-                'submission_time': None,  # Initialize to None, will be set if parsing succeeds
-                'lateness': row.get('Lateness (H:M:S)', ''),
-                'view_count': int(row.get('View Count', 0) or 0),
-                'submission_count': int(row.get('Submission Count', 0) or 0),
-                'scores_by_question': {},  # Initialize to empty dict
-            }
-            
-            # Parse submission time, expecting "YYYY-MM-DD HH:MM:SS ZZZZ" format
-            sub_time_str = row.get('Submission Time', '')
-            if sub_time_str:
-                try:
-                    # This handles formats like "2025-09-17 15:38:04 -0700"
-                    parsed_time = datetime.strptime(sub_time_str, "%Y-%m-%d %H:%M:%S %z")
-                    submission['submission_time'] = parsed_time
-                except ValueError:
-                    # If parsing fails, keep submission_time as None
-                    logger.warning(f"Failed to parse submission time '{sub_time_str}' for {email}")
-            
-            submissions_data.append({**submission, 'email': email})
-
-        if assignment_max_points > 0 and (assignment.max_points is None or float(assignment.max_points or 0) <= 0):
-            assignment.max_points = assignment_max_points
+        # Skip ingestion entirely when the CSV is byte-identical to the last one
+        if fingerprint is not None and not force and _fingerprint_matches(assignment, fingerprint):
+            assignment.last_synced_at = datetime.now(timezone.utc)
             session.flush()
+            logger.info(f"Skipped {assignment_name}: scores.csv unchanged ({fingerprint[1]} bytes)")
+            return _skipped_result(assignment_name), (assignment.id if is_new else None), []
         
-        # Batch upsert students
-        logger.info(f"[INFO] Starting batch_upsert_students for {assignment_name}")
-        email_to_id = batch_upsert_students(session, course.id, students_data)
-        logger.info(f"[INFO] batch_upsert_students completed, got {len(email_to_id)} student IDs")
+        writer = StagingWriter(session, self.students, chunk_size=self.chunk_size)
+        parser = stage(writer)
+        logger.info(
+            f"[INFO] Staged {writer.rows_staged} rows for {assignment_name} "
+            f"in {writer.chunks_flushed} chunks ({writer.students_inserted} new students)"
+        )
         
-        # Add student_id to submissions and remove email
-        logger.info(f"[INFO] Preparing final submissions for {assignment_name}")
-        final_submissions = []
-        for sub in submissions_data:
-            email = sub.pop('email')
-            student_id = email_to_id.get(email)
-            if student_id:
-                sub['student_id'] = student_id
-                final_submissions.append(sub)
-        logger.info(f"[INFO] Prepared {len(final_submissions)} final submissions")
+        # Streamed CSVs are only fully hashed once the body has been read
+        if stream_fingerprint is not None:
+            fingerprint = stream_fingerprint.result()
+            if not force and _fingerprint_matches(assignment, fingerprint):
+                assignment.last_synced_at = datetime.now(timezone.utc)
+                session.flush()
+                logger.info(f"Skipped {assignment_name}: scores.csv unchanged ({fingerprint[1]} bytes)")
+                return _skipped_result(assignment_name), (assignment.id if is_new else None), []
+
+        if parser.max_points > 0 and (assignment.max_points is None or float(assignment.max_points or 0) <= 0):
+            assignment.max_points = parser.max_points
+        if list(assignment.question_headers or []) != parser.question_headers:
+            assignment.question_headers = parser.question_headers
         
-        # Batch upsert submissions
-        logger.info(f"[INFO] Starting batch_upsert_submissions for {assignment_name}")
-        num_submissions = batch_upsert_submissions(
-            session,
-            assignment.id,
-            final_submissions
-        )
-        logger.info(f"[INFO] batch_upsert_submissions completed, processed {num_submissions} submissions")
+        counts = merge_staged_scores(session, assignment.id)
+        changed_student_ids = counts.pop('changed_student_ids')
+        num_submissions = counts['inserted'] + counts['updated'] + counts['unchanged']
         
-        # Update assignment sync timestamp
-        logger.info(f"[INFO] Updating last_synced_at for {assignment_name}")
         assignment.last_synced_at = datetime.now(timezone.utc)
-        session.commit()
-        logger.info(f"[INFO] Session committed for {assignment_name}")
+        if changed_student_ids and not is_new:
+            # New submissions or regrades keep the assignment in incremental syncs
+            assignment.scores_changed_at = assignment.last_synced_at
+        assignment.csv_sha256, assignment.csv_bytes = fingerprint
+        session.flush()
         
-        logger.info(f"Successfully synced {assignment_name}: {num_submissions} submissions")
+        logger.info(f"Successfully synced {assignment_name}: {num_submissions} submissions ({counts})")
         
-        return {
+        result = {
             "success": True,
             "assignment_name": assignment_name,
-            "students_processed": len(students_data),
-            "submissions_processed": num_submissions
+            "students_processed": counts['students'],
+            "students_inserted": writer.students_inserted,
+            "submission_times_unparsed": parser.unparsed_times,
+            "submissions_processed": num_submissions,
+            "submissions_inserted": counts['inserted'],
+            "submissions_updated": counts['updated'],
+            "submissions_unchanged": counts['unchanged']
         }
-        
+        touched_assignment_id = assignment.id if (is_new or changed_student_ids) else None
+        return result, touched_assignment_id, changed_student_ids
+
+
+def _ingest_single_assignment(
+    course_gradescope_id: str,
+    course_config: Optional[Dict[str, Any]],
+    ingest_fn: Callable[[CourseIngestSession], Dict[str, Any]],
+    assignment_name: str,
+    **session_kwargs
+) -> Dict[str, Any]:
+    """Run one assignment through a short-lived CourseIngestSession."""
+    try:
+        with CourseIngestSession(course_gradescope_id, course_config, **session_kwargs) as ingest:
+            return ingest_fn(ingest)
     except Exception as e:
-        session.rollback()
         logger.error(f"Error syncing {assignment_name}: {e}")
         return {
             "success": False,
             "error": str(e)
         }
+
+
+def write_assignment_scores_optimized(
+    course_gradescope_id: str,
+    assignment_id: str,
+    assignment_name: str,
+    csv_content: str,
+    course_config: Optional[Dict[str, Any]] = None,
+    force: bool = False,
+    parse_engine: str = DEFAULT_PARSE_ENGINE
+) -> Dict[str, Any]:
+    """
+    Optimized version of write_assignment_scores_to_db with batch operations.
+    
+    Ingests a single assignment in its own transaction. To ingest many
+    assignments of a course, use CourseIngestSession directly.
+    
+    Args:
+        course_gradescope_id: Gradescope course ID
+        assignment_id: Gradescope assignment ID
+        assignment_name: Assignment title
+        csv_content: CSV content as string
+        course_config: Optional course configuration
+        force: Re-ingest even if the CSV fingerprint is unchanged
+        parse_engine: "rows" or "columnar" (pandas), see PARSE_ENGINES
+        
+    Returns:
+        Dict with sync results. Unchanged CSVs return early with
+        ``skipped=True`` and ``reason='unchanged'``.
+    """
+    logger.info(f"[INFO] [{_ts()}] === Entered write_assignment_scores_optimized for {assignment_name} ===")
+    return _ingest_single_assignment(
+        course_gradescope_id,
+        course_config,
+        lambda ingest: ingest.ingest_csv(assignment_id, assignment_name, csv_content, force=force),
+        assignment_name,
+        parse_engine=parse_engine,
+    )
+
+
+def stream_assignment_scores(
+    course_gradescope_id: str,
+    assignment_id: str,
+    assignment_name: str,
+    byte_chunks: Iterable[bytes],
+    course_config: Optional[Dict[str, Any]] = None,
+    force: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_ROWS
+) -> Dict[str, Any]:
+    """
+    Streaming variant of write_assignment_scores_optimized.
     
+    Consumes the CSV body incrementally (e.g. GradescopeClient.stream_scores),
+    parses rows as they arrive and COPYs them to the database in fixed-size
+    chunks, so peak memory does not depend on class size or the number of
+    question columns. The fingerprint is computed on the fly and checked
+    before the staged rows are merged.
+    
+    Args:
+        course_gradescope_id: Gradescope course ID
+        assignment_id: Gradescope assignment ID
+        assignment_name: Assignment title
+        byte_chunks: Iterable of raw CSV bytes
+        course_config: Optional course configuration
+        force: Re-ingest even if the CSV fingerprint is unchanged
+        chunk_size: Rows per COPY round-trip
+        
+    Returns:
+        Dict with sync results (same shape as write_assignment_scores_optimized)
+    """
+    logger.info(f"[INFO] [{_ts()}] === Entered stream_assignment_scores for {assignment_name} ===")
+    return _ingest_single_assignment(
+        course_gradescope_id,
+        course_config,
+        lambda ingest: ingest.ingest_stream(assignment_id, assignment_name, byte_chunks, force=force),
+        assignment_name,
+        chunk_size=chunk_size,
+    )
+
+
+def count_course_students(course_gradescope_id: str) -> int:
+    """Return the number of students stored for a course."""
+    session = SessionLocal()
+    try:
+        return session.query(Student).join(
+            Course, Student.course_id == Course.id
+        ).filter(
+            Course.gradescope_course_id == course_gradescope_id
+        ).count()
     finally:
         session.close()
+
+
+def update_course_student_count(course_gradescope_id: str) -> Optional[int]:
+    """
+    Recount a course's students into courses.number_of_students.
+    
+    Needed when several ingest sessions wrote the same course concurrently,
+    since each one only counts the students in its own identity map.
+    """
+    with engine.begin() as connection:
+        return connection.execute(
+            text(
+                "UPDATE courses SET number_of_students = "
+                "(SELECT count(*) FROM students WHERE students.course_id = courses.id) "
+                "WHERE gradescope_course_id = :course_id "
+                "RETURNING number_of_students"
+            ),
+            {"course_id": course_gradescope_id},
+        ).scalar()
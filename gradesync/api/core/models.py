@@ -1,5 +1,5 @@
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Numeric, JSON, Text, UniqueConstraint, Boolean, ARRAY
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Numeric, JSON, Text, UniqueConstraint, Boolean, ARRAY, Index, text
 from sqlalchemy.dialects.postgresql import INET, JSONB
 from sqlalchemy.sql import func
 
@@ -38,6 +38,12 @@ class Course(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
     is_active = Column(Boolean, default=True)
     last_synced_at = Column(DateTime(timezone=True), index=True)  # Track last full sync
+    source_synced_at = Column(JSONB)  # Source -> start of its last successful sync (ISO 8601)
+    sync_failed_at = Column(DateTime(timezone=True))  # End of the last failed sync, if still failing
+    sync_failure_count = Column(Integer, nullable=False, default=0, server_default="0")  # Failed syncs in a row
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Bumped when grades change
+    data_updated_at = Column(DateTime(timezone=True))  # When data_version was last bumped
+    summary_dirty = Column(Boolean, nullable=False, default=False, server_default=text("false"))  # summary_sheets lags submissions
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -75,7 +81,7 @@ class CourseConfig(Base):
     # Gradescope
     gradescope_enabled = Column(Boolean, default=False)
     gradescope_course_id = Column(String(255))
-    gradescope_sync_interval_hours = Column(Integer, default=24)
+    gradescope_sync_interval_hours = Column(Integer)  # NULL: config.json / global_settings interval
     
     # PrairieLearn
     prairielearn_enabled = Column(Boolean, default=False)
@@ -165,8 +171,18 @@ class Assignment(Base):
     assignment_metadata = Column(JSON)
     last_synced_at = Column(DateTime(timezone=True), index=True)  # Track last sync time
     gradescope_updated_at = Column(DateTime(timezone=True))  # From Gradescope API
+    csv_sha256 = Column(String(64))  # Fingerprint of the last ingested scores.csv
+    csv_bytes = Column(Integer)  # Byte length of the last ingested scores.csv
+    scores_changed_at = Column(DateTime(timezone=True))  # Last sync that inserted/updated submissions
+    question_headers = Column(ARRAY(Text))  # Per-question CSV headers, in column order
+    sort_priority = Column(Integer)  # Summary column order: category priority...
+    sort_ordinal = Column(Integer)  # ...then the number in the title (see ingest.assignment_sort_key)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    __table_args__ = (
+        Index('ix_assignments_course_category', 'course_id', 'category'),
+        Index('ix_assignments_course_sort', 'course_id', 'sort_priority', 'sort_ordinal', 'id'),
+    )
 
 
 class Student(Base):
@@ -179,6 +195,8 @@ class Student(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     __table_args__ = (
         UniqueConstraint('email', 'course_id', name='uq_student_email_course'),
+        # Keyset pagination of the summary in name order
+        Index('ix_students_course_sort_name', 'course_id', text("(lower(coalesce(legal_name, '')) COLLATE \"C\")"), 'id'),
     )
 
 
@@ -196,6 +214,7 @@ class Submission(Base):
     view_count = Column(Integer)
     submission_count = Column(Integer)
     scores_by_question = Column(JSON)
+    question_scores = Column(ARRAY(Numeric))  # Indexed like Assignment.question_headers
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     __table_args__ = (
         UniqueConstraint('assignment_id', 'student_id', name='uq_assignment_student'),
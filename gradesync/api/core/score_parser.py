@@ -0,0 +1,165 @@
+"""
+Incremental parser for Gradescope scores.csv exports.
+
+Works on an iterable of text lines, so the same code parses an in-memory CSV
+(``io.StringIO``) and an HTTP response that is still being downloaded. Rows are
+yielded one at a time as tuples in staging-table order; nothing is kept per row
+after it has been yielded.
+"""
+import csv
+import codecs
+import logging
+from typing import Iterable, Iterator, Optional, Tuple, Any
+
+from .timestamps import SubmissionTimeParser
+
+logger = logging.getLogger(__name__)
+
+# Fixed Gradescope columns; every other column (except the leading name
+# column) is a per-question score.
+KNOWN_COLUMNS = frozenset({
+    "Name", "First Name", "Last Name", "SID", "Email", "Sections",
+    "Total Score", "Max Points", "Status", "Submission ID", "Submission Time",
+    "Lateness (H:M:S)", "View Count", "Submission Count",
+})
+
+
+def _question_score(value: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def iter_csv_lines(byte_chunks: Iterable[bytes], on_chunk=None) -> Iterator[str]:
+    """
+    Decode a stream of UTF-8 byte chunks into newline-terminated text lines.
+
+    Chunks may split lines and multi-byte characters at arbitrary points.
+    Only ``\\n`` is treated as a line break; ``csv.reader`` re-joins quoted
+    fields that span lines.
+
+    Args:
+        byte_chunks: Iterable of raw bytes (e.g. ``response.iter_content()``)
+        on_chunk: Optional callback invoked with every raw chunk (fingerprinting)
+
+    Yields:
+        Text lines including their trailing newline
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for chunk in byte_chunks:
+        if not chunk:
+            continue
+        if on_chunk:
+            on_chunk(chunk)
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+class GradescopeScoreParser:
+    """
+    Parse Gradescope score rows into staging tuples.
+
+    Fixed Gradescope columns are read by position and per-question columns
+    are collected into a list of floats (``None`` for blank cells) without
+    building a dict per row. After parsing, ``max_points`` holds the largest
+    "Max Points" value seen, ``rows_parsed`` the number of rows yielded,
+    ``question_headers`` the per-question headers the lists are indexed by and
+    ``unparsed_times`` the number of submission times that could not be parsed.
+    """
+
+    def __init__(self):
+        self.max_points = 0.0
+        self.rows_parsed = 0
+        self.fieldnames = None
+        self.question_headers = []
+        self.times = SubmissionTimeParser()
+
+    @property
+    def unparsed_times(self) -> int:
+        return self.times.unparsed
+
+    def parse(self, lines: Iterable[str]) -> Iterator[Tuple[Any, ...]]:
+        """
+        Yield one tuple per student row, in bulk_load.ROW_COLUMNS order.
+
+        Rows without an email are skipped. Duplicate emails are kept here and
+        resolved by the loader (first occurrence wins, by row number).
+        """
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if not header:
+            return
+        self.fieldnames = header
+
+        positions = {}
+        for position, name in enumerate(header):
+            positions.setdefault(name, position)
+
+        def col(name: str) -> Optional[int]:
+            return positions.get(name)
+
+        # First column holds the name (header may carry a BOM, so use position)
+        name_idx = 0
+        sid_idx = col('SID')
+        email_idx = col('Email')
+        total_idx = col('Total Score')
+        max_idx = col('Max Points')
+        status_idx = col('Status')
+        submission_id_idx = col('Submission ID')
+        time_idx = col('Submission Time')
+        lateness_idx = col('Lateness (H:M:S)')
+        view_idx = col('View Count')
+        count_idx = col('Submission Count')
+        question_idxs = [
+            position for position, name in enumerate(header)
+            if position != name_idx and name not in KNOWN_COLUMNS
+        ]
+        self.question_headers = [header[position] for position in question_idxs]
+
+        for row_no, row in enumerate(reader):
+            width = len(row)
+
+            def get(idx: Optional[int]) -> str:
+                if idx is None or idx >= width:
+                    return ''
+                return row[idx]
+
+            email = get(email_idx).strip()
+            if not email:
+                continue
+
+            parsed_max_points = float(get(max_idx) or 0)
+            if parsed_max_points > self.max_points:
+                self.max_points = parsed_max_points
+
+            # Format is learned from the first timestamp of the file
+            submission_time = self.times.parse(get(time_idx))
+
+            self.rows_parsed += 1
+            yield (
+                row_no,
+                email,
+                get(sid_idx).strip(),
+                get(name_idx),
+                float(get(total_idx) or 0),
+                parsed_max_points,
+                get(status_idx),
+                get(submission_id_idx),
+                submission_time,
+                get(lateness_idx),
+                int(get(view_idx) or 0),
+                int(get(count_idx) or 0),
+                [_question_score(get(idx)) for idx in question_idxs],
+            )
+
+        self.times.log_summary()
@@ -0,0 +1,146 @@
+"""
+Materialized-view backend for the course summary grid.
+
+Alternative to the hand-maintained ``summary_sheets`` table: PostgreSQL
+computes the student x assignment grid for every course in one pass, and
+``REFRESH MATERIALIZED VIEW CONCURRENTLY`` (enabled by the unique index)
+rebuilds it after a sync without blocking readers.
+
+Selected with ``"summary_backend": "matview"`` in ``global_settings``; see
+migrations/005_summary_grid_matview.sql for the equivalent DDL.
+
+A refresh always recomputes every course, so refresh requests that arrive
+while one is running are coalesced: they wait for it to finish and are all
+served by a single follow-up refresh, instead of queueing one full refresh
+per course sync.
+"""
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+from sqlalchemy import column, table, text
+from .db import engine
+from .data_version import bump_data_versions
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MATVIEW = "summary_grid"
+
+SUMMARY_BACKENDS = ("table", "matview")
+
+# Not part of the ORM metadata, so create_all never tries to create it as a table
+summary_grid = table(
+    SUMMARY_MATVIEW,
+    column("course_id"),
+    column("student_id"),
+    column("assignment_id"),
+    column("score"),
+)
+
+_CREATE_MATVIEW_SQL = f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS {SUMMARY_MATVIEW} AS
+SELECT
+    st.course_id,
+    st.id AS student_id,
+    a.id AS assignment_id,
+    sub.total_score AS score
+FROM students st
+JOIN assignments a ON a.course_id = st.course_id
+LEFT JOIN submissions sub
+    ON sub.assignment_id = a.id AND sub.student_id = st.id
+WHERE st.course_id IS NOT NULL
+"""
+
+# Required for REFRESH ... CONCURRENTLY
+_CREATE_UNIQUE_INDEX_SQL = f"""
+CREATE UNIQUE INDEX IF NOT EXISTS uq_{SUMMARY_MATVIEW}_cell
+ON {SUMMARY_MATVIEW} (course_id, student_id, assignment_id)
+"""
+
+
+def ensure_summary_matview() -> None:
+    """Create the materialized view and its unique index if missing."""
+    with engine.begin() as conn:
+        conn.execute(text(_CREATE_MATVIEW_SQL))
+        conn.execute(text(_CREATE_UNIQUE_INDEX_SQL))
+
+
+class _CoalescingRefresher:
+    """
+    Serialize matview refreshes within the process and merge waiting requests.
+
+    A request is satisfied by the first refresh that starts after it was
+    made. Only one refresh runs at a time; requests made meanwhile share the
+    next one, which bumps the data version of every course they asked for.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._running = False
+        self._started = 0
+        self._completed = 0
+        self._pending = set()
+        self._last_result = {}
+
+    def request(self, course_db_ids: Iterable[int], concurrently: bool) -> dict:
+        with self._cond:
+            self._pending.update(course_db_ids)
+            target = self._started + 1
+            while self._completed < target:
+                if self._running:
+                    self._cond.wait()
+                    continue
+                self._running = True
+                self._started += 1
+                generation = self._started
+                courses, self._pending = self._pending, set()
+                self._cond.release()
+                result = None
+                try:
+                    result = _refresh(courses, concurrently)
+                    result["coalesced"] = len(courses)
+                finally:
+                    self._cond.acquire()
+                    self._running = False
+                    if result is None:
+                        # Failed: waiters run another refresh, still for these courses
+                        self._pending.update(courses)
+                    else:
+                        self._completed = generation
+                        self._last_result = result
+                    self._cond.notify_all()
+                return dict(result)
+            return dict(self._last_result, coalesced=0)
+
+
+def _refresh(course_db_ids, concurrently: bool) -> dict:
+    ensure_summary_matview()
+    started = time.time()
+    with engine.begin() as conn:
+        keyword = " CONCURRENTLY" if concurrently else ""
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW{keyword} {SUMMARY_MATVIEW}"))
+        bump_data_versions(conn, course_db_ids)
+    elapsed = time.time() - started
+    logger.info(f"Refreshed {SUMMARY_MATVIEW} in {elapsed:.2f}s for {len(course_db_ids)} course(s)")
+    return {"seconds": round(elapsed, 3)}
+
+
+_refresher = _CoalescingRefresher()
+
+
+def refresh_summary_matview(course_db_ids: Optional[Iterable[int]] = None, concurrently: bool = True) -> dict:
+    """
+    Recompute the summary grid for all courses.
+
+    With concurrently=True readers keep seeing the previous contents until
+    the refresh commits. The data version of the given courses (the ones
+    whose data changed) is bumped in the same transaction; other courses'
+    grids are unchanged by the refresh. Calls made while a refresh is
+    running wait for it and share one follow-up refresh.
+
+    Returns:
+        Dict with 'seconds' spent refreshing and 'coalesced', the number of
+        courses served by the refresh this call ran (0 when another caller's
+        refresh covered this one)
+    """
+    return _refresher.request(course_db_ids or (), concurrently)
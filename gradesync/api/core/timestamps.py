@@ -0,0 +1,140 @@
+"""
+Submission-time parsing shared by the legacy and optimized ingest paths.
+
+Gradescope exports use one timestamp format per file, so the parser learns the
+format from the first value it can parse and tries that format first for every
+following value; the full list of candidate formats is only tried when a value
+does not match. The Gradescope default format ("2025-09-17 15:38:04 -0700")
+is parsed by slicing instead of ``strptime``.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+GRADESCOPE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+
+# Candidate formats; the Gradescope default is tried first, then the ISO forms,
+# then the rest in order (see _DETECT_ORDER)
+SUBMISSION_TIME_FORMATS = (
+    GRADESCOPE_TIME_FORMAT,
+    "%Y-%m-%dT%H:%M:%S %z",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%y %I:%M %p",
+    "%m/%d/%Y %I:%M %p",
+)
+
+# Pseudo-format recorded when values parse with datetime.fromisoformat
+ISO_FORMAT = "iso"
+
+# fromisoformat also accepts the Gradescope default on Python 3.11+, so it must
+# come after GRADESCOPE_TIME_FORMAT or the slice parser would never be learned
+_DETECT_ORDER = (GRADESCOPE_TIME_FORMAT, ISO_FORMAT) + tuple(
+    fmt for fmt in SUBMISSION_TIME_FORMATS if fmt != GRADESCOPE_TIME_FORMAT
+)
+
+_OFFSETS: Dict[str, timezone] = {}
+
+
+def _offset(text: str) -> timezone:
+    """Cached timezone for a "+HHMM" / "-HHMM" offset."""
+    tz = _OFFSETS.get(text)
+    if tz is None:
+        minutes = int(text[1:3]) * 60 + int(text[3:5])
+        if text[0] == '-':
+            minutes = -minutes
+        elif text[0] != '+':
+            raise ValueError(f"Invalid UTC offset '{text}'")
+        tz = timezone(timedelta(minutes=minutes))
+        _OFFSETS[text] = tz
+    return tz
+
+
+def _parse_gradescope(value: str) -> datetime:
+    """Slice-based equivalent of strptime(value, GRADESCOPE_TIME_FORMAT)."""
+    if len(value) != 25 or value[4] != '-' or value[7] != '-' or value[10] != ' ' or value[19] != ' ':
+        raise ValueError(value)
+    return datetime(
+        int(value[0:4]), int(value[5:7]), int(value[8:10]),
+        int(value[11:13]), int(value[14:16]), int(value[17:19]),
+        tzinfo=_offset(value[20:25]),
+    )
+
+
+def _parse_with(value: str, fmt: str) -> datetime:
+    if fmt == GRADESCOPE_TIME_FORMAT:
+        return _parse_gradescope(value)
+    if fmt == ISO_FORMAT:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return datetime.strptime(value, fmt)
+
+
+class SubmissionTimeParser:
+    """
+    Parse the submission-time column of one CSV.
+
+    Use one instance per file. ``format`` holds the learned format (None until
+    a value has been parsed), ``parsed`` and ``unparsed`` count non-empty
+    values, and ``first_unparsed`` keeps an example for logging.
+    """
+
+    def __init__(self):
+        self.format: Optional[str] = None
+        self.parsed = 0
+        self.unparsed = 0
+        self.first_unparsed: Optional[str] = None
+
+    def parse(self, value: Optional[str]) -> Optional[datetime]:
+        """Parse one value; returns None for empty or unparseable values."""
+        if not value:
+            return None
+        cleaned = value.strip()
+        if not cleaned:
+            return None
+
+        if self.format is not None:
+            try:
+                result = _parse_with(cleaned, self.format)
+                self.parsed += 1
+                return result
+            except ValueError:
+                pass
+
+        result = self._detect(cleaned)
+        if result is None:
+            self.unparsed += 1
+            if self.first_unparsed is None:
+                self.first_unparsed = cleaned
+        else:
+            self.parsed += 1
+        return result
+
+    def _detect(self, value: str) -> Optional[datetime]:
+        """Try every known format and remember the first one that matches."""
+        for fmt in _DETECT_ORDER:
+            if fmt == self.format:
+                continue
+            try:
+                result = _parse_with(value, fmt)
+            except ValueError:
+                continue
+            if self.format != fmt:
+                logger.debug(f"Submission time format detected: {fmt}")
+            self.format = fmt
+            return result
+        return None
+
+    def log_summary(self, context: str = "") -> None:
+        """Warn once per file if any values could not be parsed."""
+        if self.unparsed:
+            logger.warning(
+                f"Failed to parse {self.unparsed} submission times{' for ' + context if context else ''} "
+                f"(e.g. '{self.first_unparsed}')"
+            )
+
+
+def parse_submission_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a single submission timestamp (no format learning)."""
+    return SubmissionTimeParser().parse(value)
@@ -0,0 +1,10 @@
+-- Migration: Add scores.csv fingerprint columns to assignments
+-- Date: 2026-10-16
+-- Description: Stores a content hash and byte length of the last ingested
+--              Gradescope scores.csv so unchanged assignments can be skipped
+
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS csv_sha256 VARCHAR(64);
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS csv_bytes INTEGER;
+
+COMMENT ON COLUMN assignments.csv_sha256 IS 'SHA-256 of the last ingested scores.csv (salted with the ingest format version)';
+COMMENT ON COLUMN assignments.csv_bytes IS 'Byte length of the last ingested scores.csv';
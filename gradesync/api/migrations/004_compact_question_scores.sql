@@ -0,0 +1,10 @@
+-- Migration: Compact per-question score storage
+-- Date: 2026-10-16
+-- Description: Stores per-question CSV headers once per assignment and a
+--              numeric array per submission indexed by question position
+
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS question_headers TEXT[];
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS question_scores NUMERIC[];
+
+COMMENT ON COLUMN assignments.question_headers IS 'Per-question scores.csv headers, in column order';
+COMMENT ON COLUMN submissions.question_scores IS 'Per-question scores indexed like assignments.question_headers (NULL for blank cells)';
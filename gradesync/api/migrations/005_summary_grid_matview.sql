@@ -0,0 +1,23 @@
+-- Migration: Materialized view backend for the course summary grid
+-- Date: 2026-10-16
+-- Description: Creates summary_grid, a materialized student x assignment score
+--              grid, with the unique index required by
+--              REFRESH MATERIALIZED VIEW CONCURRENTLY. Used when
+--              global_settings.summary_backend is "matview".
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS summary_grid AS
+SELECT
+    st.course_id,
+    st.id AS student_id,
+    a.id AS assignment_id,
+    sub.total_score AS score
+FROM students st
+JOIN assignments a ON a.course_id = st.course_id
+LEFT JOIN submissions sub
+    ON sub.assignment_id = a.id AND sub.student_id = st.id
+WHERE st.course_id IS NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_summary_grid_cell
+    ON summary_grid (course_id, student_id, assignment_id);
+
+COMMENT ON MATERIALIZED VIEW summary_grid IS 'Student x assignment score grid; refresh with REFRESH MATERIALIZED VIEW CONCURRENTLY summary_grid';
@@ -0,0 +1,10 @@
+-- Migration: Indexes for paginated and filtered summary queries
+-- Date: 2026-10-16
+-- Description: Supports keyset pagination of students in name order and
+--              filtering a course's assignments by category
+
+CREATE INDEX IF NOT EXISTS ix_students_course_name
+    ON students (course_id, coalesce(legal_name, ''), id);
+
+CREATE INDEX IF NOT EXISTS ix_assignments_course_category
+    ON assignments (course_id, category);
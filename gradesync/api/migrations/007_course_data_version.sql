@@ -0,0 +1,10 @@
+-- Migration: Add per-course data version
+-- Date: 2026-10-16
+-- Description: Counter bumped whenever an ingest or summary refresh changes a
+--              course's grades; used for cache validation and HTTP ETags
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS data_updated_at TIMESTAMP WITH TIME ZONE;
+
+COMMENT ON COLUMN courses.data_version IS 'Incremented in the same transaction as every change to the course''s grades';
+COMMENT ON COLUMN courses.data_updated_at IS 'Time of the last data_version bump';
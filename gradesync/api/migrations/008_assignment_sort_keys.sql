@@ -0,0 +1,35 @@
+-- Migration: Persist assignment sort keys
+-- Date: 2026-10-16
+-- Description: Summary column order is computed once at ingest time
+--              (category priority, then the first number in the title) and
+--              read with ORDER BY instead of being recomputed per request.
+--              The backfill uses the default title-keyword priorities; a
+--              per-course sort_order in assignment_categories takes effect on
+--              the next sync.
+
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS sort_priority INTEGER;
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS sort_ordinal INTEGER;
+
+UPDATE assignments
+SET sort_priority = CASE
+        WHEN lower(coalesce(title, '')) LIKE '%lecture%' THEN 1
+        WHEN lower(coalesce(title, '')) LIKE '%quiz%' THEN 1
+        WHEN lower(coalesce(title, '')) LIKE '%midterm%' THEN 2
+        WHEN lower(coalesce(title, '')) LIKE '%postterm%' THEN 3
+        WHEN lower(coalesce(title, '')) LIKE '%posterm%' THEN 3
+        WHEN lower(coalesce(title, '')) LIKE '%project%' THEN 4
+        WHEN lower(coalesce(title, '')) LIKE '%lab%' THEN 5
+        WHEN lower(coalesce(title, '')) LIKE '%discussion%' THEN 6
+        ELSE 99
+    END,
+    sort_ordinal = least(
+        coalesce((substring(title FROM '[0-9]+'))::numeric, 0),
+        2147483647
+    )::integer
+WHERE sort_priority IS NULL OR sort_ordinal IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_assignments_course_sort
+    ON assignments (course_id, sort_priority, sort_ordinal, id);
+
+COMMENT ON COLUMN assignments.sort_priority IS 'Summary column order: category priority (assignment_categories sort_order or title keyword)';
+COMMENT ON COLUMN assignments.sort_ordinal IS 'Summary column order within a priority: first number in the title';
@@ -0,0 +1,9 @@
+-- Migration: Track when an assignment's scores last changed
+-- Date: 2026-10-16
+-- Description: Incremental Gradescope syncs skip assignments synced within
+--              the course's freshness window, unless they are still active.
+--              An assignment whose scores changed recently (new submissions,
+--              regrades) counts as active; due dates scraped from the
+--              assignment list are kept in assignment_metadata.
+
+ALTER TABLE assignments ADD COLUMN IF NOT EXISTS scores_changed_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,11 @@
+-- Migration: Persist pending summary refreshes
+-- Date: 2026-10-16
+-- Description: Set in the same transaction as every ingest that changed a
+--              course's submissions and cleared by the summary refresh that
+--              follows. A course left dirty by a failed or skipped refresh
+--              gets a full summary rebuild on its next sync instead of an
+--              incremental one that only covers that run's changes.
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS summary_dirty BOOLEAN NOT NULL DEFAULT false;
+
+COMMENT ON COLUMN courses.summary_dirty IS 'Submissions changed since summary_sheets was last refreshed';
@@ -0,0 +1,11 @@
+-- Migration: Case-insensitive student order for summary queries
+-- Date: 2026-10-16
+-- Description: Summary queries order students by lower(legal_name) with
+--              missing names first, compared by code point, matching the
+--              Python sort they replaced. The keyset pagination index
+--              follows the new sort expression.
+
+DROP INDEX IF EXISTS ix_students_course_name;
+
+CREATE INDEX IF NOT EXISTS ix_students_course_sort_name
+    ON students (course_id, (lower(coalesce(legal_name, '')) COLLATE "C"), id);
@@ -0,0 +1,15 @@
+-- Migration: Make the per-course sync interval override optional
+-- Date: 2026-10-16
+-- Description: The sync scheduler reads course_configs.gradescope_sync_interval_hours
+--              before the config.json and global_settings intervals. Its
+--              default of 24 meant those never applied, so the column no
+--              longer has a default and NULL means "not overridden". Rows
+--              still at the old default are reset to NULL.
+
+ALTER TABLE course_configs ALTER COLUMN gradescope_sync_interval_hours DROP DEFAULT;
+
+UPDATE course_configs
+SET gradescope_sync_interval_hours = NULL
+WHERE gradescope_sync_interval_hours = 24;
+
+COMMENT ON COLUMN course_configs.gradescope_sync_interval_hours IS 'Scheduled sync interval override in hours; NULL uses config.json, then global_settings';
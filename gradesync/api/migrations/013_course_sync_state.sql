@@ -0,0 +1,15 @@
+-- Migration: Persist per-source sync success and sync failures
+-- Date: 2026-10-16
+-- Description: The sync scheduler used to keep failures in memory, so
+--              --once / cron runs re-synced failing courses every time, and
+--              a failed source made the whole course sync again. Each
+--              successful source is now stamped on its own, and failures
+--              are counted for exponential backoff.
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS source_synced_at JSONB;
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS sync_failed_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS sync_failure_count INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN courses.source_synced_at IS 'Source name -> start of its last successful sync (ISO 8601)';
+COMMENT ON COLUMN courses.sync_failed_at IS 'End of the last failed sync; NULL once a sync succeeds';
+COMMENT ON COLUMN courses.sync_failure_count IS 'Consecutive failed syncs, for scheduler backoff';
@@ -0,0 +1,452 @@
+"""
+In-process cache of each course's summary grid as a NumPy matrix.
+
+``GradeMatrix`` holds the student x assignment scores as a float array
+(NaN for missing cells) plus index arrays for names and emails, so serving
+``/api/summary/{course_id}`` does not re-query and re-join the database on
+every request. Entries are dropped when a sync for the course completes in
+this process, and - while GradeMatrixCache.listen() is connected - when any
+other process bumps the course's data version (core.data_version notifies
+every bump). Entries and versions are then served from memory with no
+per-request query. Without a listener connection the cache falls back to
+re-checking the data version once an entry is older than
+``summary_cache_ttl_seconds`` (global_settings, default 30; 0 disables the
+cache). Even while listening, entries are re-checked after
+LISTENING_TTL_FACTOR times that TTL.
+"""
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_, select, tuple_
+
+from api.core.data_version import DataVersion, DataVersionListener, load_data_version
+from api.core.db import SessionLocal
+from api.core.models import Course, Assignment, Student, SummarySheet
+from api.core.summary_matview import summary_grid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL_SECONDS = 30
+# While listening, entries are re-checked after this many TTLs anyway, in
+# case notifications stopped without the listener noticing
+LISTENING_TTL_FACTOR = 10
+
+
+class GradeMatrix:
+    """
+    Summary grid of one course.
+
+    ``scores[i, j]`` is the score of ``student_names[i]`` /
+    ``student_emails[i]`` on ``assignment_titles[j]`` (NaN if missing).
+    Students are in legal-name order and assignments in summary order.
+    ``gradescope_assignment_ids`` are aligned with the titles.
+    """
+
+    def __init__(self, course_gradescope_id: str, assignment_ids, gradescope_assignment_ids: List[str],
+                 assignment_titles: List[str], categories: List[str], max_points: List[float],
+                 student_ids, student_names, student_emails, scores):
+        self.course_gradescope_id = course_gradescope_id
+        self.assignment_ids = np.asarray(assignment_ids, dtype=np.int64)
+        self.gradescope_assignment_ids = list(gradescope_assignment_ids)
+        self.assignment_titles = list(assignment_titles)
+        self.categories = list(categories)
+        self.max_points = list(max_points)
+        self.student_ids = np.asarray(student_ids, dtype=np.int64)
+        self.student_names = np.asarray(student_names, dtype=object)
+        self.student_emails = np.asarray(student_emails, dtype=object)
+        self.scores = scores
+        # Set by load_grade_matrix for paginated queries
+        self.paginated = False
+        self.next_cursor: Optional[str] = None
+        # Course data version the grid was read at (see core.data_version)
+        self.data_version = 0
+        self.last_modified: Optional[datetime] = None
+        self.built_at = time.time()
+        self.validated_at = self.built_at
+        self._encoded: Dict[str, bytes] = {}
+
+    @classmethod
+    def empty(cls, course_gradescope_id: str) -> "GradeMatrix":
+        return cls(course_gradescope_id, [], [], [], [], [], [], [], [], np.empty((0, 0)))
+
+    @property
+    def shape(self):
+        return self.scores.shape
+
+    def to_summary(self) -> dict:
+        """Summary structure returned by get_summary_sheet_from_db."""
+        titles = self.assignment_titles
+        # NaN -> "" in the JSON shape; tolist() yields plain Python floats
+        rows = np.where(np.isnan(self.scores), None, self.scores).tolist()
+        students = []
+        for name, email, row in zip(self.student_names.tolist(), self.student_emails.tolist(), rows):
+            students.append({
+                "legal_name": name,
+                "email": email,
+                "scores": {title: ("" if score is None else score) for title, score in zip(titles, row)},
+            })
+        summary = {
+            "assignments": list(titles),
+            "students": students,
+            "categories": dict(zip(titles, self.categories)),
+            "max_points": dict(zip(titles, self.max_points)),
+        }
+        if self.paginated:
+            summary["next_cursor"] = self.next_cursor
+        return summary
+
+    def to_columnar(self) -> dict:
+        """
+        Column-oriented summary: assignment titles, categories and max points
+        are sent once, and each student's scores are a list in the same
+        positional order (None for missing).
+        """
+        rows = np.where(np.isnan(self.scores), None, self.scores).tolist()
+        summary = {
+            "assignments": list(self.assignment_titles),
+            "assignment_ids": list(self.gradescope_assignment_ids),
+            "categories": list(self.categories),
+            "max_points": list(self.max_points),
+            "students": [
+                {"legal_name": name, "email": email, "scores": row}
+                for name, email, row in zip(self.student_names.tolist(), self.student_emails.tolist(), rows)
+            ],
+        }
+        if self.paginated:
+            summary["next_cursor"] = self.next_cursor
+        return summary
+
+    def encoded(self, name: str, encode: Callable[["GradeMatrix"], bytes]) -> bytes:
+        """Return encode(self), computed once per matrix and encoding name."""
+        body = self._encoded.get(name)
+        if body is None:
+            body = encode(self)
+            self._encoded[name] = body
+        return body
+
+    def to_json(self) -> bytes:
+        """to_summary() encoded like JSONResponse, computed once per matrix."""
+        return self.encoded("json", lambda matrix: json_bytes(matrix.to_summary()))
+
+
+def json_bytes(content) -> bytes:
+    """Compact UTF-8 JSON, as produced by JSONResponse."""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+# Summary column order, persisted on each assignment at ingest time
+# (see core.ingest.assignment_sort_key); id breaks ties deterministically
+ASSIGNMENT_SUMMARY_ORDER = (Assignment.sort_priority, Assignment.sort_ordinal, Assignment.id)
+
+# Student row order: case-insensitive by legal name with missing names first,
+# compared by code point like the Python sort on ``(legal_name or "").lower()``
+# it replaces; matches the ix_students_course_sort_name index
+STUDENT_SORT_NAME = func.lower(func.coalesce(Student.legal_name, "")).collate("C")
+STUDENT_SUMMARY_ORDER = (STUDENT_SORT_NAME, Student.id)
+
+
+def load_grade_matrix(course_gradescope_id: str, backend: str = "table",
+                      categories: Optional[Iterable[str]] = None,
+                      assignment_ids: Optional[Iterable[str]] = None,
+                      limit: Optional[int] = None,
+                      after: Optional[Tuple[str, int]] = None) -> Optional[GradeMatrix]:
+    """
+    Build a GradeMatrix from the summary table (or the summary_grid view).
+
+    All filters are applied in SQL, so only the requested cells are read:
+
+    Args:
+        course_gradescope_id: Gradescope course ID
+        backend: "table" or "matview" (see queries.summary.get_summary_backend)
+        categories: Only assignments in these categories ("Uncategorized"
+            also matches assignments without one)
+        assignment_ids: Only these Gradescope assignment ids
+        limit: Page size over students (in legal-name order); the matrix's
+            next_cursor is set when more students follow
+        after: (sort name, student id) of the last student of the previous page,
+            as decoded from next_cursor
+
+    Returns:
+        GradeMatrix, or None if the course does not exist
+    """
+    session = SessionLocal()
+    try:
+        course = session.query(Course).filter(
+            Course.gradescope_course_id == course_gradescope_id
+        ).first()
+        if not course:
+            return None
+        # Read before the grid: a sync committing in between leaves the
+        # matrix with an older version, so it is rebuilt on the next check
+        data_version = (course.data_version or 0, course.data_updated_at or course.updated_at or course.created_at)
+
+        assignment_query = (
+            select(Assignment.id, Assignment.assignment_id, Assignment.title,
+                   Assignment.category, Assignment.max_points)
+            .where(Assignment.course_id == course.id)
+        )
+        if categories is not None:
+            categories = list(categories)
+            category_filter = Assignment.category.in_(categories)
+            if "Uncategorized" in categories:
+                category_filter = or_(category_filter, Assignment.category.is_(None))
+            assignment_query = assignment_query.where(category_filter)
+        if assignment_ids is not None:
+            assignment_query = assignment_query.where(Assignment.assignment_id.in_(list(assignment_ids)))
+        assignments = session.execute(assignment_query.order_by(*ASSIGNMENT_SUMMARY_ORDER)).all()
+
+        student_query = (
+            select(Student.id, Student.legal_name, Student.email, STUDENT_SORT_NAME.label("sort_name"))
+            .where(Student.course_id == course.id)
+            .order_by(*STUDENT_SUMMARY_ORDER)
+        )
+        if after is not None:
+            student_query = student_query.where(tuple_(*STUDENT_SUMMARY_ORDER) > tuple_(*after))
+        if limit is not None:
+            student_query = student_query.limit(limit + 1)
+        students = session.execute(student_query).all()
+        next_cursor = None
+        if limit is not None and len(students) > limit:
+            students = students[:limit]
+            next_cursor = encode_cursor(students[-1].sort_name, students[-1].id)
+
+        cells = []
+        if students and assignments:
+            source = summary_grid if backend == "matview" else SummarySheet.__table__
+            cell_query = (
+                select(source.c.student_id, source.c.assignment_id, source.c.score)
+                .where(source.c.course_id == course.id, source.c.score.isnot(None))
+            )
+            if categories is not None or assignment_ids is not None:
+                cell_query = cell_query.where(source.c.assignment_id.in_([a.id for a in assignments]))
+            if limit is not None or after is not None:
+                cell_query = cell_query.where(source.c.student_id.in_([st.id for st in students]))
+            cells = session.execute(cell_query).all()
+    finally:
+        session.close()
+
+    student_ids = np.fromiter((s.id for s in students), dtype=np.int64, count=len(students))
+    assignment_db_ids = np.fromiter((a.id for a in assignments), dtype=np.int64, count=len(assignments))
+    scores = np.full((len(students), len(assignments)), np.nan)
+
+    if cells:
+        cell_students = np.fromiter((c[0] for c in cells), dtype=np.int64, count=len(cells))
+        cell_assignments = np.fromiter((c[1] for c in cells), dtype=np.int64, count=len(cells))
+        cell_scores = np.fromiter((c[2] for c in cells), dtype=np.float64, count=len(cells))
+        rows = _positions(student_ids, cell_students)
+        cols = _positions(assignment_db_ids, cell_assignments)
+        # Cells for students/assignments no longer in the course are ignored
+        known = (rows >= 0) & (cols >= 0)
+        scores[rows[known], cols[known]] = cell_scores[known]
+
+    matrix = GradeMatrix(
+        course_gradescope_id,
+        assignment_ids=assignment_db_ids,
+        gradescope_assignment_ids=[a.assignment_id for a in assignments],
+        assignment_titles=[a.title for a in assignments],
+        categories=[a.category or "Uncategorized" for a in assignments],
+        max_points=[float(a.max_points or 0) for a in assignments],
+        student_ids=student_ids,
+        student_names=[s.legal_name or "" for s in students],
+        student_emails=[s.email or "" for s in students],
+        scores=scores,
+    )
+    matrix.data_version, matrix.last_modified = data_version
+    if limit is not None:
+        matrix.paginated = True
+        matrix.next_cursor = next_cursor
+    return matrix
+
+
+def encode_cursor(sort_name: str, student_id: int) -> str:
+    """Opaque pagination cursor for the student after which a page starts."""
+    payload = json.dumps([sort_name, student_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Inverse of encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_name, student_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(sort_name, str) or not isinstance(student_id, int):
+            raise TypeError
+        return sort_name, student_id
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+
+def _positions(index_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Position of each id in index_ids, or -1 if absent."""
+    order = np.argsort(index_ids)
+    sorted_ids = index_ids[order]
+    found = np.searchsorted(sorted_ids, ids)
+    found = np.minimum(found, len(sorted_ids) - 1)
+    return np.where(sorted_ids[found] == ids, order[found], -1)
+
+
+class GradeMatrixCache:
+    """
+    Thread-safe GradeMatrix cache; one build per course and backend at a time.
+
+    Matrices are keyed by course and summary backend, so switching
+    ``summary_backend`` (which does not bump the data version) never serves
+    a grid read from the other source. Data versions are per course.
+
+    While listening (see listen()), entries and known data versions are
+    trusted until invalidate() drops them, for at most
+    LISTENING_TTL_FACTOR x ttl_seconds. Otherwise they are trusted for
+    ttl_seconds; after that one data-version lookup decides whether the
+    matrix is still current or has to be rebuilt. A ttl_seconds of 0 always
+    re-checks.
+    """
+
+    def __init__(self):
+        # (course_gradescope_id, backend) -> matrix / build lock
+        self._entries: Dict[Tuple[str, str], GradeMatrix] = {}
+        self._versions: Dict[str, Tuple[DataVersion, float]] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._listener: Optional[DataVersionListener] = None
+        self.listening = False
+        # Bumped by invalidate(); values read before a bump are not stored,
+        # or a notification arriving mid-build would be lost
+        self._epoch = 0
+        self._course_epochs: Dict[str, int] = {}
+
+    def _lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _epoch_of(self, course_gradescope_id: str) -> Tuple[int, int]:
+        return self._epoch, self._course_epochs.get(course_gradescope_id, 0)
+
+    def _trusted(self, checked_at: float, ttl_seconds: float) -> bool:
+        max_age = ttl_seconds * LISTENING_TTL_FACTOR if self.listening else ttl_seconds
+        return time.time() - checked_at < max_age
+
+    def _fresh(self, matrix: Optional[GradeMatrix], ttl_seconds: float) -> bool:
+        return matrix is not None and self._trusted(matrix.validated_at, ttl_seconds)
+
+    def get(self, course_gradescope_id: str, backend: str = "table",
+            ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS) -> Optional[GradeMatrix]:
+        """
+        Return the cached matrix, building it on a miss or when the course's
+        data version moved on. Returns None if the course does not exist.
+        """
+        key = (course_gradescope_id, backend)
+        matrix = self._entries.get(key)
+        if self._fresh(matrix, ttl_seconds):
+            return matrix
+
+        with self._lock_for(key):
+            # Another thread may have rebuilt it while we waited
+            matrix = self._entries.get(key)
+            if self._fresh(matrix, ttl_seconds):
+                return matrix
+            if matrix is not None:
+                current = self.version(course_gradescope_id, ttl_seconds=0)
+                if current is not None and current[0] == matrix.data_version:
+                    matrix.validated_at = time.time()
+                    return matrix
+            started = time.time()
+            epoch = self._epoch_of(course_gradescope_id)
+            matrix = load_grade_matrix(course_gradescope_id, backend=backend)
+            if matrix is None:
+                self.invalidate(course_gradescope_id)
+                return None
+            with self._guard:
+                if self._epoch_of(course_gradescope_id) == epoch:
+                    self._entries[key] = matrix
+                    self._versions[course_gradescope_id] = ((matrix.data_version, matrix.last_modified), time.time())
+            logger.info(
+                f"Built {backend} grade matrix for {course_gradescope_id} (data version {matrix.data_version}): "
+                f"{matrix.shape[0]} students x {matrix.shape[1]} assignments in {time.time() - started:.2f}s"
+            )
+            return matrix
+
+    def version(self, course_gradescope_id: str,
+                ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS) -> Optional[DataVersion]:
+        """
+        (data_version, last modified) of a course, read from the database
+        once per ttl_seconds, or while listening only after invalidate()
+        (or LISTENING_TTL_FACTOR x ttl_seconds).
+        Returns None if the course does not exist.
+        """
+        known = self._versions.get(course_gradescope_id)
+        if known is not None and self._trusted(known[1], ttl_seconds):
+            return known[0]
+        epoch = self._epoch_of(course_gradescope_id)
+        current = load_data_version(course_gradescope_id)
+        with self._guard:
+            if current is None:
+                self._versions.pop(course_gradescope_id, None)
+            elif self._epoch_of(course_gradescope_id) == epoch:
+                self._versions[course_gradescope_id] = (current, time.time())
+        return current
+
+    def invalidate(self, course_gradescope_id: Optional[str] = None) -> None:
+        """Drop one course's matrix and known version, or all of them."""
+        with self._guard:
+            if course_gradescope_id is None:
+                self._epoch += 1
+                self._entries.clear()
+                self._versions.clear()
+            else:
+                self._course_epochs[course_gradescope_id] = self._course_epochs.get(course_gradescope_id, 0) + 1
+                for key in [key for key in self._entries if key[0] == course_gradescope_id]:
+                    del self._entries[key]
+                self._versions.pop(course_gradescope_id, None)
+
+    def listen(self) -> DataVersionListener:
+        """
+        Invalidate courses as soon as any process bumps their data version.
+
+        Starts a DataVersionListener (once per cache); until it is connected,
+        and whenever its connection is lost, the TTL checks apply again.
+        """
+        if self._listener is None:
+            self._listener = DataVersionListener(self.invalidate, self._set_listening).start()
+        return self._listener
+
+    def _set_listening(self, listening: bool) -> None:
+        if listening and not self.listening:
+            # Bumps made before the connection was up were never delivered
+            self.invalidate()
+        self.listening = listening
+
+    def warm(self, course_gradescope_ids: Iterable[str], backend: str = "table",
+             ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS) -> threading.Thread:
+        """Build matrices for the given courses in a background thread."""
+        course_gradescope_ids = list(course_gradescope_ids)
+
+        def run():
+            for course_gradescope_id in course_gradescope_ids:
+                try:
+                    self.get(course_gradescope_id, backend=backend, ttl_seconds=ttl_seconds)
+                except Exception as e:
+                    logger.warning(f"Failed to warm grade matrix for {course_gradescope_id}: {e}")
+
+        thread = threading.Thread(target=run, name="grade-matrix-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+grade_matrix_cache = GradeMatrixCache()
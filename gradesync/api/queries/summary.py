@@ -1,14 +1,46 @@
 """
 Generate Summary sheet data from DB instead of using XLOOKUP formulas.
 """
+import hashlib
+import json
 import logging
+from typing import List, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload
+from api.config_manager import get_config_manager
+from api.core.data_version import DataVersion
 from api.core.db import SessionLocal
-from api.core.models import Course, Assignment, Student, Submission, SummarySheet
+from api.core.models import Course, Assignment, Student, Submission
+from api.core.summary_matview import SUMMARY_BACKENDS
+from api.queries.grade_matrix import (
+    DEFAULT_CACHE_TTL_SECONDS,
+    ASSIGNMENT_SUMMARY_ORDER,
+    GradeMatrix,
+    decode_cursor,
+    grade_matrix_cache,
+    load_grade_matrix,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def get_summary_backend() -> str:
+    """
+    Summary storage backend from global_settings.summary_backend.
+    
+    "table" (default) reads the summary_sheets table, "matview" the
+    summary_grid materialized view.
+    """
+    try:
+        backend = get_config_manager().get_global_setting("summary_backend", "table")
+    except FileNotFoundError:
+        return "table"
+    if backend not in SUMMARY_BACKENDS:
+        logger.warning(f"Unknown summary_backend '{backend}', using 'table'")
+        return "table"
+    return backend
+
+
 def get_summary_data_from_db(course_gradescope_id: str):
     """
     Query DB and return summary data structured as:
@@ -38,62 +70,38 @@ def get_summary_data_from_db(course_gradescope_id: str):
             logger.warning(f"Course {course_gradescope_id} not found in DB")
             return {"assignments": [], "students": []}
         
-        # Get all assignments for this course, ordered by category and number
-        assignments = session.query(Assignment).filter(
-            Assignment.course_id == course.id
+        # Only the columns the summary needs, as plain tuples (no ORM entities,
+        # and never the per-question JSON on submissions)
+        sorted_assignments = session.execute(
+            select(Assignment.id, Assignment.title)
+            .where(Assignment.course_id == course.id)
+            .order_by(*ASSIGNMENT_SUMMARY_ORDER)
         ).all()
-        
-        # Sort assignments by category priority and extracted number
-        def extract_number(title):
-            import re
-            numbers = re.findall(r"\d+", title or "")
-            return int(numbers[0]) if numbers else 0
-        
-        category_order = {
-            'lecture': 1, 'quiz': 1,
-            'midterm': 2,
-            'postterm': 3, 'posterm': 3,
-            'project': 4,
-            'lab': 5,
-            'discussion': 6
-        }
-        
-        def get_category_priority(assignment):
-            title_lower = (assignment.title or "").lower()
-            for key, priority in category_order.items():
-                if key in title_lower:
-                    return priority
-            return 99
-        
-        sorted_assignments = sorted(assignments, key=lambda a: (get_category_priority(a), extract_number(a.title)))
         assignment_names = [a.title for a in sorted_assignments]
-        assignment_id_to_name = {a.id: a.title for a in sorted_assignments}
         
         # Get all students for this course
-        students = session.query(Student).filter(
-            Student.course_id == course.id
+        students = session.execute(
+            select(Student.id, Student.legal_name, Student.email)
+            .where(Student.course_id == course.id)
         ).all()
         
-        # Get all submissions for this course
-        submissions = session.query(Submission).join(Assignment).filter(
-            Assignment.course_id == course.id
-        ).all()
-        
-        # Build submission lookup: (assignment_id, student_id) -> submission
-        submission_lookup = {}
-        for sub in submissions:
-            submission_lookup[(sub.assignment_id, sub.student_id)] = sub
+        # Build score lookup: (assignment_id, student_id) -> total_score
+        score_lookup = {
+            (assignment_id, student_id): total_score
+            for assignment_id, student_id, total_score in session.execute(
+                select(Submission.assignment_id, Submission.student_id, Submission.total_score)
+                .join(Assignment, Assignment.id == Submission.assignment_id)
+                .where(Assignment.course_id == course.id, Submission.total_score.isnot(None))
+            )
+        }
         
         # Build student data
         student_data = []
         for student in students:
             scores = {}
             for assignment in sorted_assignments:
-                sub = submission_lookup.get((assignment.id, student.id))
-                if sub and sub.total_score is not None:
-                    scores[assignment.title] = float(sub.total_score)
-                else:
-                    scores[assignment.title] = ""
+                total_score = score_lookup.get((assignment.id, student.id))
+                scores[assignment.title] = float(total_score) if total_score is not None else ""
             
             student_data.append({
                 "legal_name": student.legal_name or "",
@@ -157,35 +165,159 @@ def get_max_points_from_db(course_gradescope_id: str, assignment_name: str):
         if not course:
             return 0.0
         
-        assignment = session.query(Assignment).filter(
-            Assignment.course_id == course.id,
-            Assignment.title == assignment_name
-        ).first()
+        max_points = session.execute(
+            select(Assignment.max_points).where(
+                Assignment.course_id == course.id,
+                Assignment.title == assignment_name
+            ).limit(1)
+        ).scalar()
         
-        if assignment and assignment.max_points:
-            return float(assignment.max_points)
+        if max_points:
+            return float(max_points)
         
         # Fallback: get from any submission for this assignment
-        submission = session.query(Submission).join(Assignment).filter(
-            Assignment.course_id == course.id,
-            Assignment.title == assignment_name,
-            Submission.max_points.isnot(None)
-        ).first()
-        
-        if submission and submission.max_points:
-            return float(submission.max_points)
+        max_points = session.execute(
+            select(Submission.max_points)
+            .join(Assignment, Assignment.id == Submission.assignment_id)
+            .where(
+                Assignment.course_id == course.id,
+                Assignment.title == assignment_name,
+                Submission.max_points.isnot(None)
+            ).limit(1)
+        ).scalar()
+        
+        if max_points:
+            return float(max_points)
         
         return 0.0
     finally:
         session.close()
 
 
+def get_summary_cache_ttl() -> float:
+    """Seconds a cached GradeMatrix is served (global_settings.summary_cache_ttl_seconds)."""
+    try:
+        ttl = get_config_manager().get_global_setting("summary_cache_ttl_seconds", DEFAULT_CACHE_TTL_SECONDS)
+    except FileNotFoundError:
+        return DEFAULT_CACHE_TTL_SECONDS
+    try:
+        return max(0.0, float(ttl))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid summary_cache_ttl_seconds '{ttl}', using {DEFAULT_CACHE_TTL_SECONDS}")
+        return DEFAULT_CACHE_TTL_SECONDS
+
+
+def get_summary_matrix(course_gradescope_id: str) -> GradeMatrix:
+    """
+    Summary grid of a course as a GradeMatrix, served from the in-process
+    cache (see queries.grade_matrix). An unknown course yields an empty matrix.
+    """
+    ttl = get_summary_cache_ttl()
+    backend = get_summary_backend()
+    if ttl > 0:
+        matrix = grade_matrix_cache.get(course_gradescope_id, backend=backend, ttl_seconds=ttl)
+    else:
+        matrix = load_grade_matrix(course_gradescope_id, backend=backend)
+    if matrix is None:
+        logger.warning(f"Course {course_gradescope_id} not found in DB")
+        return GradeMatrix.empty(course_gradescope_id)
+    return matrix
+
+
+def get_summary_version(course_gradescope_id: str) -> Optional[DataVersion]:
+    """
+    (data_version, last modified) of a course for conditional requests.
+    
+    Served from memory until the course's next data-version bump while the
+    cache's listener is connected (see GradeMatrixCache.listen), otherwise
+    while the cached value is younger than summary_cache_ttl_seconds, so
+    revalidating an unchanged summary does not query the database. Returns
+    None if the course does not exist.
+    """
+    return grade_matrix_cache.version(course_gradescope_id, ttl_seconds=get_summary_cache_ttl())
+
+
+def summary_query_key(limit: Optional[int] = None, cursor: Optional[str] = None,
+                      categories: Optional[List[str]] = None,
+                      assignment_ids: Optional[List[str]] = None) -> Optional[str]:
+    """Short stable digest of the page/filter parameters (None when unfiltered)."""
+    if limit is None and cursor is None and categories is None and assignment_ids is None:
+        return None
+    canonical = json.dumps([
+        limit,
+        cursor,
+        sorted(categories) if categories is not None else None,
+        sorted(assignment_ids) if assignment_ids is not None else None,
+    ], separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def get_summary_page(course_gradescope_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                     categories: Optional[List[str]] = None,
+                     assignment_ids: Optional[List[str]] = None) -> GradeMatrix:
+    """
+    Summary grid restricted to a page of students and/or a subset of
+    assignments. Filters are pushed down into the SQL queries (see
+    load_grade_matrix); without any, the cached full grid is returned.
+    
+    Args:
+        course_gradescope_id: Gradescope course ID
+        limit: Maximum number of students (legal-name order)
+        cursor: next_cursor from the previous page
+        categories: Only assignments in these categories
+        assignment_ids: Only these Gradescope assignment ids
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if limit is None and cursor is None and categories is None and assignment_ids is None:
+        return get_summary_matrix(course_gradescope_id)
+    
+    after = decode_cursor(cursor) if cursor else None
+    matrix = load_grade_matrix(
+        course_gradescope_id,
+        backend=get_summary_backend(),
+        categories=categories,
+        assignment_ids=assignment_ids,
+        limit=limit,
+        after=after,
+    )
+    if matrix is None:
+        logger.warning(f"Course {course_gradescope_id} not found in DB")
+        return GradeMatrix.empty(course_gradescope_id)
+    return matrix
+
+
+def warm_summary_cache():
+    """
+    Build the cached grade matrix of every configured course with the
+    database enabled, in a background thread.
+
+    Returns:
+        The warm-up thread, or None if caching is disabled or no course qualifies
+    """
+    ttl = get_summary_cache_ttl()
+    if ttl <= 0:
+        return None
+    course_ids = [
+        config.gradescope_course_id
+        for config in get_config_manager().list_course_configs()
+        if config.database_enabled and config.gradescope_course_id
+    ]
+    if not course_ids:
+        return None
+    logger.info(f"Warming summary cache for {len(course_ids)} course(s)")
+    return grade_matrix_cache.warm(course_ids, backend=get_summary_backend(), ttl_seconds=ttl)
+
+
 def get_summary_sheet_from_db(course_gradescope_id: str):
     """
-    Get pre-computed summary sheet data directly from the summary_sheets table.
+    Get pre-computed summary sheet data directly from the summary_sheets table
+    (or the summary_grid materialized view, see get_summary_backend).
     
     This is more efficient than get_summary_data_from_db() as it reads from 
-    a pre-computed table instead of joining multiple tables.
+    a pre-computed table instead of joining multiple tables. Always reads the
+    database; use get_summary_matrix() for the cached grid.
     
     Args:
         course_gradescope_id: Gradescope course ID
@@ -193,101 +325,16 @@ def get_summary_sheet_from_db(course_gradescope_id: str):
     Returns:
         dict: Summary data structure with assignments, students, and scores
     """
-    session = SessionLocal()
     try:
-        # Get course
-        course = session.query(Course).filter(
-            Course.gradescope_course_id == course_gradescope_id
-        ).first()
-        
-        if not course:
+        matrix = load_grade_matrix(course_gradescope_id, backend=get_summary_backend())
+        if matrix is None:
             logger.warning(f"Course {course_gradescope_id} not found in DB")
             return {"assignments": [], "students": [], "categories": {}, "max_points": {}}
         
-        # Get all assignments for this course, ordered
-        assignments = session.query(Assignment).filter(
-            Assignment.course_id == course.id
-        ).all()
-        
-        # Sort assignments
-        def extract_number(title):
-            import re
-            numbers = re.findall(r"\d+", title or "")
-            return int(numbers[0]) if numbers else 0
-        
-        category_order = {
-            'lecture': 1, 'quiz': 1,
-            'midterm': 2,
-            'postterm': 3, 'posterm': 3,
-            'project': 4,
-            'lab': 5,
-            'discussion': 6
-        }
-        
-        def get_category_priority(assignment):
-            title_lower = (assignment.title or "").lower()
-            for key, priority in category_order.items():
-                if key in title_lower:
-                    return priority
-            return 99
-        
-        sorted_assignments = sorted(
-            assignments, 
-            key=lambda a: (get_category_priority(a), extract_number(a.title))
-        )
-        
-        assignment_names = [a.title for a in sorted_assignments]
-        assignment_id_map = {a.id: a.title for a in sorted_assignments}
-        
-        # Build categories and max_points maps using persisted assignment.category
-        categories = {}
-        max_points = {}
-        for assignment in sorted_assignments:
-            categories[assignment.title] = assignment.category or "Uncategorized"
-            max_points[assignment.title] = float(assignment.max_points or 0)
-        
-        # Get all students for this course
-        students = session.query(Student).filter(
-            Student.course_id == course.id
-        ).order_by(Student.legal_name).all()
-        
-        # Get summary sheet data for this course
-        summary_records = session.query(SummarySheet).filter(
-            SummarySheet.course_id == course.id
-        ).all()
-        
-        # Build lookup: (student_id, assignment_id) -> score
-        score_lookup = {
-            (record.student_id, record.assignment_id): float(record.score) if record.score is not None else None
-            for record in summary_records
-        }
-        
-        # Build student data
-        student_data = []
-        for student in students:
-            scores = {}
-            for assignment in sorted_assignments:
-                score = score_lookup.get((student.id, assignment.id))
-                scores[assignment.title] = score if score is not None else ""
-            
-            student_data.append({
-                "legal_name": student.legal_name or "",
-                "email": student.email or "",
-                "scores": scores
-            })
-        
-        logger.info(f"Retrieved summary sheet from DB: {len(student_data)} students, {len(assignment_names)} assignments")
-        
-        return {
-            "assignments": assignment_names,
-            "students": student_data,
-            "categories": categories,
-            "max_points": max_points
-        }
+        summary = matrix.to_summary()
+        logger.info(f"Retrieved summary sheet from DB: {len(summary['students'])} students, {len(summary['assignments'])} assignments")
+        return summary
         
     except Exception as e:
         logger.exception(f"Error retrieving summary sheet from DB: {e}")
         return {"assignments": [], "students": [], "categories": {}, "max_points": {}}
-    finally:
-        session.close()
-
@@ -0,0 +1,109 @@
+"""
+Streaming NDJSON export of a course summary.
+
+Unlike GradeMatrix, nothing proportional to the course size is held in
+memory: the student x assignment cells are read through a server-side
+cursor in student order and every student's line is yielded as soon as
+their last cell has been read.
+
+Output (one JSON document per line):
+
+- a header: ``{"assignments": [...], "assignment_ids": [...],
+  "categories": {...}, "max_points": {...}, "students": <count>}``
+- one line per student, in name order: ``{"legal_name": ..., "email": ...,
+  "scores": {title: score or ""}}`` (the same shape as the summary endpoint)
+"""
+import logging
+from itertools import groupby
+from typing import Iterator, Optional
+
+from sqlalchemy import func, select
+
+from api.core.db import engine
+from api.core.models import Course, Assignment, Student, SummarySheet
+from api.core.summary_matview import summary_grid
+from api.queries.grade_matrix import ASSIGNMENT_SUMMARY_ORDER, STUDENT_SUMMARY_ORDER, json_bytes
+
+logger = logging.getLogger(__name__)
+
+# Cells fetched per round trip from the server-side cursor
+DEFAULT_EXPORT_BATCH_ROWS = 10000
+
+
+def iter_summary_ndjson(course_gradescope_id: str, backend: str = "table",
+                        batch_rows: int = DEFAULT_EXPORT_BATCH_ROWS) -> Optional[Iterator[bytes]]:
+    """
+    Stream a course summary as NDJSON lines (bytes, newline-terminated).
+
+    The course lookup happens eagerly so callers can 404 before streaming;
+    the returned iterator holds a database connection until exhausted or
+    closed.
+
+    Args:
+        course_gradescope_id: Gradescope course ID
+        backend: "table" or "matview" (see queries.summary.get_summary_backend)
+        batch_rows: Rows fetched per round trip from the server-side cursor
+
+    Returns:
+        Iterator of lines, or None if the course does not exist
+    """
+    connection = engine.connect()
+    try:
+        course_db_id = connection.execute(
+            select(Course.id).where(Course.gradescope_course_id == course_gradescope_id)
+        ).scalar()
+        if course_db_id is None:
+            connection.close()
+            return None
+    except Exception:
+        connection.close()
+        raise
+    return _stream(connection, course_db_id, backend, batch_rows)
+
+
+def _stream(connection, course_db_id: int, backend: str, batch_rows: int) -> Iterator[bytes]:
+    try:
+        assignments = connection.execute(
+            select(Assignment.id, Assignment.assignment_id, Assignment.title,
+                   Assignment.category, Assignment.max_points)
+            .where(Assignment.course_id == course_db_id)
+            .order_by(*ASSIGNMENT_SUMMARY_ORDER)
+        ).all()
+        student_count = connection.execute(
+            select(func.count()).select_from(Student).where(Student.course_id == course_db_id)
+        ).scalar()
+        titles = [a.title for a in assignments]
+        yield json_bytes({
+            "assignments": titles,
+            "assignment_ids": [a.assignment_id for a in assignments],
+            "categories": {a.title: a.category or "Uncategorized" for a in assignments},
+            "max_points": {a.title: float(a.max_points or 0) for a in assignments},
+            "students": student_count,
+        }) + b"\n"
+
+        position = {a.id: index for index, a in enumerate(assignments)}
+        source = summary_grid if backend == "matview" else SummarySheet.__table__
+        cells = (
+            select(Student.id, Student.legal_name, Student.email, source.c.assignment_id, source.c.score)
+            .select_from(Student)
+            .outerjoin(source, (source.c.student_id == Student.id) & (source.c.course_id == course_db_id))
+            .where(Student.course_id == course_db_id)
+            .order_by(*STUDENT_SUMMARY_ORDER)
+        )
+        # stream_results uses a named (server-side) cursor on psycopg2
+        result = connection.execution_options(stream_results=True, yield_per=batch_rows).execute(cells)
+
+        for _, rows in groupby(result, key=lambda row: row[0]):
+            first = next(rows)
+            scores = [""] * len(assignments)
+            for row in (first, *rows):
+                index = position.get(row[3])
+                if index is not None and row[4] is not None:
+                    scores[index] = float(row[4])
+            yield json_bytes({
+                "legal_name": first[1] or "",
+                "email": first[2] or "",
+                "scores": dict(zip(titles, scores)),
+            }) + b"\n"
+    finally:
+        connection.close()
@@ -0,0 +1,148 @@
+"""
+Wire formats for the course summary endpoint.
+
+- ``json`` (default): the original shape, one ``{title: score}`` dict per student
+- ``columnar``: assignments (titles and Gradescope ids) sent once, scores as
+  positional arrays (GradeMatrix.to_columnar)
+- ``msgpack``: the columnar shape encoded as MessagePack (requires msgpack)
+- ``arrow``: Arrow IPC stream with ``legal_name``, ``email`` and one float64
+  column per assignment; Gradescope id, category and max points are field
+  metadata, and a paginated response's next cursor is schema metadata
+  (requires pyarrow)
+
+Clients pick a format with the ``format`` query parameter or the ``Accept``
+header; see negotiate_summary_format.
+"""
+import io
+from typing import Optional, Tuple
+
+from api.queries.grade_matrix import GradeMatrix, json_bytes
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional encoding
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional encoding
+    pa = None
+
+SUMMARY_MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.gradesync.summary.columnar+json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+SUMMARY_FORMATS = tuple(SUMMARY_MEDIA_TYPES)
+
+# Accept header media types (including common aliases) -> format
+_ACCEPTED_MEDIA_TYPES = {
+    "application/json": "json",
+    "application/*": "json",
+    "*/*": "json",
+    "application/vnd.gradesync.summary.columnar+json": "columnar",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+
+
+class SummaryFormatError(ValueError):
+    """Requested summary format is unknown or its encoder is not installed."""
+
+
+def negotiate_summary_format(format_param: Optional[str] = None, accept: Optional[str] = None) -> str:
+    """
+    Choose the summary format.
+
+    An explicit ``format`` query parameter wins. Otherwise the first media
+    type in ``Accept`` that maps to a known format (highest q first) is used;
+    anything else falls back to ``json``.
+
+    Raises:
+        SummaryFormatError: If format_param is not a known format
+    """
+    if format_param:
+        fmt = format_param.strip().lower()
+        if fmt not in SUMMARY_MEDIA_TYPES:
+            raise SummaryFormatError(
+                f"Unknown summary format '{format_param}'; expected one of {', '.join(SUMMARY_FORMATS)}"
+            )
+        return fmt
+
+    if accept:
+        candidates = []
+        for position, part in enumerate(accept.split(",")):
+            media_type, _, params = part.strip().partition(";")
+            quality = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            fmt = _ACCEPTED_MEDIA_TYPES.get(media_type.strip().lower())
+            if fmt and quality > 0:
+                candidates.append((-quality, position, fmt))
+        if candidates:
+            return min(candidates)[2]
+    return "json"
+
+
+def _encode_msgpack(matrix: GradeMatrix) -> bytes:
+    return msgpack.packb(matrix.to_columnar(), use_bin_type=True)
+
+
+def _encode_arrow(matrix: GradeMatrix) -> bytes:
+    fields = [pa.field("legal_name", pa.string()), pa.field("email", pa.string())]
+    columns = [
+        pa.array(matrix.student_names.tolist(), type=pa.string()),
+        pa.array(matrix.student_emails.tolist(), type=pa.string()),
+    ]
+    for position, title in enumerate(matrix.assignment_titles):
+        fields.append(pa.field(title, pa.float64(), metadata={
+            "assignment_id": matrix.gradescope_assignment_ids[position],
+            "category": matrix.categories[position],
+            "max_points": repr(matrix.max_points[position]),
+        }))
+        # NaN -> null
+        columns.append(pa.array(matrix.scores[:, position], type=pa.float64(), from_pandas=True))
+    metadata = None
+    if matrix.paginated:
+        metadata = {"next_cursor": matrix.next_cursor or ""}
+    table = pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=metadata))
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_summary(matrix: GradeMatrix, fmt: str) -> Tuple[bytes, str]:
+    """
+    Encode a course summary; the body is cached on the matrix per format.
+
+    Returns:
+        Tuple of (body, media type)
+
+    Raises:
+        SummaryFormatError: If the format is unknown or its library is missing
+    """
+    if fmt == "json":
+        body = matrix.to_json()
+    elif fmt == "columnar":
+        body = matrix.encoded(fmt, lambda m: json_bytes(m.to_columnar()))
+    elif fmt == "msgpack":
+        if msgpack is None:
+            raise SummaryFormatError("MessagePack summaries require the 'msgpack' package")
+        body = matrix.encoded(fmt, _encode_msgpack)
+    elif fmt == "arrow":
+        if pa is None:
+            raise SummaryFormatError("Arrow summaries require the 'pyarrow' package")
+        body = matrix.encoded(fmt, _encode_arrow)
+    else:
+        raise SummaryFormatError(f"Unknown summary format '{fmt}'")
+    return body, SUMMARY_MEDIA_TYPES[fmt]
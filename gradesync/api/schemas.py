@@ -99,3 +99,7 @@ class SummaryResponse(BaseModel):
         description="Maximum points per assignment",
         example={"Lab 1": 10.0, "Project 1": 100.0, "Quiz 1": 4.0}
     )
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Cursor for the next page of students (paginated requests only; null on the last page)"
+    )
@@ -1,25 +1,49 @@
 # https://pypi.org/project/fullGSapi/
 from fullGSapi.api.client import GradescopeClient as GradescopeBaseClient
+import logging
 import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 from requests.exceptions import Timeout, RequestException
 
+logger = logging.getLogger(__name__)
+
 # 每个HTTP请求的超时时间（秒）
 DEFAULT_REQUEST_TIMEOUT = 30  # 30秒，快速跳过卡住的作业
 
+# Bytes read from the socket per iteration when streaming score exports
+DEFAULT_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Concurrent score downloads allowed against one host over the shared session
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+
 class GradescopeClient(GradescopeBaseClient):
-    def __init__(self, timeout: int = 1800):
+    def __init__(self, timeout: int = 1800, max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST):
         """
         Initializes the extended fullGSapi Gradescope client with an inactivity timer.
 
         Parameters:
             timeout (int): Timeout in seconds for inactivity logout. Default is 1800 seconds (30 minutes).
+            max_connections_per_host (int): Most concurrent score downloads per host; also sizes
+                the session's connection pool, which is fixed once the client exists.
         """
         super().__init__()  # Initialize the parent class (GradescopeBaseClient)
         self.timeout = timeout
         self.request_timeout = DEFAULT_REQUEST_TIMEOUT  # HTTP请求超时
         self.inactivity_timer = None
         self.lock = threading.Lock() # This is used for login synchronization
+        self.max_connections_per_host = max(1, int(max_connections_per_host))
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+        # Sized once, on the fresh session: replacing adapters later would drop
+        # their pooled connections and any settings mounted since
+        self.pool_maxsize = max(DEFAULT_POOLSIZE, self.max_connections_per_host)
+        adapter = HTTPAdapter(pool_maxsize=self.pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def reset_inactivity_timer(self):
         """
@@ -41,6 +65,37 @@ class GradescopeClient(GradescopeBaseClient):
         """
         self.timeout = newTimeout
     
+    def set_max_connections_per_host(self, max_connections: int):
+        """
+        Cap the number of concurrent score downloads per host.
+
+        Downloads from several threads share this client's logged-in session;
+        each one holds a slot of its host's semaphore for the duration of the
+        request. The cap cannot exceed the connection pool sized in
+        __init__, so no thread opens a connection the pool would discard.
+        """
+        max_connections = max(1, int(max_connections))
+        if max_connections > self.pool_maxsize:
+            logger.warning(
+                f"max_connections_per_host {max_connections} exceeds the connection pool "
+                f"({self.pool_maxsize}); pass it to GradescopeClient() instead"
+            )
+            max_connections = self.pool_maxsize
+        with self._host_slots_lock:
+            self.max_connections_per_host = max_connections
+            self._host_slots = {}
+
+    @contextmanager
+    def host_slot(self, url: str):
+        """Hold one of the per-host download slots for `url`'s host."""
+        host = urlsplit(url).netloc.lower()
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+        with slot:
+            yield
+
     def log_in(self, email: str, password: str) -> bool:
         """
         Logs into Gradescope. This overriden method is thread-safe.
@@ -123,7 +178,9 @@ class GradescopeClient(GradescopeBaseClient):
         url = f"https://www.gradescope.com/courses/{class_id}/assignments/{assignment_id}/scores.{filetype}"
         
         try:
-            self.last_res = res = self.session.get(url, timeout=self.request_timeout)
+            with self.host_slot(url):
+                # No self.last_res: downloads run on several threads at once
+                res = self.session.get(url, timeout=self.request_timeout)
             if not res or not res.ok:
                 # print(f"Failed to get a response from gradescope! Got: {res}")
                 return False
@@ -134,3 +191,54 @@ class GradescopeClient(GradescopeBaseClient):
         except RequestException as e:
             print(f"Request error for assignment {assignment_id}: {e}")
             raise
+
+    def stream_scores(
+        self,
+        class_id: str,
+        assignment_id: str,
+        filetype: str = "csv",
+        chunk_bytes: int = DEFAULT_STREAM_CHUNK_BYTES
+    ) -> Iterator[bytes]:
+        """
+        Stream the scores export for an assignment chunk by chunk.
+        
+        Unlike download_scores, the body is never held in memory as a whole:
+        the response is read incrementally and each raw chunk is yielded as it
+        arrives. The request timeout applies to each socket read.
+        
+        Parameters:
+            class_id: Gradescope course ID
+            assignment_id: Assignment ID
+            filetype: File type (default: csv)
+            chunk_bytes: Maximum size of each yielded chunk
+            
+        Yields:
+            bytes: Raw chunks of the CSV body
+            
+        Raises:
+            PermissionError: If the client is not logged in
+            RuntimeError: If Gradescope does not return a successful response
+            TimeoutError: If a read times out
+        """
+        if not self.logged_in:
+            raise PermissionError("You must be logged in to download grades!")
+        
+        url = f"https://www.gradescope.com/courses/{class_id}/assignments/{assignment_id}/scores.{filetype}"
+        
+        try:
+            with self.host_slot(url):
+                res = self.session.get(url, timeout=self.request_timeout, stream=True)
+                try:
+                    if not res.ok:
+                        raise RuntimeError(f"Failed to download scores for assignment {assignment_id}: HTTP {res.status_code}")
+                    for chunk in res.iter_content(chunk_size=chunk_bytes):
+                        if chunk:
+                            yield chunk
+                finally:
+                    res.close()
+        except Timeout:
+            print(f"Request timed out after {self.request_timeout}s for assignment {assignment_id}")
+            raise TimeoutError(f"Download timed out after {self.request_timeout}s")
+        except RequestException as e:
+            print(f"Request error for assignment {assignment_id}: {e}")
+            raise
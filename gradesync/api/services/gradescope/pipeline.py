@@ -0,0 +1,107 @@
+"""
+Download / ingest pipeline for Gradescope score exports.
+
+Downloads run on a thread pool and hand each finished body to a bounded
+queue; one or more writer threads drain the queue into the database. Network
+I/O and Postgres writes therefore overlap, and because a downloader blocks
+while the queue is full, at most ``queue_size + download_workers`` bodies are
+held in memory however slow the database is.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Downloaded bodies waiting for a writer before downloads block
+DEFAULT_QUEUE_SIZE = 8
+
+# Sentinel telling a writer thread that no more bodies will arrive
+_DONE = object()
+
+
+class ScoresPipeline:
+    """
+    Bounded producer/consumer pipeline.
+
+    Args:
+        download: download(item) -> payload, called on a download thread
+        consume: consume(writer_index, item, payload), called on writer thread
+            ``writer_index`` (0 <= writer_index < writers); each writer can
+            keep its own non-thread-safe resources, such as a database session
+        on_failure: on_failure(item, exc) when download or consume raised,
+            called on the writer thread that took the item
+        download_workers: Concurrent downloads
+        writers: Writer threads draining the queue
+        queue_size: Maximum number of downloaded payloads waiting for a writer
+    """
+
+    def __init__(
+        self,
+        download: Callable[[Any], Any],
+        consume: Callable[[int, Any, Any], None],
+        on_failure: Optional[Callable[[Any, Exception], None]] = None,
+        download_workers: int = 1,
+        writers: int = 1,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        self.download = download
+        self.consume = consume
+        self.on_failure = on_failure
+        self.download_workers = max(1, int(download_workers or 1))
+        self.writers = max(1, int(writers or 1))
+        self.queue_size = max(1, int(queue_size or 1))
+
+    def run(self, items: Iterable[Any]) -> None:
+        """Download and consume every item; returns once all have been consumed."""
+        pending = queue.Queue(maxsize=self.queue_size)
+
+        def fetch(item):
+            try:
+                payload, error = self.download(item), None
+            except Exception as e:
+                payload, error = None, e
+            # Blocks while the writers are behind (backpressure)
+            pending.put((item, payload, error))
+
+        def drain(writer_index: int):
+            while True:
+                entry = pending.get()
+                if entry is _DONE:
+                    return
+                item, payload, error = entry
+                try:
+                    if error is not None:
+                        raise error
+                    self.consume(writer_index, item, payload)
+                except Exception as e:
+                    self._fail(item, e)
+
+        writer_threads = [
+            threading.Thread(target=drain, args=(index,), name=f"gradescope-writer-{index}", daemon=True)
+            for index in range(self.writers)
+        ]
+        for thread in writer_threads:
+            thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix="gradescope-download") as pool:
+                # fetch never raises, so draining the iterator just waits for all downloads
+                for _ in pool.map(fetch, items):
+                    pass
+        finally:
+            for _ in writer_threads:
+                pending.put(_DONE)
+            for thread in writer_threads:
+                thread.join()
+
+    def _fail(self, item: Any, error: Exception) -> None:
+        # A raising callback must not kill the writer, or downloads would block forever
+        try:
+            if self.on_failure is not None:
+                self.on_failure(item, error)
+            else:
+                logger.error(f"Failed to process {item}: {error}")
+        except Exception:
+            logger.exception(f"Failure handler raised for {item}")
@@ -4,9 +4,14 @@ Gradescope Sync Module
 High-level sync operations for Gradescope data.
 """
 from typing import Dict, Any, Optional, Callable
+import csv
+import io
 import logging
+import threading
+import time
 from datetime import datetime
 from .client import GradescopeClient
+from .pipeline import DEFAULT_QUEUE_SIZE, ScoresPipeline
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +20,57 @@ def _ts():
     return datetime.now().strftime('%H:%M:%S.%f')[:-3]
 
 
+class _AssignmentProgress:
+    """
+    assignment_start / assignment_done events for downloads that may run
+    concurrently and finish out of order.
+    
+    subCurrent counts assignments started (on assignment_start) or finished
+    (on assignment_done / assignment_failed) so far, not the assignment's
+    position in the course; progress follows the finished count, so both stay
+    monotonic. Events are emitted under a lock, in counter order.
+    """
+    
+    def __init__(self, total: int, emit: Callable[[Dict[str, Any]], None]):
+        self.total = total
+        self.emit = emit
+        self.started = 0
+        self.finished = 0
+        self._lock = threading.Lock()
+    
+    def _percent(self) -> int:
+        return int(10 + (self.finished / max(1, self.total)) * 80)
+    
+    def start(self, assignment_name: str):
+        with self._lock:
+            self.started += 1
+            self.emit({
+                "event": "progress",
+                "status": "running",
+                "stage": "assignment_start",
+                "message": f"Syncing assignment {self.started}/{self.total}: {assignment_name}",
+                "progress": self._percent(),
+                "subCurrent": self.started,
+                "subTotal": self.total,
+                "subLabel": assignment_name,
+            })
+    
+    def finish(self, assignment_name: str, failed: bool = False):
+        with self._lock:
+            self.finished += 1
+            verb = "Failed" if failed else "Finished"
+            self.emit({
+                "event": "progress",
+                "status": "running",
+                "stage": "assignment_failed" if failed else "assignment_done",
+                "message": f"{verb} assignment {self.finished}/{self.total}: {assignment_name}",
+                "progress": self._percent(),
+                "subCurrent": self.finished,
+                "subTotal": self.total,
+                "subLabel": assignment_name,
+            })
+
+
 class GradescopeSync:
     """
     Sync Gradescope grades to database.
@@ -28,7 +84,8 @@ class GradescopeSync:
     def __init__(
         self,
         email: str,
-        password: str
+        password: str,
+        max_connections_per_host: Optional[int] = None
     ):
         """
         Initialize Gradescope sync.
@@ -36,10 +93,17 @@ class GradescopeSync:
         Args:
             email: Gradescope email
             password: Gradescope password
+            max_connections_per_host: Connection pool size and per-host
+                download cap of the client (client default if None)
         """
-        self.gs_client = GradescopeClient(timeout=1800)
+        if max_connections_per_host:
+            self.gs_client = GradescopeClient(timeout=1800, max_connections_per_host=max_connections_per_host)
+        else:
+            self.gs_client = GradescopeClient(timeout=1800)
         self.email = email
         self.password = password
+        # assignment_id -> release/due dates, filled by _get_course_assignments
+        self.assignment_dates: Dict[str, Dict[str, str]] = {}
         
     def sync_course(
         self,
@@ -48,6 +112,17 @@ class GradescopeSync:
         course_name: Optional[str] = None,
         course_config: Optional[Dict[str, Any]] = None,
         progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        streaming: bool = False,
+        commit_every: int = 10,
+        parse_engine: str = "rows",
+        download_workers: int = 1,
+        max_connections_per_host: Optional[int] = None,
+        db_writers: int = 1,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        incremental: bool = False,
+        freshness_hours: Optional[float] = None,
+        active_window_hours: Optional[float] = None,
+        force_sync: bool = False,
     ) -> Dict[str, Any]:
         """
         Sync a Gradescope course.
@@ -57,6 +132,37 @@ class GradescopeSync:
             save_to_db: Whether to save to database (default True)
             course_name: Optional course name
             course_config: Optional course configuration with categories
+            streaming: Stream each scores.csv into the database in fixed-size
+                chunks instead of downloading the whole body first
+                (only applies when save_to_db is True)
+            commit_every: Number of assignments written per database
+                transaction (only applies when save_to_db is True)
+            parse_engine: "rows" or "columnar" (pandas) parsing of downloaded
+                CSVs; streamed CSVs are always parsed row by row
+            download_workers: Number of scores.csv downloads in flight at once
+                over the logged-in session (streamed exports are always read
+                one at a time)
+            max_connections_per_host: Cap on concurrent requests to one host
+                (defaults to the client's); cannot exceed the connection pool
+                the client was created with (see __init__)
+            db_writers: Threads writing downloaded CSVs to the database, each
+                with its own transaction; downloads and writes overlap even
+                with one (see pipeline.ScoresPipeline). With more than one,
+                every assignment is committed on its own
+            queue_size: Downloaded CSVs that may wait for a writer before
+                downloads pause
+            incremental: Skip assignments synced within freshness_hours
+                unless they are open, recently due or had scores change
+                at a recent download (see ingest_optimized.assignment_is_active;
+                a regrade of an inactive assignment waits for freshness_hours
+                or force_sync; only applies when save_to_db is True)
+            freshness_hours: Incremental freshness window (default
+                DEFAULT_FRESHNESS_HOURS)
+            active_window_hours: How long after their due date or last score
+                change assignments keep being synced (default
+                DEFAULT_ACTIVE_WINDOW_HOURS)
+            force_sync: Sync every assignment and re-ingest CSVs even when
+                they are unchanged
             
         Returns:
             Dictionary with sync results
@@ -68,6 +174,12 @@ class GradescopeSync:
             if progress_callback:
                 progress_callback(payload)
         
+        stream_to_db = streaming and save_to_db
+        # One ingest session per database writer (a single one when streaming)
+        ingest_sessions = []
+        if max_connections_per_host:
+            self.gs_client.set_max_connections_per_host(max_connections_per_host)
+        
         try:
             # Login to Gradescope
             # print("[DEBUG] Attempting Gradescope login...")
@@ -97,7 +209,11 @@ class GradescopeSync:
                 "progress": 5,
             })
             assignments_data = {}
+            # Per-assignment submission change counts (inserted / updated / unchanged)
+            assignment_changes = {}
             students_data = set()
+            # Guards the three above; writer threads record results concurrently
+            results_lock = threading.Lock()
             
             # Download all assignments and their scores
             # print(f"[DEBUG] About to call _get_course_assignments({course_id})")
@@ -109,104 +225,190 @@ class GradescopeSync:
                 )
             # print(f"[DEBUG] Retrieved {len(course_assignments)} assignments from Gradescope")
             logger.info(f"Retrieved {len(course_assignments)} assignments from Gradescope")
-            total_assignments = len(course_assignments)
             
-            for index, (assignment_id, assignment_name) in enumerate(course_assignments.items(), start=1):
-                start_pct = int(10 + ((index - 1) / max(1, total_assignments)) * 80)
-                emit_progress({
-                    "event": "progress",
-                    "status": "running",
-                    "stage": "assignment_start",
-                    "message": f"Syncing assignment {index}/{total_assignments}: {assignment_name}",
-                    "progress": start_pct,
-                    "subCurrent": index,
-                    "subTotal": total_assignments,
-                    "subLabel": assignment_name,
-                })
-                logger.info(f"Downloading scores for: {assignment_name} (ID: {assignment_id})")
-                
-                try:
-                    import time as _time
-                    print(f"[{_ts()}] Processing {assignment_name}...", flush=True)
-                    
-                    # Download CSV scores for this assignment
-                    _dl_start = _time.time()
-                    scores_csv = self.gs_client.download_scores(course_id, assignment_id)
-                    _dl_elapsed = _time.time() - _dl_start
-                    
-                    if scores_csv:
-                        # Ensure scores_csv is a string (not bytes)
-                        if isinstance(scores_csv, bytes):
-                            scores_csv = scores_csv.decode('utf-8')
-                        
-                        logger.info(f"[INFO] [{_ts()}] `save_to_db` is {save_to_db} for {assignment_name}")
-                        
-                        # Parse CSV and save to database if requested
-                        if save_to_db:
-                            # Use optimized batch ingestion
-                            from api.core.ingest_optimized import write_assignment_scores_optimized
-                            
-                            _db_start = _time.time()
-                            result = write_assignment_scores_optimized(
-                                course_gradescope_id=course_id,
-                                assignment_id=assignment_id,
-                                assignment_name=assignment_name,
-                                csv_content=scores_csv,
-                                course_config=course_config
-                            )
-                            _db_elapsed = _time.time() - _db_start
-                            
-                            # if result.get('skipped'):
-                            #     print(f"[{_ts()}] Skipped {assignment_name} - {result.get('reason')} ({_db_elapsed:.2f}s)", flush=True)
-                            # elif result.get('success'):
-                            #     print(f"[{_ts()}] Saved {assignment_name} ({result.get('submissions_processed')} subs, {_db_elapsed:.2f}s)", flush=True)
-                            # else:
-                            #     print(f"[{_ts()}] Failed {assignment_name}: {result.get('error')} ({_db_elapsed:.2f}s)", flush=True)
-                        
-                        assignments_data[assignment_id] = assignment_name
-                        
-                        # Count unique students
-                        import csv
-                        import io
-                        reader = csv.DictReader(io.StringIO(scores_csv))
-                        for row in reader:
-                            if 'SID' in row:
-                                students_data.add(row['SID'])
-
-                        done_pct = int(10 + (index / max(1, total_assignments)) * 80)
-                        emit_progress({
-                            "event": "progress",
-                            "status": "running",
-                            "stage": "assignment_done",
-                            "message": f"Finished assignment {index}/{total_assignments}: {assignment_name}",
-                            "progress": done_pct,
-                            "subCurrent": index,
-                            "subTotal": total_assignments,
-                            "subLabel": assignment_name,
-                        })
-                
-                except Exception as e:
-                    logger.error(f"Failed to sync {assignment_name}: {e}")
-                    done_pct = int(10 + (index / max(1, total_assignments)) * 80)
+            fresh_assignments = []
+            if incremental and save_to_db:
+                from api.core.ingest_optimized import (
+                    DEFAULT_ACTIVE_WINDOW_HOURS,
+                    DEFAULT_FRESHNESS_HOURS,
+                    plan_incremental_sync,
+                )
+                to_sync, fresh_assignments = plan_incremental_sync(
+                    course_id,
+                    course_assignments,
+                    assignment_dates=self.assignment_dates,
+                    freshness_hours=DEFAULT_FRESHNESS_HOURS if freshness_hours is None else freshness_hours,
+                    active_window_hours=DEFAULT_ACTIVE_WINDOW_HOURS if active_window_hours is None else active_window_hours,
+                    force_sync=force_sync,
+                )
+                if fresh_assignments:
+                    logger.info(
+                        f"Incremental sync: {len(to_sync)} assignment(s) to sync, "
+                        f"{len(fresh_assignments)} still fresh"
+                    )
                     emit_progress({
                         "event": "progress",
                         "status": "running",
-                        "stage": "assignment_failed",
-                        "message": f"Failed assignment {index}/{total_assignments}: {assignment_name}",
-                        "progress": done_pct,
-                        "subCurrent": index,
-                        "subTotal": total_assignments,
-                        "subLabel": assignment_name,
+                        "stage": "incremental_plan",
+                        "message": f"Skipping {len(fresh_assignments)} recently synced assignments",
+                        "progress": 8,
                     })
-                    # print(f"[{_ts()}] Error: {assignment_name}: {e}", flush=True)
-                    continue
+                course_assignments = {assignment_id: course_assignments[assignment_id] for assignment_id in to_sync}
+            total_assignments = len(course_assignments)
+            
+            writers = 1 if stream_to_db else max(1, int(db_writers or 1))
+            if writers > 1:
+                # New students are inserted under a per-course lock held until
+                # commit (StudentIdentityMap.ensure), so transactions must stay short
+                commit_every = 1
+            if save_to_db:
+                # One course-scoped unit of work per writer: the course is
+                # resolved once, each assignment runs in its own savepoint and
+                # commits happen every `commit_every` assignments. Sessions are
+                # opened one after another so only the first can create the course.
+                from api.core.ingest_optimized import CourseIngestSession
+                for _ in range(writers):
+                    ingest_sessions.append(CourseIngestSession(
+                        course_id,
+                        course_config=course_config,
+                        commit_every=commit_every,
+                        parse_engine=parse_engine,
+                    ))
+            
+            progress = _AssignmentProgress(total_assignments, emit_progress)
+            
+            def record(assignment_id: str, assignment_name: str, result, scores_csv, elapsed: float):
+                """Per-assignment bookkeeping; safe to call from writer threads."""
+                if result is not None and result.get('skipped'):
+                    logger.info(f"[{_ts()}] Skipped {assignment_name} - {result.get('reason')} ({elapsed:.2f}s)")
+                
+                # Count unique students (streamed bodies are counted from the DB afterwards)
+                sids = set()
+                if scores_csv is not None:
+                    reader = csv.DictReader(io.StringIO(scores_csv))
+                    for row in reader:
+                        if 'SID' in row:
+                            sids.add(row['SID'])
+                
+                with results_lock:
+                    if result is not None and result.get('success'):
+                        assignment_changes[assignment_id] = {
+                            "name": assignment_name,
+                            "skipped": bool(result.get('skipped')),
+                            "inserted": result.get('submissions_inserted', 0),
+                            "updated": result.get('submissions_updated', 0),
+                            "unchanged": result.get('submissions_unchanged', 0),
+                        }
+                    assignments_data[assignment_id] = assignment_name
+                    students_data.update(sids)
+            
+            def download(assignment):
+                assignment_id, assignment_name = assignment
+                progress.start(assignment_name)
+                logger.info(f"Downloading scores for: {assignment_name} (ID: {assignment_id})")
+                print(f"[{_ts()}] Processing {assignment_name}...", flush=True)
+                return self._download_csv(course_id, assignment_id)
+            
+            def ingest(writer_index: int, assignment, scores_csv):
+                assignment_id, assignment_name = assignment
+                if scores_csv:
+                    logger.info(f"[INFO] [{_ts()}] `save_to_db` is {save_to_db} for {assignment_name}")
+                    result = None
+                    _db_start = time.time()
+                    if save_to_db:
+                        # Use optimized batch ingestion
+                        result = ingest_sessions[writer_index].ingest_csv(
+                            assignment_id=assignment_id,
+                            assignment_name=assignment_name,
+                            csv_content=scores_csv,
+                            force=force_sync,
+                        )
+                    record(assignment_id, assignment_name, result, scores_csv, time.time() - _db_start)
+                progress.finish(assignment_name)
+            
+            def failed(assignment, error: Exception):
+                assignment_id, assignment_name = assignment
+                logger.error(f"Failed to sync {assignment_name}: {error}")
+                progress.finish(assignment_name, failed=True)
+            
+            if stream_to_db:
+                # Streamed bodies are parsed while they are read, so each download
+                # is its own database write; assignments go one at a time.
+                ingest_session = ingest_sessions[0]
+                for assignment_id, assignment_name in course_assignments.items():
+                    try:
+                        progress.start(assignment_name)
+                        logger.info(f"Downloading scores for: {assignment_name} (ID: {assignment_id})")
+                        print(f"[{_ts()}] Processing {assignment_name}...", flush=True)
+                        # Stream the CSV straight into the database in fixed-size chunks
+                        _db_start = time.time()
+                        result = ingest_session.ingest_stream(
+                            assignment_id=assignment_id,
+                            assignment_name=assignment_name,
+                            byte_chunks=self.gs_client.stream_scores(course_id, assignment_id),
+                            force=force_sync,
+                        )
+                        record(assignment_id, assignment_name, result, None, time.time() - _db_start)
+                        progress.finish(assignment_name)
+                    except Exception as e:
+                        failed((assignment_id, assignment_name), e)
+                        continue
+            else:
+                # Downloads (sharing the logged-in session, capped per host by the
+                # client) feed a bounded queue that the database writers drain, so
+                # network I/O and Postgres writes overlap.
+                logger.info(
+                    f"Syncing with {download_workers} download worker(s), "
+                    f"{writers} database writer(s), queue size {queue_size}"
+                )
+                ScoresPipeline(
+                    download=download,
+                    consume=ingest,
+                    on_failure=failed,
+                    download_workers=download_workers,
+                    writers=writers,
+                    queue_size=queue_size,
+                ).run(course_assignments.items())
+            
+            # Report per-assignment changes in course order, however downloads finished
+            assignment_changes = {
+                assignment_id: assignment_changes[assignment_id]
+                for assignment_id in course_assignments
+                if assignment_id in assignment_changes
+            }
+            
+            for ingest_session in ingest_sessions:
+                ingest_session.commit()
+            if len(ingest_sessions) > 1:
+                # Each writer only knows the students it has seen
+                from api.core.ingest_optimized import update_course_student_count
+                update_course_student_count(course_id)
+            
+            if stream_to_db or fresh_assignments:
+                # Skipped assignments' students are only known to the database
+                from api.core.ingest_optimized import count_course_students
+                students_synced = count_course_students(course_id)
+            else:
+                students_synced = len(students_data)
             
             results = {
                 "success": True,
                 "course_id": course_id,
                 "assignments_synced": len(assignments_data),
-                "students_synced": len(students_data)
+                "students_synced": students_synced,
+                "submissions_inserted": sum(c["inserted"] for c in assignment_changes.values()),
+                "submissions_updated": sum(c["updated"] for c in assignment_changes.values()),
+                "submissions_unchanged": sum(c["unchanged"] for c in assignment_changes.values()),
+                "assignments_skipped": sum(1 for c in assignment_changes.values() if c["skipped"]),
+                "assignments_fresh": len(fresh_assignments),
+                "assignment_changes": assignment_changes
             }
+            if ingest_sessions:
+                # Database ids with new/modified submissions, for incremental summaries
+                results["touched"] = {
+                    key: sorted({i for session in ingest_sessions for i in session.touched()[key]})
+                    for key in ("assignment_ids", "student_ids")
+                }
             
             # print(f"[{_ts()}] Sync completed: {results}", flush=True)
             logger.info(f"Sync completed: {results}")
@@ -216,12 +418,25 @@ class GradescopeSync:
             logger.error(f"Sync failed: {e}")
             raise
         finally:
+            for ingest_session in ingest_sessions:
+                # Keep assignments that were ingested before a failure
+                ingest_session.close()
             self.gs_client.logout()
     
     def close(self):
         """Close clients."""
         self.gs_client.logout()
     
+    def _download_csv(self, course_id: str, assignment_id: str) -> Optional[str]:
+        """Download an assignment's scores.csv as text (None if Gradescope returned nothing)."""
+        scores_csv = self.gs_client.download_scores(course_id, assignment_id)
+        if not scores_csv:
+            return None
+        # Ensure scores_csv is a string (not bytes)
+        if isinstance(scores_csv, bytes):
+            scores_csv = scores_csv.decode('utf-8')
+        return scores_csv
+    
     def _get_course_assignments(self, course_id: str) -> Dict[str, str]:
         """
         Get all assignments for a course using Gradescope API.
@@ -229,6 +444,9 @@ class GradescopeSync:
         Args:
             course_id: Gradescope course ID
             
+        Release and due dates found on the same page are left in
+        self.assignment_dates (see _extract_assignment_dates).
+        
         Returns:
             Dict mapping assignment_id -> assignment_name
         """
@@ -284,6 +502,8 @@ class GradescopeSync:
                 assignment_name = re.sub(r'<[^>]+>', '', anchor_inner_html)
                 _add_assignment(assignment_id, assignment_name)
             
+            self.assignment_dates = self._extract_assignment_dates(response_text, assignments)
+            
             # print(f"[DEBUG] Found {len(assignments)} assignments: {assignments}")
             logger.info(f"Found {len(assignments)} assignments for course {course_id}")
             return assignments
@@ -294,6 +514,46 @@ class GradescopeSync:
             logger.error(f"Failed to get assignments for course {course_id}: {e}")
             raise RuntimeError(f"Failed to fetch assignments for course {course_id}: {e}") from e
     
+    @staticmethod
+    def _extract_assignment_dates(response_text: str, assignment_ids) -> Dict[str, Dict[str, str]]:
+        """
+        Release / due / late due dates of each assignment, where the assignment
+        list embeds them as JSON next to the assignment's id.
+        
+        Returns:
+            Dict mapping assignment_id -> {release_date, due_date, late_due_date}
+            (ISO strings; assignments without any date are left out)
+        """
+        import re
+        import html
+        
+        text = html.unescape(response_text)
+        wanted = {str(a) for a in assignment_ids}
+        date_keys = {
+            "release_date": "release_date",
+            "due_date": "due_date",
+            "hard_due_date": "late_due_date",
+            "late_due_date": "late_due_date",
+        }
+        positions = [
+            (match.start(), match.group(1))
+            for match in re.finditer(r'"id"\s*:\s*"?(?:assignment_)?(\d+)"?', text)
+        ]
+        dates = {}
+        for index, (start, assignment_id) in enumerate(positions):
+            if assignment_id not in wanted or assignment_id in dates:
+                continue
+            end = positions[index + 1][0] if index + 1 < len(positions) else len(text)
+            segment = text[start:min(end, start + 4000)]
+            found = {}
+            for key, value in re.findall(
+                r'"(release_date|due_date|hard_due_date|late_due_date)"\s*:\s*"([^"]+)"', segment
+            ):
+                found.setdefault(date_keys[key], value)
+            if found:
+                dates[assignment_id] = found
+        return dates
+    
     def _save_assignment_to_db(
         self,
         course_id: str,
@@ -303,60 +563,18 @@ class GradescopeSync:
         course_config: Optional[Any] = None
     ):
         """Save assignment scores to database from CSV string content."""
-        try:
-            import tempfile
-            import os
-            
-            # Create temporary file to store CSV content
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8') as f:
-                f.write(scores_csv)
-                temp_filepath = f.name
-            
-            try:
-                from api.core.ingest import write_assignment_scores_to_db
-                
-                # Extract course metadata from config
-                course_categories = None
-                course_name = None
-                department = None
-                course_number = None
-                semester = None
-                year = None
-                instructor = None
-                
-                if course_config:
-                    course_categories = course_config.get('assignment_categories', [])
-                    course_name = course_config.get('name')
-                    department = course_config.get('department')
-                    course_number = course_config.get('course_number')
-                    semester = course_config.get('semester')
-                    year = course_config.get('year')
-                    instructor = course_config.get('instructor')
-                
-                write_assignment_scores_to_db(
-                    course_gradescope_id=course_id,
-                    assignment_id=assignment_id,
-                    assignment_name=assignment_name,
-                    csv_filepath=temp_filepath,
-                    course_name=course_name,
-                    department=department,
-                    course_number=course_number,
-                    semester=semester,
-                    year=year,
-                    instructor=instructor,
-                    course_categories=course_categories
-                )
-                # print(f"[DEBUG] Saved {assignment_name} to database")
-                logger.info(f"Saved {assignment_name} to database")
-                
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_filepath):
-                    os.remove(temp_filepath)
-            
-        except Exception as e:
-            # print(f"[DEBUG] Failed to save {assignment_name} to database: {e}")
-            logger.error(f"Failed to save {assignment_name} to database: {e}")
-            # import traceback
-            # traceback.print_exc()
+        from api.core.ingest_optimized import write_assignment_scores_optimized
+        
+        result = write_assignment_scores_optimized(
+            course_gradescope_id=course_id,
+            assignment_id=assignment_id,
+            assignment_name=assignment_name,
+            csv_content=scores_csv,
+            course_config=course_config
+        )
+        if result.get('success'):
+            logger.info(f"Saved {assignment_name} to database")
+        else:
+            logger.error(f"Failed to save {assignment_name} to database: {result.get('error')}")
+        return result
     
\ No newline at end of file
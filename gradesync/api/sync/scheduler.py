@@ -0,0 +1,327 @@
+"""
+Interval-aware sync scheduler.
+
+Keeps every configured course fresh from one long-running process: each
+poll reads every course's sync interval and ``Course.last_synced_at`` and
+hands the courses that are due to a bounded worker pool, so many courses are
+synced a few at a time instead of in one serial run.
+
+A course's interval is, in order of precedence:
+
+- ``course_configs.gradescope_sync_interval_hours`` (edited from the admin
+  UI; NULL unless overridden there)
+- ``sources.gradescope.sync_interval_hours`` in config.json
+- global_settings.sync_interval_hours (default DEFAULT_SYNC_INTERVAL_HOURS)
+
+An interval of 0 or less disables scheduled syncs for that course.
+
+GradeSyncService.sync_all stamps every source that succeeded in
+``Course.source_synced_at``. A course is due once any enabled source's stamp
+is older than the interval, and only those sources are synced. A failed
+sync is recorded in ``Course.sync_failed_at`` / ``sync_failure_count`` and
+retried (again only the sources still due, plus the summary step) after an
+exponential backoff: ``retry_minutes`` doubled per consecutive failure,
+capped at the interval. The state lives in the database, so one-shot runs
+from cron back off as well. Courses without a database row fall back to
+in-memory tracking.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from api.config_manager import get_config_manager
+from api.core.db import SessionLocal
+from api.core.models import Course, CourseConfig as CourseConfigRow
+from api.sync.service import SYNC_SOURCES, sync_course_grades
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_INTERVAL_HOURS = 24
+DEFAULT_SCHEDULER_WORKERS = 4
+DEFAULT_POLL_SECONDS = 60
+DEFAULT_RETRY_MINUTES = 30
+
+
+@dataclass
+class DueCourse:
+    """A scheduled course and its sync state."""
+    course_id: str
+    gradescope_course_id: Optional[str]
+    interval_hours: float
+    last_synced_at: Optional[datetime]
+    enabled_sources: List[str] = field(default_factory=list)
+    # Source -> start of its last successful sync
+    source_synced_at: Dict[str, datetime] = field(default_factory=dict)
+    failed_at: Optional[datetime] = None
+    failure_count: int = 0
+    # Sources to sync, filled by SyncScheduler.due_courses
+    sources: List[str] = field(default_factory=list)
+
+    @property
+    def next_due_at(self) -> Optional[datetime]:
+        if self.last_synced_at is None:
+            return None
+        return self.last_synced_at + timedelta(hours=self.interval_hours)
+
+    def sources_due(self, now: datetime) -> List[str]:
+        """Enabled sources never synced, or last synced more than an interval ago."""
+        interval = timedelta(hours=self.interval_hours)
+        return [
+            source for source in self.enabled_sources
+            if source not in self.source_synced_at or self.source_synced_at[source] + interval <= now
+        ]
+
+    def retry_at(self, retry_minutes: float) -> Optional[datetime]:
+        """When a failing course may be retried (None if it is not failing)."""
+        if not self.failure_count or self.failed_at is None:
+            return None
+        backoff = retry_minutes * 2 ** min(self.failure_count - 1, 16)
+        if self.interval_hours > 0:
+            backoff = min(backoff, max(retry_minutes, self.interval_hours * 60))
+        return self.failed_at + timedelta(minutes=backoff)
+
+
+def _enabled_sources(config) -> List[str]:
+    enabled = {
+        "gradescope": config.gradescope_enabled,
+        "prairielearn": config.prairielearn_enabled,
+        "iclicker": config.iclicker_enabled,
+    }
+    return [source for source in SYNC_SOURCES if enabled[source]]
+
+
+def _source_stamps(value: Optional[Dict[str, str]]) -> Dict[str, datetime]:
+    stamps = {}
+    for source, stamp in (value or {}).items():
+        try:
+            stamps[source] = datetime.fromisoformat(stamp)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid sync stamp for {source}: {stamp!r}")
+    return stamps
+
+
+def _setting(key: str, default: Any) -> Any:
+    try:
+        return get_config_manager().get_global_setting(key, default)
+    except FileNotFoundError:
+        return default
+
+
+class SyncScheduler:
+    """
+    Dispatch due courses to a bounded worker pool.
+
+    Args:
+        max_workers: Courses synced at the same time
+        poll_seconds: Longest sleep between two scans
+        retry_minutes: Delay before a failed course is first tried again;
+            doubled for every further consecutive failure
+        course_ids: Only schedule these config course ids (default: all)
+        sync_fn: sync_fn(course_id, sources=[...]) -> sync_all summary;
+            defaults to sync_course_grades
+
+    Usage:
+        scheduler = SyncScheduler(max_workers=4)
+        scheduler.run_forever()  # until stop() or Ctrl-C
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        retry_minutes: Optional[float] = None,
+        course_ids: Optional[Iterable[str]] = None,
+        sync_fn: Optional[Callable[..., Dict[str, Any]]] = None,
+    ):
+        self.max_workers = max(1, int(max_workers or _setting("scheduler_workers", DEFAULT_SCHEDULER_WORKERS)))
+        self.poll_seconds = max(1.0, float(poll_seconds or _setting("scheduler_poll_seconds", DEFAULT_POLL_SECONDS)))
+        self.retry_minutes = float(
+            retry_minutes if retry_minutes is not None else _setting("sync_retry_minutes", DEFAULT_RETRY_MINUTES)
+        )
+        self.course_ids = set(course_ids) if course_ids else None
+        self.sync_fn = sync_fn or sync_course_grades
+
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sync-scheduler")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._in_flight: set = set()
+        # For courses without a Course row (e.g. the database is disabled),
+        # whose sync state cannot be stored: config course id -> time it may
+        # be retried after a failure / start of the last successful run
+        self._retry_after: Dict[str, datetime] = {}
+        self._last_run: Dict[str, datetime] = {}
+
+    def scan(self) -> List[DueCourse]:
+        """
+        Every scheduled course with its interval and last sync time.
+
+        The configuration is re-read on every scan, so interval changes and
+        new courses are picked up without a restart.
+        """
+        config_manager = get_config_manager()
+        config_manager.reload()
+        default_interval = float(_setting("sync_interval_hours", DEFAULT_SYNC_INTERVAL_HOURS))
+
+        configs = [
+            config for config in config_manager.list_course_configs()
+            if (self.course_ids is None or config.id in self.course_ids)
+            and _enabled_sources(config)
+        ]
+        gradescope_ids = [config.gradescope_course_id for config in configs if config.gradescope_course_id]
+
+        rows = {}
+        if gradescope_ids:
+            session = SessionLocal()
+            try:
+                rows = {
+                    row.gradescope_course_id: row
+                    for row in session.execute(
+                        select(
+                            Course.gradescope_course_id,
+                            Course.last_synced_at,
+                            Course.source_synced_at,
+                            Course.sync_failed_at,
+                            Course.sync_failure_count,
+                            CourseConfigRow.gradescope_sync_interval_hours,
+                        )
+                        .outerjoin(CourseConfigRow, CourseConfigRow.course_id == Course.id)
+                        .where(Course.gradescope_course_id.in_(gradescope_ids))
+                    )
+                }
+            finally:
+                session.close()
+
+        courses = []
+        for config in configs:
+            row = rows.get(config.gradescope_course_id)
+            interval = row.gradescope_sync_interval_hours if row is not None else None
+            if interval is None:
+                interval = config.gradescope_sync_interval_hours
+            if interval is None:
+                interval = default_interval
+            enabled_sources = _enabled_sources(config)
+            if row is not None:
+                course = DueCourse(
+                    course_id=config.id,
+                    gradescope_course_id=config.gradescope_course_id,
+                    interval_hours=float(interval),
+                    last_synced_at=row.last_synced_at,
+                    enabled_sources=enabled_sources,
+                    source_synced_at=_source_stamps(row.source_synced_at),
+                    failed_at=row.sync_failed_at,
+                    failure_count=row.sync_failure_count or 0,
+                )
+            else:
+                last_run = self._last_run.get(config.id)
+                course = DueCourse(
+                    course_id=config.id,
+                    gradescope_course_id=config.gradescope_course_id,
+                    interval_hours=float(interval),
+                    last_synced_at=last_run,
+                    enabled_sources=enabled_sources,
+                    source_synced_at={source: last_run for source in enabled_sources} if last_run else {},
+                )
+            courses.append(course)
+        return courses
+
+    def due_courses(self, now: Optional[datetime] = None) -> List[DueCourse]:
+        """
+        Courses to sync now, most overdue (never synced) first.
+
+        Each course's ``sources`` lists the sources to sync: those whose last
+        success is older than the interval. A failing course whose backoff
+        has expired is due even if none are, to finish its summary step.
+        """
+        now = now or datetime.now(timezone.utc)
+        courses = self.scan()
+        due = []
+        with self._lock:
+            for course in courses:
+                if course.interval_hours <= 0 or course.course_id in self._in_flight:
+                    continue
+                retry_after = course.retry_at(self.retry_minutes) or self._retry_after.get(course.course_id)
+                if retry_after is not None and retry_after > now:
+                    continue
+                course.sources = course.sources_due(now)
+                if course.sources or course.failure_count:
+                    due.append(course)
+        epoch = datetime.min.replace(tzinfo=timezone.utc)
+        due.sort(key=lambda course: course.next_due_at or epoch)
+        return due
+
+    def run_once(self, now: Optional[datetime] = None) -> List[str]:
+        """Dispatch every due course to the pool; returns the dispatched course ids."""
+        dispatched = []
+        for course in self.due_courses(now):
+            with self._lock:
+                if course.course_id in self._in_flight:
+                    continue
+                self._in_flight.add(course.course_id)
+            self._pool.submit(self._sync, course)
+            dispatched.append(course.course_id)
+        if dispatched:
+            logger.info(f"Dispatched {len(dispatched)} due course(s): {', '.join(dispatched)}")
+        return dispatched
+
+    def run_forever(self):
+        """Scan and dispatch every poll_seconds (sooner when a sync finishes) until stop()."""
+        logger.info(
+            f"Sync scheduler started: {self.max_workers} worker(s), "
+            f"polling every {self.poll_seconds:.0f}s"
+        )
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.exception(f"Scheduler scan failed: {e}")
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+        finally:
+            self.shutdown(wait=True)
+
+    def wait_idle(self):
+        """Block until no sync is running."""
+        while True:
+            with self._lock:
+                if not self._in_flight:
+                    return
+            self._wake.wait(1)
+            self._wake.clear()
+
+    def stop(self):
+        """Make run_forever return after the running syncs finish."""
+        self._stop.set()
+        self._wake.set()
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def _sync(self, course: DueCourse):
+        started_at = datetime.now(timezone.utc)
+        logger.info(
+            f"Scheduled sync of {course.course_id} (interval {course.interval_hours:g}h, "
+            f"sources: {', '.join(course.sources) or 'summary only'})"
+        )
+        try:
+            result = self.sync_fn(course.course_id, sources=course.sources)
+            success = bool(result and result.get("overall_success"))
+        except Exception as e:
+            logger.exception(f"Scheduled sync of {course.course_id} failed: {e}")
+            success = False
+        with self._lock:
+            self._in_flight.discard(course.course_id)
+            if success:
+                self._retry_after.pop(course.course_id, None)
+                self._last_run[course.course_id] = started_at
+            else:
+                self._retry_after[course.course_id] = datetime.now(timezone.utc) + timedelta(minutes=self.retry_minutes)
+        elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+        logger.info(f"Scheduled sync of {course.course_id} {'succeeded' if success else 'failed'} in {elapsed:.0f}s")
+        self._wake.set()
@@ -9,9 +9,11 @@ Orchestrates grade synchronization across all platforms:
 import logging
 import sys
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, List, Any, Callable
-from datetime import datetime
+from typing import Optional, Dict, Iterable, List, Any, Callable
+from datetime import datetime, timezone
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -19,10 +21,25 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from api.config_manager import get_course_config, get_config_manager, EnvConfig
 from api.core.db import SessionLocal
 from api.core.models import Course
-from api.core.ingest import save_summary_sheet_to_db
+from api.core.data_version import load_summary_dirty
+from api.core.ingest import save_summary_sheet_to_db, refresh_summary_sheet
+from api.core.summary_matview import refresh_summary_matview
+from api.queries.grade_matrix import grade_matrix_cache
+from api.queries.summary import get_summary_backend
 
 logger = logging.getLogger(__name__)
 
+# Source steps of sync_all, in step order; the database step follows them
+SYNC_SOURCES = ("gradescope", "prairielearn", "iclicker")
+
+# Relative share of each step in the combined progress of sync_all
+STEP_PROGRESS_WEIGHTS = {
+    "gradescope": 4,
+    "prairielearn": 1,
+    "iclicker": 1,
+    "database": 1,
+}
+
 
 class GradeSyncResult:
     """Result of a grade sync operation."""
@@ -44,11 +61,97 @@ class GradeSyncResult:
         }
 
 
+class _CombinedProgress:
+    """
+    One progress stream for steps that run concurrently.
+    
+    Each step reports its own 0-100 ``progress``; the overall value is the
+    weighted mean over all steps (STEP_PROGRESS_WEIGHTS), so a slow source
+    does not hide the others' progress and the stream never depends on the
+    order steps start or finish in. A step's progress never goes backwards.
+    
+    ``currentStep`` keeps its sequential meaning: the 1-based position of
+    the event's step (``source``) in the step list, as consumed by the admin
+    API. ``finishedSteps`` counts the steps finished so far,
+    ``weightedPercent`` is the unrounded weighted mean behind ``progress``,
+    and ``sources`` maps every step to its own progress. Events are emitted
+    under a lock.
+    """
+    
+    def __init__(self, sources: List[str], emit: Callable[[Dict[str, Any]], None]):
+        self.sources = sources
+        self.emit = emit
+        self.weights = {source: STEP_PROGRESS_WEIGHTS.get(source, 1) for source in sources}
+        self.progress = {source: 0 for source in sources}
+        self.finished = 0
+        self._lock = threading.Lock()
+    
+    def _overall(self) -> float:
+        total_weight = sum(self.weights.values())
+        if not total_weight:
+            return 100.0
+        weighted = sum(self.weights[source] * self.progress[source] for source in self.sources)
+        return weighted / total_weight
+    
+    def _emit(self, source: str, message: str, stage: str, **extra):
+        overall = self._overall()
+        payload = {
+            "event": "progress",
+            "status": extra.pop("status", "running"),
+            "message": message,
+            "progress": max(1, min(100, int(overall))),
+            "currentStep": self.sources.index(source) + 1,
+            "totalSteps": len(self.sources),
+            "finishedSteps": self.finished,
+            "weightedPercent": round(overall, 1),
+            "source": source,
+            "stage": stage,
+            "sources": dict(self.progress),
+        }
+        payload.update(extra)
+        self.emit(payload)
+    
+    def start(self, source: str, message: str):
+        with self._lock:
+            self._emit(source, message, "start")
+    
+    def update(self, source: str, event: Dict[str, Any], default_message: str):
+        try:
+            step_progress_pct = max(0, min(100, int(event.get("progress", 0))))
+        except Exception:
+            step_progress_pct = 0
+        with self._lock:
+            self.progress[source] = max(self.progress[source], step_progress_pct)
+            self._emit(
+                source,
+                event.get("message", default_message),
+                event.get("stage", "running"),
+                status=event.get("status", "running"),
+                sourceSuccess=event.get("sourceSuccess"),
+                subCurrent=event.get("subCurrent"),
+                subTotal=event.get("subTotal"),
+                subLabel=event.get("subLabel"),
+            )
+    
+    def finish(self, source: str, result: "GradeSyncResult"):
+        with self._lock:
+            self.progress[source] = 100
+            self.finished += 1
+            self._emit(
+                source,
+                result.message,
+                "completed" if result.success else "failed",
+                sourceSuccess=result.success,
+            )
+
+
 class GradeSyncService:
     """Service to synchronize grades from multiple sources."""
     
-    def __init__(self, course_id: str):
+    def __init__(self, course_id: str, force_sync: bool = False):
         self.course_id = course_id
+        # Bypass incremental skipping and unchanged-CSV detection
+        self.force_sync = force_sync
         # Always reload config to pick up runtime edits to config.json
         get_config_manager().reload()
         self.config = get_course_config(course_id)
@@ -57,39 +160,67 @@ class GradeSyncService:
             raise ValueError(f"Course configuration not found: {course_id}")
         
         self.results: List[GradeSyncResult] = []
+        # Summary sheet left stale by an earlier run (read before this run ingests)
+        self.summary_was_dirty = False
     
-    def sync_all(self, progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    def sync_all(
+        self,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        sources: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
         """
         Sync grades from all enabled sources for this course.
         
+        The source steps (Gradescope, PrairieLearn, iClicker) talk to
+        different hosts and share no state, so each runs in its own worker
+        thread; the database summary step starts once all of them have
+        finished. Progress events from the workers are combined into one
+        stream (see _CombinedProgress).
+        
+        The outcome is recorded on the course row (see _record_sync_outcome):
+        each source that succeeded is stamped on its own, and a failed run is
+        counted so the scheduler can back off.
+        
+        Args:
+            progress_callback: Receives combined progress events
+            sources: Only run these source steps (default: every enabled
+                one), e.g. to retry just the sources that failed; the
+                database step always runs when enabled
+        
         Returns:
             Dict with sync results from each source
         """
         logger.info(f"Starting grade sync for course: {self.course_id}")
+        started_at = datetime.now(timezone.utc)
 
         def emit_progress(payload: Dict[str, Any]):
             if progress_callback:
                 progress_callback(payload)
 
-        steps = []
+        selected = set(SYNC_SOURCES if sources is None else sources)
+        source_steps = []
         if self.config.gradescope_enabled:
-            steps.append(("gradescope", "Syncing Gradescope", self._sync_gradescope))
+            source_steps.append(("gradescope", "Syncing Gradescope", self._sync_gradescope))
         else:
             logger.info("Gradescope sync disabled for this course")
 
         if self.config.prairielearn_enabled:
-            steps.append(("prairielearn", "Syncing PrairieLearn", self._sync_prairielearn))
+            source_steps.append(("prairielearn", "Syncing PrairieLearn", self._sync_prairielearn))
         else:
             logger.info("PrairieLearn sync disabled for this course")
 
         if self.config.iclicker_enabled:
-            steps.append(("iclicker", "Syncing iClicker", self._sync_iclicker))
+            source_steps.append(("iclicker", "Syncing iClicker", self._sync_iclicker))
         else:
             logger.info("iClicker sync disabled for this course")
 
+        database_step = None
         if self.config.database_enabled:
-            steps.append(("database", "Updating summary sheets", self._update_summary_sheets))
+            database_step = ("database", "Updating summary sheets", self._update_summary_sheets)
+            self.summary_was_dirty = self._summary_dirty()
 
+        source_steps = [step for step in source_steps if step[0] in selected]
+        steps = source_steps + ([database_step] if database_step else [])
         total_steps = len(steps)
 
         if total_steps == 0:
@@ -104,59 +235,42 @@ class GradeSyncService:
                 "stage": "completed",
             })
 
-        for idx, (source, label, step_fn) in enumerate(steps, start=1):
-            base_progress = int(((idx - 1) / total_steps) * 100)
-            done_progress = int((idx / total_steps) * 100)
+        progress = _CombinedProgress([source for source, _, _ in steps], emit_progress)
 
-            emit_progress({
-                "event": "progress",
-                "status": "running",
-                "message": f"{label}...",
-                "progress": max(1, base_progress),
-                "currentStep": idx,
-                "totalSteps": total_steps,
-                "source": source,
-                "stage": "start",
-            })
+        def run_step(source: str, label: str, step_fn) -> GradeSyncResult:
+            progress.start(source, f"{label}...")
 
             def step_progress(event: Dict[str, Any]):
-                step_raw_progress = event.get("progress", 0)
-                try:
-                    step_progress_pct = max(0, min(100, int(step_raw_progress)))
-                except Exception:
-                    step_progress_pct = 0
-
-                overall_progress = int(base_progress + ((done_progress - base_progress) * step_progress_pct / 100))
+                progress.update(source, event, default_message=f"{label}...")
 
-                emit_progress({
-                    "event": "progress",
-                    "status": event.get("status", "running"),
-                    "message": event.get("message", f"{label}..."),
-                    "progress": max(1, min(100, overall_progress)),
-                    "currentStep": idx,
-                    "totalSteps": total_steps,
-                    "source": source,
-                    "stage": event.get("stage", "running"),
-                    "sourceSuccess": event.get("sourceSuccess"),
-                    "subCurrent": event.get("subCurrent"),
-                    "subTotal": event.get("subTotal"),
-                    "subLabel": event.get("subLabel"),
-                })
+            try:
+                result = step_fn(progress_callback=step_progress)
+            except Exception as e:
+                # Step functions report their own failures; this is a last resort
+                logger.exception(f"{label} failed: {e}")
+                result = GradeSyncResult(source=source, success=False, message=f"{label} failed: {str(e)}")
+            progress.finish(source, result)
+            return result
 
-            result = step_fn(progress_callback=step_progress)
-            self.results.append(result)
+        results_by_source: Dict[str, GradeSyncResult] = {}
+        if source_steps:
+            with ThreadPoolExecutor(max_workers=len(source_steps), thread_name_prefix="grade-sync") as pool:
+                futures = {
+                    source: pool.submit(run_step, source, label, step_fn)
+                    for source, label, step_fn in source_steps
+                }
+                for source, future in futures.items():
+                    results_by_source[source] = future.result()
+        # Step order, however the workers finished
+        self.results.extend(results_by_source[source] for source, _, _ in source_steps)
 
-            emit_progress({
-                "event": "progress",
-                "status": "running",
-                "message": result.message,
-                "progress": done_progress,
-                "currentStep": idx,
-                "totalSteps": total_steps,
-                "source": source,
-                "stage": "completed" if result.success else "failed",
-                "sourceSuccess": result.success,
-            })
+        if database_step:
+            # Needs every source's data (and the Gradescope touched ids)
+            self.results.append(run_step(*database_step))
+        
+        if self.config.gradescope_course_id:
+            # Next summary request rebuilds the grade matrix from the new data
+            grade_matrix_cache.invalidate(self.config.gradescope_course_id)
         
         # Compile summary
         summary = {
@@ -167,6 +281,8 @@ class GradeSyncService:
             "overall_success": all(r.success for r in self.results)
         }
         
+        self._record_sync_outcome(started_at, summary["overall_success"])
+        
         logger.info(f"Grade sync completed for {self.course_id}. Overall success: {summary['overall_success']}")
         return summary
     
@@ -184,7 +300,8 @@ class GradeSyncService:
             # Create sync instance
             sync = GradescopeSync(
                 email=email,
-                password=password
+                password=password,
+                max_connections_per_host=self.config.gradescope_max_connections_per_host,
             )
             
             # Sync grades with course config
@@ -194,6 +311,17 @@ class GradeSyncService:
                 course_name=self.config.name,
                 course_config=self.config.to_dict(),
                 progress_callback=progress_callback,
+                streaming=self.config.gradescope_streaming,
+                commit_every=self.config.gradescope_commit_every,
+                parse_engine=self.config.gradescope_parse_engine,
+                download_workers=self.config.gradescope_download_workers,
+                max_connections_per_host=self.config.gradescope_max_connections_per_host,
+                db_writers=self.config.gradescope_db_writers,
+                queue_size=self.config.gradescope_queue_size,
+                incremental=self.config.gradescope_incremental,
+                freshness_hours=self.config.gradescope_freshness_hours,
+                active_window_hours=self.config.gradescope_active_window_hours,
+                force_sync=self.force_sync,
             )
             
             return GradeSyncResult(
@@ -286,13 +414,93 @@ class GradeSyncService:
                 message=f"iClicker sync failed: {str(e)}"
             )
     
+    def _enabled_sources(self) -> List[str]:
+        enabled = {
+            "gradescope": self.config.gradescope_enabled,
+            "prairielearn": self.config.prairielearn_enabled,
+            "iclicker": self.config.iclicker_enabled,
+        }
+        return [source for source in SYNC_SOURCES if enabled[source]]
+    
+    def _record_sync_outcome(self, started_at: datetime, success: bool):
+        """
+        Store this run's outcome on the course row (read by the scheduler).
+        
+        Every source step that succeeded is stamped with the run's start in
+        Course.source_synced_at, so a retry can skip it. Course.last_synced_at
+        becomes the oldest stamp of the enabled sources once all of them
+        have one (the run's start if none is enabled). A failed run sets
+        sync_failed_at and increments sync_failure_count; a successful one
+        resets them.
+        """
+        if not self.config.gradescope_course_id:
+            return
+        session = SessionLocal()
+        try:
+            course = session.query(Course).filter(
+                Course.gradescope_course_id == self.config.gradescope_course_id
+            ).with_for_update().first()
+            if course is None:
+                return
+            
+            stamps = dict(course.source_synced_at or {})
+            for result in self.results:
+                if result.source in SYNC_SOURCES and result.success:
+                    stamps[result.source] = started_at.isoformat()
+            course.source_synced_at = stamps
+            
+            enabled = self._enabled_sources()
+            if not enabled:
+                if success:
+                    course.last_synced_at = started_at
+            elif all(source in stamps for source in enabled):
+                course.last_synced_at = min(datetime.fromisoformat(stamps[source]) for source in enabled)
+            
+            if success:
+                course.sync_failure_count = 0
+                course.sync_failed_at = None
+            else:
+                course.sync_failure_count = (course.sync_failure_count or 0) + 1
+                course.sync_failed_at = datetime.now(timezone.utc)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"Could not record sync outcome for {self.course_id}: {e}")
+        finally:
+            session.close()
+    
+    def _summary_dirty(self) -> bool:
+        """Whether an earlier run's summary refresh did not finish (Course.summary_dirty)."""
+        if not self.config.gradescope_course_id:
+            return False
+        try:
+            return load_summary_dirty(self.config.gradescope_course_id)
+        except Exception as e:
+            # Unknown state: a full rebuild is always correct
+            logger.warning(f"Could not read summary state for {self.course_id}: {e}")
+            return True
+    
+    def _touched_ids(self) -> Optional[Dict[str, List[int]]]:
+        """Assignment/student ids changed by this run's Gradescope sync, if known."""
+        for result in self.results:
+            if result.source == "gradescope" and result.success:
+                return result.details.get("touched")
+        return None
+    
     def _update_summary_sheets(self, progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> GradeSyncResult:
-        """Update summary sheets in database."""
+        """
+        Update summary sheets in database.
+        
+        Incremental by default: only the assignments and students touched by
+        this run's Gradescope sync are recomputed. Falls back to a full
+        rebuild when database.summary_refresh is "full", the touched ids
+        are unknown (e.g. the Gradescope step failed), or the course was
+        already marked summary_dirty before this run, i.e. an earlier refresh
+        never finished and its changes are not in this run's touched ids.
+        """
         logger.info(f"Updating summary sheets in database for {self.course_id}")
         
         try:
-            from api.core.models import Assignment, Student, Submission
-            
             session = SessionLocal()
             try:
                 # Get course, create if not exists
@@ -309,53 +517,46 @@ class GradeSyncService:
                     session.add(course)
                     session.commit()
                     logger.info(f"Created course: {course.name} (ID: {course.id})")
-                
-                # Get all data
-                assignments = session.query(Assignment).filter(
-                    Assignment.course_id == course.id
-                ).all()
-                
-                students = session.query(Student).filter(
-                    Student.course_id == course.id
-                ).all()
-                
-                submissions = session.query(Submission).join(Assignment).filter(
-                    Assignment.course_id == course.id
-                ).all()
-                
-                submission_lookup = {
-                    (sub.assignment_id, sub.student_id): sub 
-                    for sub in submissions
-                }
-                
-                course_data = {
-                    "course": course,
-                    "assignments": assignments,
-                    "students": students,
-                    "submissions": submission_lookup
-                }
-                
-                # Save to summary_sheets table with course categories
-                save_summary_sheet_to_db(
-                    self.config.gradescope_course_id, 
-                    course_data,
-                    course_categories=self.config.categories
-                )
-                
+                course_db_id = course.id
+            finally:
+                session.close()
+            
+            if get_summary_backend() == "matview":
+                # The whole grid is one materialized view; readers are not blocked.
+                # Concurrent course syncs share one refresh.
+                details = refresh_summary_matview([course_db_id], concurrently=True)
                 return GradeSyncResult(
                     source="database",
                     success=True,
-                    message=f"Updated summary sheets: {len(students)} students, {len(assignments)} assignments",
-                    details={
-                        "students": len(students),
-                        "assignments": len(assignments),
-                        "submissions": len(submissions)
-                    }
+                    message=f"Refreshed summary view in {details['seconds']}s",
+                    details=details
                 )
-                
-            finally:
-                session.close()
-                
+            
+            # Computed set-based from submissions inside the database
+            touched = self._touched_ids()
+            if (
+                self.config.summary_refresh_mode == "incremental"
+                and touched is not None
+                and not self.summary_was_dirty
+            ):
+                counts = refresh_summary_sheet(
+                    self.config.gradescope_course_id,
+                    assignment_ids=touched.get("assignment_ids", []),
+                    student_ids=touched.get("student_ids", []),
+                )
+            else:
+                counts = save_summary_sheet_to_db(
+                    self.config.gradescope_course_id,
+                    course_categories=self.config.categories
+                )
+            
+            return GradeSyncResult(
+                source="database",
+                success=True,
+                message=f"Updated summary sheets: {counts['students']} students, {counts['assignments']} assignments",
+                details=counts
+            )
+            
         except Exception as e:
             logger.exception(f"Summary sheet update failed: {e}")
             return GradeSyncResult(
@@ -367,16 +568,20 @@ class GradeSyncService:
 
 def sync_course_grades(
     course_id: str,
-    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    force_sync: bool = False,
+    sources: Optional[Iterable[str]] = None
 ) -> Dict[str, Any]:
     """
     Convenience function to sync all grades for a course.
     
     Args:
         course_id: Course identifier (e.g., 'cs10_fa25')
+        force_sync: Sync every assignment, even fresh or unchanged ones
+        sources: Only run these source steps (default: all enabled)
     
     Returns:
         Dict with sync results
     """
-    service = GradeSyncService(course_id)
-    return service.sync_all(progress_callback=progress_callback)
+    service = GradeSyncService(course_id, force_sync=force_sync)
+    return service.sync_all(progress_callback=progress_callback, sources=sources)
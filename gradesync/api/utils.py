@@ -85,6 +85,61 @@ def handle_errors(func):
             raise HTTPException(status_code=500, detail="An unexpected server error occurred.")
     return wrapper
 
+def make_etag(*parts) -> str:
+    """
+    Build a strong ETag from the given parts (None parts are skipped).
+
+    Example:
+        >>> make_etag("123456", 7, "json")
+        '"123456-7-json"'
+    """
+    return '"' + "-".join(str(part) for part in parts if part is not None) + '"'
+
+
+def http_date(value) -> str:
+    """Format a datetime as an HTTP date (Last-Modified)."""
+    from datetime import timezone
+    from email.utils import format_datetime
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def conditional_headers(etag: str, last_modified=None) -> dict:
+    """ETag / Last-Modified headers; clients must revalidate before reusing a response."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request_headers, etag: str, last_modified=None) -> bool:
+    """
+    Evaluate If-None-Match (or, without it, If-Modified-Since) against the
+    current representation. Returns True if a 304 should be sent.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        from email.utils import parsedate_to_datetime
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        # HTTP dates have second precision
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
 def gradescope_session(client):
     """
     A decorator to log in and log out to GradeScope.
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark the summary read paths on a synthetic course.
+
+Seeds a course with --students x --assignments submissions (2,000 x 200 by
+default, each carrying a per-question JSON blob like real Gradescope rows)
+and compares, per read path, the best wall time and the peak Python memory
+(tracemalloc):
+
+- orm_entities:    full Submission/Student/Assignment ORM loads (the previous
+                   get_summary_data_from_db implementation, kept here as the
+                   baseline)
+- core_projection: get_summary_data_from_db, Core select() of the needed
+                   columns as plain tuples
+- summary_table:   get_summary_sheet_from_db, reading the pre-computed
+                   summary_sheets grid into a GradeMatrix
+
+Requires DATABASE_URL to point at a PostgreSQL database with the GradeSync
+schema. The synthetic course is deleted afterwards unless --keep is given.
+
+Usage:
+    python benchmarks/summary_read_paths.py
+    python benchmarks/summary_read_paths.py --students 500 --assignments 50 --repeat 5
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import text
+
+from api.core.db import SessionLocal, engine, init_db
+from api.core.ingest import save_summary_sheet_to_db
+from api.core.models import Course, Assignment, Student, Submission
+from api.queries.summary import get_summary_data_from_db, get_summary_sheet_from_db
+
+_SEED_SQL = (
+    """
+    INSERT INTO assignments (assignment_id, course_id, title, category, max_points, sort_priority, sort_ordinal)
+    SELECT 'bench-' || g, :course_id, 'Lab ' || g, 'Labs', 10, 5, g
+    FROM generate_series(1, :assignments) g
+    """,
+    """
+    INSERT INTO students (course_id, sid, email, legal_name)
+    SELECT :course_id, 'S' || g, 'student' || g || '@bench.example.edu', 'Student ' || lpad(g::text, 6, '0')
+    FROM generate_series(1, :students) g
+    """,
+    """
+    INSERT INTO submissions (assignment_id, student_id, total_score, max_points, status, scores_by_question)
+    SELECT a.id, s.id, round((random() * 10)::numeric, 2), 10, 'Graded', q.blob
+    FROM assignments a
+    CROSS JOIN students s
+    CROSS JOIN (
+        SELECT json_object_agg('Question ' || n || ' (1.0 pts)', 1.0) AS blob
+        FROM generate_series(1, :questions) n
+    ) q
+    WHERE a.course_id = :course_id AND s.course_id = :course_id
+    """,
+)
+
+_CLEANUP_SQL = (
+    "DELETE FROM summary_sheets WHERE course_id = :course_id",
+    "DELETE FROM submissions WHERE assignment_id IN (SELECT id FROM assignments WHERE course_id = :course_id)",
+    "DELETE FROM students WHERE course_id = :course_id",
+    "DELETE FROM assignments WHERE course_id = :course_id",
+    "DELETE FROM courses WHERE id = :course_id",
+)
+
+
+def orm_entity_summary(course_gradescope_id: str) -> dict:
+    """Baseline: the pre-projection get_summary_data_from_db (full entity loads)."""
+    session = SessionLocal()
+    try:
+        course = session.query(Course).filter(Course.gradescope_course_id == course_gradescope_id).first()
+        assignments = session.query(Assignment).filter(
+            Assignment.course_id == course.id
+        ).order_by(Assignment.sort_priority, Assignment.sort_ordinal, Assignment.id).all()
+        students = session.query(Student).filter(Student.course_id == course.id).all()
+        submissions = session.query(Submission).join(Assignment).filter(
+            Assignment.course_id == course.id
+        ).all()
+        lookup = {(sub.assignment_id, sub.student_id): sub for sub in submissions}
+        student_data = []
+        for student in students:
+            scores = {}
+            for assignment in assignments:
+                sub = lookup.get((assignment.id, student.id))
+                scores[assignment.title] = float(sub.total_score) if sub and sub.total_score is not None else ""
+            student_data.append({
+                "legal_name": student.legal_name or "",
+                "email": student.email or "",
+                "scores": scores,
+            })
+        student_data.sort(key=lambda s: s.get("legal_name", "").lower())
+        return {"assignments": [a.title for a in assignments], "students": student_data}
+    finally:
+        session.close()
+
+
+def seed_course(course_gradescope_id: str, students: int, assignments: int, questions: int) -> int:
+    """Create the synthetic course and its summary grid; returns the course id."""
+    params = {"students": students, "assignments": assignments, "questions": questions}
+    with engine.begin() as conn:
+        course_id = conn.execute(
+            text("INSERT INTO courses (gradescope_course_id, name) VALUES (:gs, 'Benchmark') RETURNING id"),
+            {"gs": course_gradescope_id},
+        ).scalar()
+        params["course_id"] = course_id
+        for statement in _SEED_SQL:
+            conn.execute(text(statement), params)
+    save_summary_sheet_to_db(course_gradescope_id)
+    return course_id
+
+
+def drop_course(course_id: int) -> None:
+    with engine.begin() as conn:
+        for statement in _CLEANUP_SQL:
+            conn.execute(text(statement), {"course_id": course_id})
+
+
+def measure(fn, course_gradescope_id: str, repeat: int):
+    """Best wall time over `repeat` runs and the tracemalloc peak of one run."""
+    fn(course_gradescope_id)  # warm connection pool and mapper caches
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = fn(course_gradescope_id)
+        timings.append(time.perf_counter() - started)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn(course_gradescope_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    cells = sum(len(student["scores"]) for student in result["students"])
+    return min(timings), peak, cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark summary read paths on a synthetic course")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--assignments", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=10, help="Per-question JSON entries per submission")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic course afterwards")
+    args = parser.parse_args()
+
+    init_db()
+    course_gradescope_id = f"benchmark-{args.students}x{args.assignments}"
+    with engine.connect() as conn:
+        existing = conn.execute(
+            text("SELECT id FROM courses WHERE gradescope_course_id = :gs"), {"gs": course_gradescope_id}
+        ).scalar()
+    if existing is not None:
+        drop_course(existing)
+
+    print(f"Seeding {args.students} students x {args.assignments} assignments ...")
+    started = time.perf_counter()
+    course_id = seed_course(course_gradescope_id, args.students, args.assignments, args.questions)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s\n")
+
+    paths = (
+        ("orm_entities", orm_entity_summary),
+        ("core_projection", get_summary_data_from_db),
+        ("summary_table", get_summary_sheet_from_db),
+    )
+    try:
+        print(f"{'path':<16} {'best (s)':>10} {'peak (MiB)':>12} {'cells':>10}")
+        for name, fn in paths:
+            seconds, peak, cells = measure(fn, course_gradescope_id, args.repeat)
+            print(f"{name:<16} {seconds:>10.3f} {peak / 2**20:>12.1f} {cells:>10}")
+    finally:
+        if not args.keep:
+            drop_course(course_id)
+
+
+if __name__ == "__main__":
+    main()
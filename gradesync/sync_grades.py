@@ -20,12 +20,13 @@ load_dotenv()
 from api.sync.service import GradeSyncService
 
 
-def sync_course(course_id: str):
+def sync_course(course_id: str, force_sync: bool = False):
     """
     同步指定课程的所有成绩（Gradescope + PrairieLearn + iClicker）
     
     Args:
         course_id: 课程 ID（在 config.json 中配置）
+        force_sync: 强制同步所有作业（忽略增量同步的新鲜度窗口和未变化的 CSV）
     """
     print("=" * 70)
     print(f"📊 开始同步课程: {course_id}")
@@ -34,7 +35,7 @@ def sync_course(course_id: str):
     
     try:
         # 创建同步服务
-        service = GradeSyncService(course_id=course_id)
+        service = GradeSyncService(course_id=course_id, force_sync=force_sync)
         
         # 执行同步
         print("正在同步成绩...")
@@ -111,6 +112,59 @@ def list_courses():
         print()
 
 
+def run_scheduler(course_ids=None, workers=None, poll_seconds=None, once=False, force_sync=False):
+    """
+    按同步间隔调度课程同步
+    
+    每次轮询读取每门课程的同步间隔（course_configs / config.json 中的
+    sync_interval_hours）和 Course.last_synced_at，把到期的课程交给有上限的
+    线程池并发同步。
+    
+    Args:
+        course_ids: 只调度这些课程（默认：全部课程）
+        workers: 同时同步的课程数
+        poll_seconds: 两次检查之间的最长间隔（秒）
+        once: 只同步当前到期的课程，完成后退出（适合 cron）
+        force_sync: 每次调度的同步都强制同步所有作业
+    """
+    import logging
+    from functools import partial
+    from api.sync.scheduler import SyncScheduler
+    from api.sync.service import sync_course_grades
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    scheduler = SyncScheduler(
+        max_workers=workers,
+        poll_seconds=poll_seconds,
+        course_ids=course_ids,
+        sync_fn=partial(sync_course_grades, force_sync=force_sync),
+    )
+    
+    print("=" * 70)
+    print(f"⏰ 调度同步：{scheduler.max_workers} 个并发，每 {scheduler.poll_seconds:.0f} 秒检查一次")
+    print("=" * 70)
+    for course in scheduler.scan():
+        next_due = course.next_due_at.isoformat() if course.next_due_at else "立即"
+        print(f"  • {course.course_id}: 每 {course.interval_hours:g} 小时，下次 {next_due}")
+    print()
+    
+    if once:
+        dispatched = scheduler.run_once()
+        if not dispatched:
+            print("没有到期的课程")
+        scheduler.wait_idle()
+        scheduler.shutdown()
+        print(f"完成：已调度 {len(dispatched)} 个课程")
+        return
+    
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止，等待进行中的同步完成...")
+        scheduler.stop()
+        scheduler.shutdown(wait=True)
+
+
 def main():
     """主函数"""
     import argparse
@@ -128,6 +182,15 @@ def main():
   
   # 同步多个课程
   python sync_grades.py cs10_fa25 cs61c_fa25
+  
+  # 常驻调度：按各课程的 sync_interval_hours 同步到期课程
+  python sync_grades.py --schedule --workers 4
+  
+  # 只同步当前到期的课程后退出（cron 每小时运行即可）
+  python sync_grades.py --schedule --once
+  
+  # 强制同步所有作业（忽略增量同步；用于立即获取已过截止日期作业的重新评分）
+  python sync_grades.py cs10_fa25 --force
 
 环境变量 (.env 文件):
   GRADESCOPE_EMAIL=your-email@example.com
@@ -151,6 +214,43 @@ def main():
         help='列出所有可用课程'
     )
     
+    parser.add_argument(
+        '--schedule',
+        action='store_true',
+        help='常驻运行，按同步间隔调度到期的课程（指定课程 ID 时只调度这些课程）'
+    )
+    
+    parser.add_argument(
+        '--once',
+        action='store_true',
+        help='与 --schedule 一起使用：只同步当前到期的课程，然后退出'
+    )
+    
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=None,
+        help='调度模式下同时同步的课程数（默认：global_settings.scheduler_workers 或 4）'
+    )
+    
+    parser.add_argument(
+        '--poll-seconds',
+        type=float,
+        default=None,
+        help='调度模式下检查到期课程的间隔秒数（默认：global_settings.scheduler_poll_seconds 或 60）'
+    )
+    
+    parser.add_argument(
+        '--force', '-f',
+        action='store_true',
+        help=(
+            '强制同步所有作业，忽略增量同步的新鲜度窗口和未变化的 CSV。'
+            '增量同步只能从下载结果发现分数变化：已过截止日期的作业在 '
+            'freshness_hours（默认 24 小时）内被重新评分时会被跳过，直到新鲜度窗口过期；'
+            '需要立即获取这类重新评分时请使用 --force'
+        )
+    )
+    
     args = parser.parse_args()
     
     # 列出课程
@@ -158,6 +258,17 @@ def main():
         list_courses()
         return
     
+    # 调度模式
+    if args.schedule:
+        run_scheduler(
+            course_ids=args.course_ids or None,
+            workers=args.workers,
+            poll_seconds=args.poll_seconds,
+            once=args.once,
+            force_sync=args.force,
+        )
+        return
+    
     # 如果没有指定课程，显示帮助
     if not args.course_ids:
         parser.print_help()
@@ -168,7 +279,7 @@ def main():
     # 同步指定的课程
     success_count = 0
     for course_id in args.course_ids:
-        result = sync_course(course_id)
+        result = sync_course(course_id, force_sync=args.force)
         if result and result.get('overall_success'):
             success_count += 1
         print()
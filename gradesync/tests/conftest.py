@@ -0,0 +1,80 @@
+"""
+Shared fixtures for the GradeSync tests.
+
+Database tests run against the PostgreSQL server named by DATABASE_URL and
+are skipped when it is not set. Every test works in its own course, which is
+deleted again afterwards, so the suite can share a development database.
+"""
+import csv
+import io
+import os
+import sys
+import uuid
+
+import pytest
+
+# Make the ``api`` package importable the way sync_grades.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_COURSE_TABLES = (
+    "DELETE FROM summary_sheets WHERE course_id = :course_id",
+    "DELETE FROM submissions WHERE assignment_id IN (SELECT id FROM assignments WHERE course_id = :course_id)",
+    "DELETE FROM students WHERE course_id = :course_id",
+    "DELETE FROM assignments WHERE course_id = :course_id",
+    "DELETE FROM assignment_categories WHERE course_id = :course_id",
+    "DELETE FROM course_configs WHERE course_id = :course_id",
+    "DELETE FROM courses WHERE id = :course_id",
+)
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+    from api.core.db import engine, init_db
+    init_db()
+    return engine
+
+
+@pytest.fixture
+def gradescope_course_id(db_engine):
+    """A fresh Gradescope course id; its rows are removed after the test."""
+    course_gs_id = f"test-{uuid.uuid4().hex[:12]}"
+    yield course_gs_id
+    delete_course(db_engine, course_gs_id)
+
+
+def delete_course(db_engine, course_gs_id: str) -> None:
+    """Delete a course and every row that belongs to it."""
+    from sqlalchemy import text
+
+    with db_engine.begin() as conn:
+        course_id = conn.execute(
+            text("SELECT id FROM courses WHERE gradescope_course_id = :gs_id"),
+            {"gs_id": course_gs_id},
+        ).scalar()
+        if course_id is not None:
+            for statement in _COURSE_TABLES:
+                conn.execute(text(statement), {"course_id": course_id})
+
+
+def make_scores_csv(students: int, questions: int = 3, regraded=(), email_prefix: str = "student") -> str:
+    """A Gradescope scores.csv export with deterministic scores."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    question_headers = [f"{q + 1}: Question {q + 1} (2.0 pts)" for q in range(questions)]
+    writer.writerow([
+        "Name", "SID", "Email", "Sections", "Total Score", "Max Points", "Status",
+        "Submission ID", "Submission Time", "Lateness (H:M:S)", "View Count",
+        "Submission Count",
+    ] + question_headers)
+    for i in range(students):
+        scores = [float((i + q) % 3) for q in range(questions)]
+        if i in regraded:
+            scores[0] = 2.0 if scores[0] != 2.0 else 1.0
+        writer.writerow([
+            f"Student {i}", f"{30000 + i}", f"{email_prefix}{i}@example.edu", "",
+            sum(scores), 2.0 * questions, "Graded", f"{90000 + i}",
+            "2025-09-17 15:38:04 -0700", "0:00:00", 1, 1,
+        ] + scores)
+    return buf.getvalue()
@@ -0,0 +1,128 @@
+"""Tests for GradeMatrixCache invalidation through data-version notifications."""
+import time
+
+from sqlalchemy import text
+
+from api.core import data_version
+from api.core.data_version import DATA_VERSION_CHANNEL, DataVersionListener, bump_data_version
+from api.core.db import SessionLocal
+from api.core.ingest_optimized import CourseIngestSession
+from api.queries import grade_matrix
+from api.queries.grade_matrix import GradeMatrixCache
+
+from conftest import make_scores_csv
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_listening_cache_answers_versions_from_memory(db_engine, gradescope_course_id, monkeypatch):
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=3))
+        course_db_id = ingest.course_id
+
+    cache = GradeMatrixCache()
+    listener = cache.listen()
+    try:
+        assert _wait_for(lambda: cache.listening)
+        version = cache.version(gradescope_course_id, ttl_seconds=0.05)
+
+        lookups = []
+        real_load = grade_matrix.load_data_version
+        monkeypatch.setattr(grade_matrix, "load_data_version", lambda gs_id: lookups.append(gs_id) or real_load(gs_id))
+        time.sleep(0.1)
+        # Past the TTL, but no bump was notified
+        assert cache.version(gradescope_course_id, ttl_seconds=0.05) == version
+        assert lookups == []
+
+        # A bump committed by another connection invalidates the course
+        session = SessionLocal()
+        try:
+            bump_data_version(session, course_db_id)
+            session.commit()
+        finally:
+            session.close()
+        assert _wait_for(lambda: gradescope_course_id not in cache._versions)
+        assert cache.version(gradescope_course_id, ttl_seconds=0.05)[0] == version[0] + 1
+        assert lookups == [gradescope_course_id]
+    finally:
+        listener.stop(timeout=10)
+
+
+def test_silently_lost_listener_connection_stops_listening(db_engine, monkeypatch):
+    states = []
+    listener = DataVersionListener(lambda gs_id: None, states.append, retry_seconds=60, poll_seconds=0.05).start()
+    try:
+        assert _wait_for(lambda: states == [True])
+        # A dead socket that delivers nothing: no notification and no EOF
+        # ever reach select(), so only the liveness check can notice
+        monkeypatch.setattr(data_version.select, "select", lambda *args: ([], [], []))
+        with db_engine.begin() as connection:
+            connection.execute(text(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE query = :listen AND pid <> pg_backend_pid()"
+            ), {"listen": f"LISTEN {DATA_VERSION_CHANNEL}"})
+        assert _wait_for(lambda: states == [True, False])
+    finally:
+        listener.stop(timeout=0)
+
+
+def test_listening_trust_is_bounded(db_engine, gradescope_course_id, monkeypatch):
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=3))
+
+    cache = GradeMatrixCache()
+    cache.listening = True
+    lookups = []
+    real_load = grade_matrix.load_data_version
+    monkeypatch.setattr(grade_matrix, "load_data_version", lambda gs_id: lookups.append(gs_id) or real_load(gs_id))
+    ttl = 0.01
+    cache.version(gradescope_course_id, ttl_seconds=ttl)
+    time.sleep(ttl * grade_matrix.LISTENING_TTL_FACTOR + 0.05)
+    cache.version(gradescope_course_id, ttl_seconds=ttl)
+    assert lookups == [gradescope_course_id, gradescope_course_id]
+
+
+def test_value_read_before_an_invalidation_is_not_stored(db_engine, gradescope_course_id, monkeypatch):
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=3))
+
+    cache = GradeMatrixCache()
+    cache.listening = True
+    real_load = grade_matrix.load_data_version
+
+    def load_then_invalidate(gs_id):
+        version = real_load(gs_id)
+        # A notification arriving while the version is being read
+        cache.invalidate(gs_id)
+        return version
+
+    monkeypatch.setattr(grade_matrix, "load_data_version", load_then_invalidate)
+    assert cache.version(gradescope_course_id) is not None
+    assert gradescope_course_id not in cache._versions
+
+
+def test_matrices_are_kept_per_summary_backend(monkeypatch):
+    built = []
+
+    def fake_load(gs_id, backend="table"):
+        built.append(backend)
+        return grade_matrix.GradeMatrix.empty(gs_id)
+
+    monkeypatch.setattr(grade_matrix, "load_grade_matrix", fake_load)
+    cache = GradeMatrixCache()
+    table = cache.get("course", backend="table")
+    # summary_backend switched in config.json: the data version is unchanged
+    matview = cache.get("course", backend="matview")
+    assert matview is not table
+    assert cache.get("course", backend="table") is table
+    assert built == ["table", "matview"]
+
+    cache.invalidate("course")
+    assert cache._entries == {}
@@ -0,0 +1,27 @@
+"""Tests for the thread-safety settings of the Gradescope client."""
+import pytest
+
+pytest.importorskip("fullGSapi")
+
+from requests.adapters import DEFAULT_POOLSIZE
+
+from api.services.gradescope.client import DEFAULT_MAX_CONNECTIONS_PER_HOST, GradescopeClient
+
+
+def test_pool_is_sized_when_the_client_is_created():
+    client = GradescopeClient(max_connections_per_host=DEFAULT_POOLSIZE + 6)
+    adapter = client.session.get_adapter("https://www.gradescope.com/")
+    assert adapter._pool_maxsize == DEFAULT_POOLSIZE + 6
+    assert client.max_connections_per_host == DEFAULT_POOLSIZE + 6
+
+
+def test_later_caps_keep_the_mounted_adapter():
+    client = GradescopeClient()
+    adapter = client.session.get_adapter("https://www.gradescope.com/")
+    client.set_max_connections_per_host(2)
+    assert client.session.get_adapter("https://www.gradescope.com/") is adapter
+    assert client.max_connections_per_host == 2
+    # Never above the pool the session was created with
+    client.set_max_connections_per_host(client.pool_maxsize + 10)
+    assert client.max_connections_per_host == client.pool_maxsize
+    assert DEFAULT_MAX_CONNECTIONS_PER_HOST <= client.pool_maxsize
@@ -0,0 +1,38 @@
+"""Tests for the incremental sync decision in api.core.ingest_optimized."""
+from datetime import datetime, timedelta, timezone
+
+from api.core.ingest_optimized import should_sync_assignment
+from api.core.models import Assignment
+
+NOW = datetime(2026, 10, 16, 12, tzinfo=timezone.utc)
+
+
+def _should_sync(assignment, **kwargs):
+    return should_sync_assignment(
+        None, 1, assignment.assignment_id,
+        known_assignments={assignment.assignment_id: assignment},
+        sync_if_older_than_hours=24,
+        active_window_hours=72,
+        now=NOW,
+        **kwargs,
+    )
+
+
+def _past_due(scores_changed_at):
+    return Assignment(
+        assignment_id="1",
+        last_synced_at=NOW - timedelta(hours=2),
+        scores_changed_at=scores_changed_at,
+        assignment_metadata={"due_date": (NOW - timedelta(days=30)).isoformat()},
+    )
+
+
+def test_recent_score_change_keeps_a_past_due_assignment_syncing():
+    assert _should_sync(_past_due(NOW - timedelta(hours=48)))
+
+
+def test_quiet_past_due_assignment_waits_for_freshness_unless_forced():
+    # A regrade since the last download is not visible until the next one
+    assignment = _past_due(NOW - timedelta(days=20))
+    assert not _should_sync(assignment)
+    assert _should_sync(assignment, force_sync=True)
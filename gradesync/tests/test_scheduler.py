@@ -0,0 +1,149 @@
+"""Tests for the interval-aware sync scheduler in api.sync.scheduler."""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api.config_manager import ConfigManager
+from api.core.db import SessionLocal
+from api.core.models import Course, CourseConfig as CourseConfigRow
+from api.sync import scheduler as scheduler_module
+from api.sync import service as service_module
+from api.sync.scheduler import SyncScheduler
+from api.sync.service import GradeSyncResult, GradeSyncService
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    """Write a config.json and make the scheduler and sync service read it."""
+    def write(courses, global_settings=None):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"courses": courses, "global_settings": global_settings or {}}))
+        manager = ConfigManager(path)
+        monkeypatch.setattr(scheduler_module, "get_config_manager", lambda: manager)
+        monkeypatch.setattr(service_module, "get_config_manager", lambda: manager)
+        monkeypatch.setattr(service_module, "get_course_config", manager.get_course)
+        return manager
+    return write
+
+
+def _course(config_id, gradescope_id, iclicker=False, **gradescope):
+    sources = {"gradescope": dict({"enabled": True, "course_id": gradescope_id}, **gradescope)}
+    if iclicker:
+        sources["iclicker"] = {"enabled": True, "course_names": [config_id]}
+    return {"id": config_id, "name": config_id, "sources": sources}
+
+
+def _add_course_row(gradescope_id, interval_hours=None, **state):
+    session = SessionLocal()
+    try:
+        course = Course(gradescope_course_id=gradescope_id, name=gradescope_id, **state)
+        session.add(course)
+        session.flush()
+        row = CourseConfigRow(course_id=course.id, gradescope_enabled=True, gradescope_course_id=gradescope_id)
+        if interval_hours is not None:
+            row.gradescope_sync_interval_hours = interval_hours
+        session.add(row)
+        session.commit()
+    finally:
+        session.close()
+
+
+def _intervals(scheduler):
+    return {course.course_id: course.interval_hours for course in scheduler.scan()}
+
+
+def test_config_json_interval_applies_without_a_db_override(db_engine, gradescope_course_id, config_file):
+    _add_course_row(gradescope_course_id)
+    config_file([_course("configured", gradescope_course_id, sync_interval_hours=6)])
+    scheduler = SyncScheduler(max_workers=1, sync_fn=lambda course_id, **kwargs: None)
+    try:
+        assert _intervals(scheduler) == {"configured": 6.0}
+    finally:
+        scheduler.shutdown()
+
+
+def test_global_interval_applies_when_nothing_overrides_it(db_engine, gradescope_course_id, config_file):
+    _add_course_row(gradescope_course_id)
+    config_file([_course("defaulted", gradescope_course_id)], {"sync_interval_hours": 3})
+    scheduler = SyncScheduler(max_workers=1, sync_fn=lambda course_id, **kwargs: None)
+    try:
+        assert _intervals(scheduler) == {"defaulted": 3.0}
+    finally:
+        scheduler.shutdown()
+
+
+def test_admin_ui_override_wins(db_engine, gradescope_course_id, config_file):
+    _add_course_row(gradescope_course_id, interval_hours=12)
+    config_file([_course("overridden", gradescope_course_id, sync_interval_hours=6)])
+    scheduler = SyncScheduler(max_workers=1, sync_fn=lambda course_id, **kwargs: None)
+    try:
+        assert _intervals(scheduler) == {"overridden": 12.0}
+    finally:
+        scheduler.shutdown()
+
+
+def _course_row(gradescope_id):
+    session = SessionLocal()
+    try:
+        return session.query(Course).filter(Course.gradescope_course_id == gradescope_id).one()
+    finally:
+        session.close()
+
+
+def test_failed_course_backs_off_across_scheduler_instances(db_engine, gradescope_course_id, config_file):
+    now = datetime.now(timezone.utc)
+    _add_course_row(gradescope_course_id, sync_failed_at=now - timedelta(minutes=45), sync_failure_count=2)
+    config_file([_course("failing", gradescope_course_id, sync_interval_hours=6)])
+    # A fresh scheduler, as for each --once run from cron: the failure is read
+    # from the course row, and two failures in a row mean a 60 minute backoff
+    scheduler = SyncScheduler(max_workers=1, retry_minutes=30, sync_fn=lambda course_id, **kwargs: None)
+    try:
+        assert scheduler.due_courses(now) == []
+        due = scheduler.due_courses(now + timedelta(minutes=16))
+        assert [course.course_id for course in due] == ["failing"]
+    finally:
+        scheduler.shutdown()
+
+
+def test_only_stale_sources_are_synced(db_engine, gradescope_course_id, config_file):
+    now = datetime.now(timezone.utc)
+    _add_course_row(gradescope_course_id, source_synced_at={
+        "gradescope": (now - timedelta(hours=1)).isoformat(),
+        "iclicker": (now - timedelta(hours=7)).isoformat(),
+    })
+    config_file([_course("partial", gradescope_course_id, iclicker=True, sync_interval_hours=6)])
+    calls = []
+    scheduler = SyncScheduler(
+        max_workers=1,
+        sync_fn=lambda course_id, sources=None: calls.append((course_id, sources)) or {"overall_success": True},
+    )
+    try:
+        assert scheduler.run_once(now) == ["partial"]
+        scheduler.wait_idle()
+        assert calls == [("partial", ["iclicker"])]
+    finally:
+        scheduler.shutdown()
+
+
+def test_sync_outcome_stamps_each_successful_source(db_engine, gradescope_course_id, config_file, monkeypatch):
+    _add_course_row(gradescope_course_id)
+    config_file([_course("mixed", gradescope_course_id, iclicker=True)])
+
+    def run(iclicker_ok):
+        service = GradeSyncService("mixed")
+        monkeypatch.setattr(service, "_sync_gradescope", lambda progress_callback=None: GradeSyncResult("gradescope", True, "ok"))
+        monkeypatch.setattr(service, "_sync_iclicker", lambda progress_callback=None: GradeSyncResult("iclicker", iclicker_ok, "ok"))
+        return service.sync_all()
+
+    assert not run(iclicker_ok=False)["overall_success"]
+    course = _course_row(gradescope_course_id)
+    assert set(course.source_synced_at) == {"gradescope"}
+    assert course.sync_failure_count == 1 and course.sync_failed_at is not None
+    assert course.last_synced_at is None
+
+    assert run(iclicker_ok=True)["overall_success"]
+    course = _course_row(gradescope_course_id)
+    assert set(course.source_synced_at) == {"gradescope", "iclicker"}
+    assert course.sync_failure_count == 0 and course.sync_failed_at is None
+    assert course.last_synced_at == datetime.fromisoformat(course.source_synced_at["gradescope"])
@@ -0,0 +1,78 @@
+"""Tests for the coalesced summary_grid refresh in api.core.summary_matview."""
+import threading
+import time
+
+from api.core import summary_matview
+from api.core.data_version import load_data_version
+from api.core.ingest_optimized import CourseIngestSession
+
+from conftest import delete_course, make_scores_csv
+
+
+def test_refresh_bumps_only_requested_courses(db_engine, gradescope_course_id):
+    other_course_id = gradescope_course_id + "-other"
+    try:
+        with CourseIngestSession(gradescope_course_id) as ingest:
+            ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=3))
+            course_db_id = ingest.course_id
+        with CourseIngestSession(other_course_id) as ingest:
+            ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=3))
+        before = load_data_version(gradescope_course_id)[0]
+        other_before = load_data_version(other_course_id)[0]
+
+        summary_matview.refresh_summary_matview([course_db_id], concurrently=False)
+
+        assert load_data_version(gradescope_course_id)[0] == before + 1
+        assert load_data_version(other_course_id)[0] == other_before
+    finally:
+        delete_course(db_engine, other_course_id)
+
+
+def test_concurrent_requests_share_one_follow_up_refresh(monkeypatch):
+    calls = []
+    first_started = threading.Event()
+    release_first = threading.Event()
+
+    def fake_refresh(course_db_ids, concurrently):
+        calls.append(set(course_db_ids))
+        if len(calls) == 1:
+            first_started.set()
+            release_first.wait(5)
+        return {"seconds": 0.0}
+
+    monkeypatch.setattr(summary_matview, "_refresh", fake_refresh)
+    refresher = summary_matview._CoalescingRefresher()
+
+    first = threading.Thread(target=refresher.request, args=([1], True))
+    first.start()
+    assert first_started.wait(5)
+    waiters = [threading.Thread(target=refresher.request, args=([course], True)) for course in (2, 3, 4, 5)]
+    for thread in waiters:
+        thread.start()
+    # Let every waiter register before the running refresh finishes
+    time.sleep(0.2)
+    release_first.set()
+    for thread in [first] + waiters:
+        thread.join(5)
+
+    assert calls == [{1}, {2, 3, 4, 5}]
+
+
+def test_failed_refresh_is_retried_for_its_courses(monkeypatch):
+    calls = []
+
+    def flaky_refresh(course_db_ids, concurrently):
+        calls.append(set(course_db_ids))
+        if len(calls) == 1:
+            raise RuntimeError("refresh failed")
+        return {"seconds": 0.0}
+
+    monkeypatch.setattr(summary_matview, "_refresh", flaky_refresh)
+    refresher = summary_matview._CoalescingRefresher()
+    try:
+        refresher.request([1], True)
+    except RuntimeError:
+        pass
+    result = refresher.request([2], True)
+    assert calls == [{1}, {1, 2}]
+    assert result["coalesced"] == 2
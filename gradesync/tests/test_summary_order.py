@@ -0,0 +1,54 @@
+"""Student order of the summary queries in api.queries."""
+import json
+
+from sqlalchemy import text
+
+from api.core.ingest_optimized import CourseIngestSession
+from api.queries.grade_matrix import decode_cursor, load_grade_matrix
+from api.queries.summary_export import iter_summary_ndjson
+
+from conftest import make_scores_csv
+
+NAMES = ["bob", "Alice", None, "carol", "Dave", "alice"]
+
+
+def _ingest_named_students(db_engine, course_gs_id):
+    with CourseIngestSession(course_gs_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=len(NAMES)))
+        course_db_id = ingest.course_id
+    with db_engine.begin() as conn:
+        for i, name in enumerate(NAMES):
+            conn.execute(
+                text("UPDATE students SET legal_name = :name WHERE course_id = :course_id AND email = :email"),
+                {"name": name, "course_id": course_db_id, "email": f"student{i}@example.edu"},
+            )
+
+
+def _baseline_order():
+    # The Python sort the SQL ordering replaced
+    names = [name or "" for name in NAMES]
+    return sorted(names, key=lambda name: name.lower())
+
+
+def test_grade_matrix_orders_like_the_python_sort(db_engine, gradescope_course_id):
+    _ingest_named_students(db_engine, gradescope_course_id)
+    matrix = load_grade_matrix(gradescope_course_id)
+    assert matrix.student_names.tolist() == _baseline_order()
+
+
+def test_pagination_follows_the_same_order(db_engine, gradescope_course_id):
+    _ingest_named_students(db_engine, gradescope_course_id)
+    names, after = [], None
+    while True:
+        page = load_grade_matrix(gradescope_course_id, limit=2, after=after)
+        names.extend(page.student_names.tolist())
+        if page.next_cursor is None:
+            break
+        after = decode_cursor(page.next_cursor)
+    assert names == _baseline_order()
+
+
+def test_ndjson_export_orders_like_the_python_sort(db_engine, gradescope_course_id):
+    _ingest_named_students(db_engine, gradescope_course_id)
+    lines = [json.loads(line) for line in iter_summary_ndjson(gradescope_course_id)]
+    assert [line["legal_name"] for line in lines[1:]] == _baseline_order()
@@ -0,0 +1,81 @@
+"""Tests for the summary_dirty marker and the summary refresh fallback."""
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from api.core.data_version import load_summary_dirty
+from api.core.ingest import refresh_summary_sheet
+from api.core.ingest_optimized import CourseIngestSession
+from api.sync.service import GradeSyncResult, GradeSyncService
+
+from conftest import make_scores_csv
+
+
+def _summary_assignments(db_engine, course_gs_id):
+    with db_engine.connect() as conn:
+        return set(conn.execute(text("""
+            SELECT a.assignment_id
+            FROM summary_sheets ss
+            JOIN assignments a ON a.id = ss.assignment_id
+            JOIN courses c ON c.id = ss.course_id
+            WHERE c.gradescope_course_id = :gs_id
+        """), {"gs_id": course_gs_id}).scalars())
+
+
+def _service(course_gs_id, touched):
+    service = GradeSyncService.__new__(GradeSyncService)
+    service.course_id = course_gs_id
+    service.config = SimpleNamespace(
+        name=course_gs_id,
+        gradescope_course_id=course_gs_id,
+        summary_refresh_mode="incremental",
+        categories=None,
+    )
+    service.results = [GradeSyncResult("gradescope", True, "ok", {"touched": touched})]
+    return service
+
+
+def test_ingest_marks_summary_dirty_until_refreshed(db_engine, gradescope_course_id):
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=5))
+        touched = ingest.touched()
+    assert load_summary_dirty(gradescope_course_id)
+
+    refresh_summary_sheet(gradescope_course_id, touched["assignment_ids"], touched["student_ids"])
+    assert not load_summary_dirty(gradescope_course_id)
+
+
+def test_failed_refresh_forces_full_rebuild_on_next_sync(db_engine, gradescope_course_id):
+    # First sync ingests Homework 1, then its summary step never runs
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=5))
+
+    # Second sync only touches Homework 2
+    service = _service(gradescope_course_id, touched=None)
+    service.summary_was_dirty = service._summary_dirty()
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("2", "Homework 2", make_scores_csv(students=5))
+        service.results[0].details["touched"] = ingest.touched()
+
+    result = service._update_summary_sheets()
+    assert result.success
+    assert result.details["mode"] == "full"
+    assert _summary_assignments(db_engine, gradescope_course_id) == {"1", "2"}
+    assert not load_summary_dirty(gradescope_course_id)
+
+
+def test_clean_course_refreshes_incrementally(db_engine, gradescope_course_id):
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=5))
+        touched = ingest.touched()
+    refresh_summary_sheet(gradescope_course_id, touched["assignment_ids"], touched["student_ids"])
+
+    service = _service(gradescope_course_id, touched=None)
+    service.summary_was_dirty = service._summary_dirty()
+    with CourseIngestSession(gradescope_course_id) as ingest:
+        ingest.ingest_csv("1", "Homework 1", make_scores_csv(students=5, regraded={2}))
+        service.results[0].details["touched"] = ingest.touched()
+
+    result = service._update_summary_sheets()
+    assert result.details["mode"] == "incremental"
+    assert result.details["updated"] == 1
@@ -0,0 +1,37 @@
+"""Tests for the combined progress stream of GradeSyncService.sync_all."""
+from api.sync.service import GradeSyncResult, _CombinedProgress
+
+
+def test_current_step_is_the_one_based_position_of_the_event_step():
+    events = []
+    progress = _CombinedProgress(["gradescope", "prairielearn", "database"], events.append)
+
+    progress.start("gradescope", "Syncing Gradescope...")
+    progress.start("prairielearn", "Syncing PrairieLearn...")
+    progress.finish("prairielearn", GradeSyncResult("prairielearn", True, "done"))
+    progress.update("gradescope", {"progress": 50}, "Syncing Gradescope...")
+    progress.finish("gradescope", GradeSyncResult("gradescope", True, "done"))
+    progress.start("database", "Updating summary sheets...")
+    progress.finish("database", GradeSyncResult("database", True, "done"))
+
+    assert [(e["source"], e["currentStep"], e["finishedSteps"]) for e in events] == [
+        ("gradescope", 1, 0),
+        ("prairielearn", 2, 0),
+        ("prairielearn", 2, 1),
+        ("gradescope", 1, 1),
+        ("gradescope", 1, 2),
+        ("database", 3, 2),
+        ("database", 3, 3),
+    ]
+    assert all(e["totalSteps"] == 3 for e in events)
+
+
+def test_weighted_percent_follows_step_weights():
+    events = []
+    progress = _CombinedProgress(["gradescope", "iclicker"], events.append)
+    progress.finish("iclicker", GradeSyncResult("iclicker", True, "done"))
+    # gradescope weighs 4, iclicker 1
+    assert events[-1]["weightedPercent"] == 20.0
+    assert events[-1]["progress"] == 20
+    progress.update("gradescope", {"progress": 50}, "Syncing Gradescope...")
+    assert events[-1]["weightedPercent"] == 60.0
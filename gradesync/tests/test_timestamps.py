@@ -0,0 +1,29 @@
+"""Tests for api.core.timestamps."""
+from datetime import datetime, timedelta, timezone
+
+from api.core.timestamps import GRADESCOPE_TIME_FORMAT, ISO_FORMAT, SubmissionTimeParser
+
+
+def test_gradescope_default_format_is_detected():
+    parser = SubmissionTimeParser()
+    value = parser.parse("2025-09-17 15:38:04 -0700")
+    assert parser.format == GRADESCOPE_TIME_FORMAT
+    assert value == datetime(2025, 9, 17, 15, 38, 4, tzinfo=timezone(timedelta(hours=-7)))
+    # Later values stay on the learned format
+    parser.parse("2025-09-18 01:02:03 +0000")
+    assert parser.format == GRADESCOPE_TIME_FORMAT
+    assert parser.parsed == 2
+
+
+def test_iso_format_is_detected():
+    parser = SubmissionTimeParser()
+    value = parser.parse("2025-09-17T22:38:04Z")
+    assert parser.format == ISO_FORMAT
+    assert value == datetime(2025, 9, 17, 22, 38, 4, tzinfo=timezone.utc)
+
+
+def test_unparseable_values_are_counted():
+    parser = SubmissionTimeParser()
+    assert parser.parse("not a time") is None
+    assert parser.parse("") is None
+    assert (parser.parsed, parser.unparsed, parser.first_unparsed) == (0, 1, "not a time")